@@ -0,0 +1,44 @@
+import json
+import os
+from typing import Any, Dict, Iterable, List, Mapping
+
+
+def save_results(path: str, results: Mapping[str, Any]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current: Mapping[str, float],
+            baseline: Mapping[str, float],
+            threshold: float,
+            higher_is_better: Iterable[str] = ()) -> List[str]:
+    """Сравнивает плоские словари метрик и возвращает описания регрессий.
+
+    По умолчанию метрика - время (меньше - лучше); имена из higher_is_better
+    (например, RPS) считаются регрессией при падении. threshold - допустимое
+    относительное ухудшение, 0.2 = 20%.
+    """
+    higher_is_better = set(higher_is_better)
+    regressions = []
+
+    for name, base_value in sorted(baseline.items()):
+        value = current.get(name)
+        if value is None or not base_value:
+            continue
+
+        change = (value - base_value) / base_value
+        if name in higher_is_better:
+            change = -change
+
+        if change > threshold:
+            regressions.append(f"{name}: {base_value:.6g} -> {value:.6g} ({change:+.1%} worse)")
+
+    return regressions
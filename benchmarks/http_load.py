@@ -0,0 +1,396 @@
+"""Нагрузочный бенчмарк HTTP API: RPS и p50/p95/p99 по каждому эндпоинту.
+
+Приложение поднимается в этом же процессе (httpx + ASGITransport, без сети) или
+под uvicorn в дочернем процессе. Postgres и Redis по умолчанию заменяются
+локальными заменителями из benchmarks.standins, Kafka - всегда брокером в памяти.
+Эндпоинты нагружаются по очереди: прогрев, затем замер заданной длительности
+с фиксированным числом конкурентных клиентов.
+
+    python -m benchmarks.http_load --concurrency 32 --duration 10 --output bench/http.json
+    python -m benchmarks.http_load --baseline bench/http.json --threshold 0.2
+    python -m benchmarks.http_load --mode uvicorn --postgres env --redis env --endpoints predict,ad_get
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Mapping, Optional, Sequence
+
+os.environ.setdefault("MODEL_RELOAD_INTERVAL", "0")
+# Все объявления сида принадлежат одному продавцу - лимит на продавца мерил бы сам себя
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+from benchmarks.baseline import compare, load_results, save_results
+from benchmarks.standins import install
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READY_TIMEOUT = 120.0
+REPORTED_METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+@dataclass
+class Seed:
+    """Данные, которые сценарии используют как ID. Пулы не пересекаются, чтобы
+    запись в одном сценарии (инвалидация кэша, новые модерации) не влияла на другие."""
+    seller_id: int
+    read_item_ids: List[int]
+    async_item_ids: List[int]
+    update_item_ids: List[int]
+    task_ids: List[int]
+    created_item_ids: Deque[int] = field(default_factory=deque)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"seller_id": self.seller_id, "read_item_ids": self.read_item_ids,
+                "async_item_ids": self.async_item_ids, "update_item_ids": self.update_item_ids,
+                "task_ids": self.task_ids}
+
+
+async def seed(items: int) -> Seed:
+    """Наполняет хранилище через те же классы *PostgresStorage, что использует сервис,
+    поэтому работает и с заменителем, и с настоящим Postgres."""
+    from repositories.ads import AdPostgresStorage
+    from repositories.moderations import ModerationPostgresStorage
+    from repositories.sellers import SellerPostgresStorage
+
+    seller = await SellerPostgresStorage().create(
+        username="bench", email=f"bench-{os.getpid()}-{time.time_ns()}@example.com",
+        password="bench", is_verified=True,
+    )
+    seller_id = seller["seller_id"]
+
+    rows = [
+        {"seller_id": seller_id, "name": f"Item {i}", "description": f"Benchmark item number {i}",
+         "category": i % 100, "images_qty": i % 10}
+        for i in range(items * 3)
+    ]
+    item_ids = list(await AdPostgresStorage().copy_many(rows))
+    read_item_ids = item_ids[:items]
+
+    task_ids = []
+    for i, item_id in enumerate(read_item_ids):
+        row = await ModerationPostgresStorage().create(item_id, "completed", i % 2 == 0, 0.5, None)
+        task_ids.append(row["id"])
+
+    return Seed(seller_id, read_item_ids, item_ids[items:2 * items], item_ids[2 * items:], task_ids)
+
+
+async def cleanup(seed_data: Seed) -> None:
+    from repositories.sellers import SellerPostgresStorage
+
+    # ads и moderation_results удаляются каскадом
+    await SellerPostgresStorage().delete(seed_data.seller_id)
+
+
+Scenario = Callable[[httpx.AsyncClient, Seed, int], Awaitable[Optional[httpx.Response]]]
+
+
+def _pick(ids: Sequence[int], n: int) -> int:
+    return ids[n % len(ids)]
+
+
+async def predict(client: httpx.AsyncClient, seed_data: Seed, n: int) -> httpx.Response:
+    item_id = _pick(seed_data.read_item_ids, n)
+    return await client.post("/predict", json={
+        "seller_id": seed_data.seller_id, "is_verified_seller": n % 2 == 0, "item_id": item_id,
+        "name": f"Item {item_id}", "description": f"Benchmark item number {item_id}",
+        "category": item_id % 100, "images_qty": item_id % 10,
+    })
+
+
+async def simple_predict(client: httpx.AsyncClient, seed_data: Seed, n: int) -> httpx.Response:
+    item_id = _pick(seed_data.read_item_ids, n)
+    return await client.post(f"/simple_predict/{item_id}", json={"item_id": item_id})
+
+
+async def async_predict(client: httpx.AsyncClient, seed_data: Seed, n: int) -> httpx.Response:
+    item_id = _pick(seed_data.async_item_ids, n)
+    return await client.post(f"/async_predict/{item_id}", json={"item_id": item_id})
+
+
+async def moderation_results(client: httpx.AsyncClient, seed_data: Seed, n: int) -> httpx.Response:
+    return await client.get(f"/moderation_results/{_pick(seed_data.task_ids, n)}")
+
+
+async def ad_create(client: httpx.AsyncClient, seed_data: Seed, n: int) -> httpx.Response:
+    response = await client.post("/ads/", json={
+        "name": f"Created {n}", "description": f"Created by benchmark {n}", "category": n % 100, "images_qty": n % 10,
+    })
+    if response.status_code == 201:
+        seed_data.created_item_ids.append(response.json()["item_id"])
+    return response
+
+
+async def ad_get(client: httpx.AsyncClient, seed_data: Seed, n: int) -> httpx.Response:
+    return await client.get(f"/ads/{_pick(seed_data.read_item_ids, n)}")
+
+
+async def ad_update(client: httpx.AsyncClient, seed_data: Seed, n: int) -> httpx.Response:
+    item_id = _pick(seed_data.update_item_ids, n)
+    return await client.patch(f"/ads/update/{item_id}", params={"description": f"Updated {n}"})
+
+
+async def ad_delete(client: httpx.AsyncClient, seed_data: Seed, n: int) -> Optional[httpx.Response]:
+    # Удаляем только созданное в ad_create; когда созданное кончилось, сценарий завершается
+    if not seed_data.created_item_ids:
+        return None
+    return await client.delete(f"/ads/{seed_data.created_item_ids.popleft()}")
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "predict": predict,
+    "simple_predict": simple_predict,
+    "async_predict": async_predict,
+    "moderation_results": moderation_results,
+    "ad_create": ad_create,
+    "ad_get": ad_get,
+    "ad_update": ad_update,
+    "ad_delete": ad_delete,
+}
+
+EXPECTED_STATUS = {"ad_create": 201}
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга по отсортированным значениям."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies: Sequence[float], errors: int, elapsed: float) -> Dict[str, float]:
+    values = sorted(latencies)
+    requests = len(values) + errors
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+async def drive(client: httpx.AsyncClient, name: str, seed_data: Seed,
+                concurrency: int, duration: float, warmup: float) -> Dict[str, float]:
+    scenario = SCENARIOS[name]
+    expected = EXPECTED_STATUS.get(name, 200)
+    counter = iter(range(sys.maxsize))
+    latencies: List[float] = []
+    errors = 0
+    exhausted = False
+
+    async def client_loop(deadline: float, record: bool) -> None:
+        nonlocal errors, exhausted
+        while not exhausted and time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await scenario(client, seed_data, next(counter))
+            except httpx.HTTPError:
+                response = False
+            if response is None:
+                exhausted = True
+                return
+            latency = time.perf_counter() - started
+            if not record:
+                continue
+            if response is not False and response.status_code == expected:
+                latencies.append(latency)
+            else:
+                errors += 1
+
+    if warmup > 0:
+        deadline = time.perf_counter() + warmup
+        await asyncio.gather(*(client_loop(deadline, record=False) for _ in range(concurrency)))
+
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(client_loop(deadline, record=True) for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_scenarios(client: httpx.AsyncClient, seed_data: Seed, args: argparse.Namespace,
+                        standins: Optional[Mapping[str, Any]] = None) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name in args.endpoints:
+        db, redis = (standins or {}).get("db"), (standins or {}).get("redis")
+        db_before = db.round_trips if db else 0
+        redis_before = redis.round_trips if redis else 0
+
+        results[name] = await drive(client, name, seed_data, args.concurrency, args.duration, args.warmup)
+
+        # Обращения к хранилищам видны только для заменителей в этом же процессе (включая прогрев)
+        if db is not None:
+            results[name]["db_round_trips"] = db.round_trips - db_before
+        if redis is not None:
+            results[name]["redis_round_trips"] = redis.round_trips - redis_before
+        print(format_row(name, results[name]), flush=True)
+    return results
+
+
+async def run_inprocess(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    from main import app
+    from model import model_singleton
+
+    logging.getLogger().setLevel(args.log_level)
+    standins = install(args.postgres, args.redis, args.db_latency_ms / 1000, args.redis_latency_ms / 1000)
+
+    async with app.router.lifespan_context(app):
+        if not await asyncio.to_thread(model_singleton.wait_ready, READY_TIMEOUT) or not model_singleton.is_loaded:
+            raise RuntimeError("Model is not loaded, nothing to benchmark")
+
+        seed_data = await seed(args.items)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     cookies={"x-user-id": str(seed_data.seller_id)}) as client:
+            try:
+                return await run_scenarios(client, seed_data, args, standins)
+            finally:
+                await cleanup(seed_data)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    """Дочерний процесс режима uvicorn: заменители, наполнение, сервер."""
+    import uvicorn
+    from main import app
+
+    logging.getLogger().setLevel(args.log_level)
+    install(args.postgres, args.redis, args.db_latency_ms / 1000, args.redis_latency_ms / 1000)
+    seed_data = await seed(args.items)
+
+    with open(args.seed_file + ".tmp", "w") as f:
+        json.dump(seed_data.to_json(), f)
+    os.replace(args.seed_file + ".tmp", args.seed_file)
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level=args.log_level.lower(),
+                            access_log=False)
+    try:
+        await uvicorn.Server(config).serve()
+    finally:
+        await cleanup(seed_data)
+
+
+async def wait_ready(client: httpx.AsyncClient, seed_file: str, server: subprocess.Popen) -> Seed:
+    deadline = time.perf_counter() + READY_TIMEOUT
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Benchmark server exited with code {server.returncode}")
+        if os.path.exists(seed_file):
+            try:
+                if (await client.get("/ready")).status_code == 200:
+                    with open(seed_file) as f:
+                        return Seed(**json.load(f))
+            except httpx.TransportError:
+                pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Benchmark server did not become ready in time")
+
+
+async def run_uvicorn(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as directory:
+        seed_file = os.path.join(directory, "seed.json")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.http_load", "--serve", "--seed-file", seed_file,
+             "--port", str(args.port), "--items", str(args.items), "--postgres", args.postgres,
+             "--redis", args.redis, "--db-latency-ms", str(args.db_latency_ms),
+             "--redis-latency-ms", str(args.redis_latency_ms), "--log-level", args.log_level],
+            cwd=ROOT,
+        )
+        try:
+            limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits) as client:
+                seed_data = await wait_ready(client, seed_file, server)
+                client.cookies.set("x-user-id", str(seed_data.seller_id))
+                return await run_scenarios(client, seed_data, args)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def format_row(name: str, result: Mapping[str, float]) -> str:
+    return (f"{name:>20}: {result['requests']:8d} req {result['errors']:6d} err "
+            f"{result['rps']:9.1f} rps  p50 {result['p50_ms']:7.2f}  p95 {result['p95_ms']:7.2f}  "
+            f"p99 {result['p99_ms']:7.2f} ms")
+
+
+def flatten(results: Mapping[str, Mapping[str, float]]) -> Dict[str, float]:
+    return {f"{name}.{metric}": result[metric]
+            for name, result in results.items() for metric in REPORTED_METRICS}
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("inprocess", "uvicorn"), default="inprocess")
+    parser.add_argument("--postgres", choices=("memory", "env"), default="memory",
+                        help="memory - заменитель в памяти, env - Postgres из настроек сервиса")
+    parser.add_argument("--redis", choices=("memory", "env"), default="memory",
+                        help="memory - заменитель в памяти, env - Redis из настроек сервиса")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Имитация сетевой задержки заменителя Postgres")
+    parser.add_argument("--redis-latency-ms", type=float, default=0.0, help="Имитация сетевой задержки заменителя Redis")
+    parser.add_argument("--endpoints", default=",".join(SCENARIOS),
+                        type=lambda value: [name.strip() for name in value.split(",") if name.strip()],
+                        help="Сценарии через запятую (ad_delete удаляет созданное в ad_create)")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="Длительность замера на эндпоинт, секунды")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Прогрев на эндпоинт, секунды")
+    parser.add_argument("--items", type=int, default=1000, help="Объявлений в каждом пуле ID")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Куда сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON с базовыми результатами для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимое относительное ухудшение")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--seed-file", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    unknown = set(args.endpoints) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main() -> int:
+    args = parse_args()
+
+    if args.serve:
+        asyncio.run(serve(args))
+        return 0
+
+    runner = run_inprocess if args.mode == "inprocess" else run_uvicorn
+    results = asyncio.run(runner(args))
+    report = {
+        "mode": args.mode, "postgres": args.postgres, "redis": args.redis,
+        "concurrency": args.concurrency, "duration": args.duration, "endpoints": results,
+    }
+
+    if args.output:
+        save_results(args.output, report)
+
+    if args.baseline:
+        stored = load_results(args.baseline)
+        for setting in ("mode", "postgres", "redis", "concurrency"):
+            if stored.get(setting) != report[setting]:
+                print(f"WARNING baseline {setting}={stored.get(setting)} differs from current {report[setting]}")
+        baseline = flatten(stored["endpoints"])
+        higher_is_better = [name for name in baseline if name.endswith(".rps")]
+        regressions = compare(flatten(results), baseline, args.threshold, higher_is_better)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""Микробенчмарки горячих функций: признаки и скоринг, кодеки Redis и Kafka, модели из строк БД.
+
+Каждый бенчмарк калибруется как timeit (число вызовов подбирается так, чтобы один
+повтор длился не меньше --min-time), итог - медиана и минимум времени одного вызова
+по повторам. Корутины вызываются подряд в одном event loop. Для сообщений Kafka
+дополнительно печатается их размер по версиям схемы.
+
+    python -m benchmarks.micro --output bench/micro.json
+    python -m benchmarks.micro --baseline bench/micro.json --threshold 0.1
+    python -m benchmarks.micro --filter redis_codec,models
+"""
+import argparse
+import asyncio
+import inspect
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from benchmarks.baseline import compare, load_results, save_results
+
+NOW = datetime(2026, 1, 1, 12, 0, 0)
+
+AD_ROW = {
+    "item_id": 42, "seller_id": 7, "name": "Велосипед", "description": "Почти новый, " * 20,
+    "category": 12, "images_qty": 4, "is_closed": False, "created_at": NOW, "updated_at": NOW,
+}
+
+MODERATION_ROW = {
+    "id": 1001, "item_id": 42, "status": "completed", "is_violation": False, "probability": 0.137,
+    "error_message": None, "model_version": "7", "created_at": NOW, "processed_at": NOW,
+}
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+PREDICT_ARGS = (7, True, 42, AD_ROW["name"], AD_ROW["description"], AD_ROW["category"], AD_ROW["images_qty"])
+
+
+def _loaded_model():
+    from model import model_singleton
+
+    if not model_singleton.is_loaded:
+        model_singleton.load()
+    return model_singleton.snapshot()[0]
+
+
+def bench_build_features() -> Callable:
+    from services.predictions import PredictionService
+
+    return lambda: PredictionService.build_features(True, AD_ROW["description"], 12, 4)
+
+
+def bench_model_score() -> Callable:
+    from inference import _score
+    from services.predictions import PredictionService
+
+    model = _loaded_model()
+    features = PredictionService.build_features(True, AD_ROW["description"], 12, 4)
+    return lambda: _score(model, features)
+
+
+def bench_score() -> Callable:
+    from services.predictions import PredictionService
+
+    _loaded_model()
+    service = PredictionService()
+    return lambda: service.score(*PREDICT_ARGS)
+
+
+def bench_predict() -> Callable:
+    from services.predictions import PredictionService
+
+    _loaded_model()
+    service = PredictionService()
+    return lambda: service.predict(*PREDICT_ARGS)
+
+
+def bench_redis_encode() -> Callable:
+    from repositories.moderations import CustomJSONEncoder, dumps
+
+    return lambda: dumps(MODERATION_ROW, cls=CustomJSONEncoder)
+
+
+def bench_redis_decode() -> Callable:
+    from repositories.moderations import CustomJSONEncoder, dumps, loads
+
+    payload = dumps(MODERATION_ROW, cls=CustomJSONEncoder).encode("utf-8")
+    return lambda: loads(payload)
+
+
+def _kafka_request() -> Dict[str, Any]:
+    from clients import moderation_codec
+
+    return moderation_codec.build_request(42, 1001, {"traceparent": TRACEPARENT})
+
+
+def bench_kafka_encode(version: int) -> Callable[[], Callable]:
+    def bench() -> Callable:
+        from clients import moderation_codec
+
+        message = _kafka_request()
+        return lambda: moderation_codec.encode(message, version)
+    return bench
+
+
+def bench_kafka_decode(version: int) -> Callable[[], Callable]:
+    def bench() -> Callable:
+        from clients import moderation_codec
+
+        value, headers = moderation_codec.encode(_kafka_request(), version)
+        return lambda: moderation_codec.decode(value, headers)
+    return bench
+
+
+def kafka_message_sizes() -> Dict[str, int]:
+    """Байт на сообщение: значение и значение вместе с заголовками."""
+    from clients import moderation_codec
+
+    sizes = {}
+    for version in (1, 2):
+        value, headers = moderation_codec.encode(_kafka_request(), version)
+        sizes[f"v{version}.value"] = len(value)
+        sizes[f"v{version}.with_headers"] = len(value) + sum(len(key) + len(header) for key, header in headers)
+    return sizes
+
+
+def bench_moderation_model() -> Callable:
+    from models.moderation import ModerationModel
+
+    return lambda: ModerationModel(**MODERATION_ROW)
+
+
+def bench_ad_model() -> Callable:
+    from models.ad import AdModel
+
+    return lambda: AdModel(**AD_ROW)
+
+
+def bench_worker_build_moderation_result() -> Callable:
+    from workers.moderation_worker import KafkaConsumerWorker
+
+    worker = KafkaConsumerWorker()
+    return lambda: worker.build_moderation_result(item_id=42, status="completed", is_violation=False,
+                                                  probability=0.137)
+
+
+def bench_prediction_build_moderation_result() -> Callable:
+    from services.predictions import PredictionService
+
+    service = PredictionService()
+    return lambda: service.build_moderation_result(item_id=42, status="completed", is_violation=False,
+                                                   probability=0.137, model_version="7")
+
+
+BENCHMARKS: Dict[str, Callable[[], Callable]] = {
+    "predict.build_features": bench_build_features,
+    "predict.model_score": bench_model_score,
+    "predict.score": bench_score,
+    "predict.predict": bench_predict,
+    "redis_codec.encode": bench_redis_encode,
+    "redis_codec.decode": bench_redis_decode,
+    "kafka_codec.encode_v1_json": bench_kafka_encode(1),
+    "kafka_codec.decode_v1_json": bench_kafka_decode(1),
+    "kafka_codec.encode_v2": bench_kafka_encode(2),
+    "kafka_codec.decode_v2": bench_kafka_decode(2),
+    "models.moderation_from_row": bench_moderation_model,
+    "models.ad_from_row": bench_ad_model,
+    "worker.build_moderation_result": bench_worker_build_moderation_result,
+    "predictions.build_moderation_result": bench_prediction_build_moderation_result,
+}
+
+
+def _timer(fn: Callable, loop: asyncio.AbstractEventLoop) -> Callable[[int], float]:
+    """Функция number -> секунды на number вызовов fn (корутины выполняются в loop)."""
+    probe = fn()
+    if inspect.iscoroutine(probe):
+        probe.close()
+
+        async def run_many(number: int) -> float:
+            started = time.perf_counter()
+            for _ in range(number):
+                await fn()
+            return time.perf_counter() - started
+
+        return lambda number: loop.run_until_complete(run_many(number))
+
+    def run_many(number: int) -> float:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return time.perf_counter() - started
+
+    return run_many
+
+
+def measure(fn: Callable, repeat: int, min_time: float, loop: asyncio.AbstractEventLoop) -> Dict[str, float]:
+    timer = _timer(fn, loop)
+
+    number = 1
+    while timer(number) < min_time:
+        number *= 2
+
+    per_call = [timer(number) / number for _ in range(repeat)]
+    return {
+        "number": number,
+        "median_us": statistics.median(per_call) * 1e6,
+        "best_us": min(per_call) * 1e6,
+    }
+
+
+def select(filters: Sequence[str]) -> List[str]:
+    if not filters:
+        return list(BENCHMARKS)
+    return [name for name in BENCHMARKS if any(part in name for part in filters)]
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", type=lambda value: [part for part in value.split(",") if part],
+                        help="Подстроки имён бенчмарков через запятую")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="Минимальная длительность одного повтора, секунды")
+    parser.add_argument("--output", help="Куда сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON с базовыми результатами для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Допустимое относительное ухудшение")
+    return parser.parse_args(argv)
+
+
+def main() -> int:
+    args = parse_args()
+    loop = asyncio.new_event_loop()
+    results: Dict[str, Any] = {}
+
+    try:
+        for name in select(args.filter):
+            results[name] = measure(BENCHMARKS[name](), args.repeat, args.min_time, loop)
+            print(f"{name:>40}: {results[name]['median_us']:10.2f} us  "
+                  f"(best {results[name]['best_us']:.2f}, x{results[name]['number']})", flush=True)
+    finally:
+        loop.close()
+
+    report: Dict[str, Any] = {"repeat": args.repeat, "benchmarks": results}
+    if any(name.startswith("kafka_codec.") for name in results):
+        report["kafka_message_bytes"] = kafka_message_sizes()
+        print("kafka message bytes: " + ", ".join(f"{key}={size}" for key, size in report["kafka_message_bytes"].items()))
+
+    if args.output:
+        save_results(args.output, report)
+
+    if args.baseline:
+        baseline = {name: result["median_us"] for name, result in load_results(args.baseline)["benchmarks"].items()}
+        current = {name: result["median_us"] for name, result in results.items()}
+        regressions = compare(current, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
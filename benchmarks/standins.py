@@ -0,0 +1,722 @@
+"""Локальные заменители Postgres, Redis и Kafka для бенчмарков.
+
+Подмена делается на границах, которые код сервиса уже использует:
+    - методы *PostgresStorage заменяются методами InMemoryDatabase (SQL не исполняется,
+      но каждый вызов считается одним обращением к БД и может ждать db_latency);
+    - get_redis_connection во всех загруженных модулях отдаёт FakeRedis с теми же командами;
+    - AIOKafkaProducer/AIOKafkaConsumer заменяются клиентами InMemoryBroker.
+Бенчмарки сравнивают версии кода между собой, а не с боевыми хранилищами:
+для абсолютных цифр используйте --postgres env / --redis env.
+"""
+import asyncio
+import sys
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from errors import AdNotFoundError, ModerationNotFoundError, SellerNotFoundError
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class InMemoryDatabase:
+    """Таблицы sellers/ads/moderation_results/moderation_outbox в памяти с семантикой запросов из *PostgresStorage."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.sellers: Dict[int, Dict[str, Any]] = {}
+        self.ads: Dict[int, Dict[str, Any]] = {}
+        self.moderations: Dict[int, Dict[str, Any]] = {}
+        self.outbox: Dict[int, Dict[str, Any]] = {}
+        self._sequences: Dict[str, int] = defaultdict(int)
+
+    def _next_id(self, table: str) -> int:
+        self._sequences[table] += 1
+        return self._sequences[table]
+
+    async def _round_trip(self) -> None:
+        self.round_trips += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    # sellers
+
+    async def create_seller(self, username: str, email: str, password: str, is_verified: bool) -> Dict[str, Any]:
+        await self._round_trip()
+        seller_id = self._next_id("sellers")
+        row = {"seller_id": seller_id, "username": username, "email": email, "password": password,
+               "is_verified": is_verified, "created_at": _now(), "updated_at": _now()}
+        self.sellers[seller_id] = row
+        return dict(row)
+
+    async def select_seller(self, seller_id: int) -> Dict[str, Any]:
+        await self._round_trip()
+        if seller_id not in self.sellers:
+            raise SellerNotFoundError()
+        return dict(self.sellers[seller_id])
+
+    async def select_seller_by_login(self, email: str, password: str) -> Dict[str, Any]:
+        await self._round_trip()
+        for row in self.sellers.values():
+            if row["email"] == email and row["password"] == password:
+                return dict(row)
+        raise SellerNotFoundError()
+
+    async def select_sellers(self) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [dict(row) for row in reversed(self.sellers.values())]
+
+    async def update_seller(self, id: int, **updates: Any) -> Dict[str, Any]:
+        await self._round_trip()
+        if id not in self.sellers:
+            raise SellerNotFoundError()
+        self.sellers[id].update(updates, updated_at=_now())
+        return dict(self.sellers[id])
+
+    async def delete_seller(self, seller_id: int) -> Dict[str, Any]:
+        await self._round_trip()
+        if seller_id not in self.sellers:
+            raise SellerNotFoundError()
+        for item_id in [item_id for item_id, ad in self.ads.items() if ad["seller_id"] == seller_id]:
+            self._delete_ad(item_id)
+        return self.sellers.pop(seller_id)
+
+    # ads
+
+    async def create_ad(self, seller_id: int, name: str, description: str, category: int,
+                        images_qty: int) -> Dict[str, Any]:
+        await self._round_trip()
+        if seller_id not in self.sellers:
+            raise SellerNotFoundError()
+        item_id = self._next_id("ads")
+        row = {"item_id": item_id, "seller_id": seller_id, "name": name, "description": description,
+               "category": category, "images_qty": images_qty, "is_closed": False,
+               "created_at": _now(), "updated_at": _now()}
+        self.ads[item_id] = row
+        return dict(row)
+
+    async def copy_ads(self, rows: Sequence[Mapping[str, Any]]) -> List[int]:
+        await self._round_trip()
+        item_ids = []
+        for row in rows:
+            item_id = self._next_id("ads")
+            self.ads[item_id] = {"item_id": item_id, **row, "is_closed": False,
+                                 "created_at": _now(), "updated_at": _now()}
+            item_ids.append(item_id)
+        return item_ids
+
+    async def select_existing_seller_ids(self, seller_ids: Sequence[int]) -> Set[int]:
+        await self._round_trip()
+        return {seller_id for seller_id in seller_ids if seller_id in self.sellers}
+
+    async def select_ad(self, item_id: int) -> Dict[str, Any]:
+        await self._round_trip()
+        if item_id not in self.ads:
+            raise AdNotFoundError()
+        return dict(self.ads[item_id])
+
+    async def select_ad_for_prediction(self, item_id: int) -> Dict[str, Any]:
+        await self._round_trip()
+        ad = self.ads.get(item_id)
+        if ad is None or ad["is_closed"] or ad["seller_id"] not in self.sellers:
+            raise AdNotFoundError()
+        return {
+            "seller_id": ad["seller_id"],
+            "is_verified_seller": self.sellers[ad["seller_id"]]["is_verified"],
+            "item_id": item_id,
+            "name": ad["name"],
+            "description": ad["description"] or "",
+            "category": ad["category"],
+            "images_qty": ad["images_qty"],
+        }
+
+    async def select_ads_by_seller(self, seller_id: int) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        rows = [dict(ad) for ad in reversed(self.ads.values()) if ad["seller_id"] == seller_id]
+        if not rows:
+            raise SellerNotFoundError
+        return rows
+
+    async def select_ads(self) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [dict(ad) for ad in reversed(self.ads.values())]
+
+    async def update_ad(self, id: int, drop_pending: bool = False, **updates: Any) -> Dict[str, Any]:
+        await self._round_trip()
+        if id not in self.ads:
+            raise AdNotFoundError()
+        self.ads[id].update(updates, updated_at=_now())
+        deleted = []
+        if drop_pending or self._latest_completed(id) is not None:
+            deleted = self._delete_moderations(lambda row: row["item_id"] == id)
+        return {**self.ads[id], "moderation_ids": [row["id"] for row in deleted]}
+
+    def _delete_ad(self, item_id: int) -> Dict[str, Any]:
+        deleted = self._delete_moderations(lambda row: row["item_id"] == item_id)
+        return {**self.ads.pop(item_id), "moderation_ids": [row["id"] for row in deleted]}
+
+    async def delete_ad(self, item_id: int) -> Dict[str, Any]:
+        await self._round_trip()
+        if item_id not in self.ads:
+            raise AdNotFoundError()
+        return self._delete_ad(item_id)
+
+    # moderation_results
+
+    def _insert_moderation(self, item_id: int, status: str, is_violation: Optional[bool] = None,
+                           probability: Optional[float] = None, error_message: Optional[str] = None,
+                           **extra: Any) -> Dict[str, Any]:
+        task_id = self._next_id("moderation_results")
+        row = {"id": task_id, "item_id": item_id, "status": status, "is_violation": is_violation,
+               "probability": probability, "error_message": error_message, "model_version": None,
+               "created_at": _now(), "processed_at": None, **extra}
+        self.moderations[task_id] = row
+        return dict(row)
+
+    async def create_moderation(self, item_id: int, status: str, is_violation: bool, probability: float,
+                                error_message: str) -> Dict[str, Any]:
+        await self._round_trip()
+        return self._insert_moderation(item_id, status, is_violation, probability, error_message)
+
+    def _latest_completed(self, item_id: int) -> Optional[Dict[str, Any]]:
+        rows = [row for row in self.moderations.values() if row["item_id"] == item_id]
+        latest = max(rows, key=self._latest_key) if rows else None
+        return dict(latest) if latest is not None and latest["status"] == "completed" else None
+
+    async def submit_moderation_with_outbox(self, item_id: int, traceparent: Optional[str]) -> Dict[str, Any]:
+        await self._round_trip()
+        return self._latest_completed(item_id) or self._insert_pending_with_outbox(item_id, traceparent)
+
+    async def submit_moderation_for_prediction(self, item_id: int) -> Dict[str, Any]:
+        await self._round_trip()
+        ad = self.ads.get(item_id)
+        features = {}
+        if ad is not None and not ad["is_closed"] and ad["seller_id"] in self.sellers:
+            features = {"seller_id": ad["seller_id"], "is_verified_seller": self.sellers[ad["seller_id"]]["is_verified"],
+                        "name": ad["name"], "description": ad["description"] or "", "category": ad["category"],
+                        "images_qty": ad["images_qty"]}
+        existing = self._latest_completed(item_id)
+        if existing is not None:
+            return dict(existing, **features)
+        if not features:
+            raise AdNotFoundError()
+        return dict(self._insert_moderation(item_id, "pending"), **features)
+
+    def _insert_pending_with_outbox(self, item_id: int, traceparent: Optional[str]) -> Dict[str, Any]:
+        row = self._insert_moderation(item_id, "pending")
+        outbox_id = self._next_id("moderation_outbox")
+        self.outbox[outbox_id] = {"id": outbox_id, "task_id": row["id"], "item_id": item_id, "traceparent": traceparent,
+                                  "attempts": 0, "last_error": None, "created_at": row["created_at"],
+                                  "available_at": row["created_at"]}
+        return row
+
+    async def create_pending_moderations(self, item_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [self._insert_moderation(item_id, "pending") for item_id in item_ids]
+
+    async def create_pending_moderations_with_outbox(self, item_ids: Sequence[int],
+                                                     traceparent: Optional[str]) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [self._insert_pending_with_outbox(item_id, traceparent) for item_id in item_ids]
+
+    async def ensure_idempotency(self, item_id: int, status: str, is_violation: bool, probability: float,
+                                 error_message: str) -> bool:
+        await self._round_trip()
+        self._insert_moderation(item_id, status, is_violation, probability, error_message)
+        return True
+
+    async def select_moderation(self, id: int) -> Dict[str, Any]:
+        await self._round_trip()
+        if id not in self.moderations:
+            raise ModerationNotFoundError()
+        return dict(self.moderations[id])
+
+    async def select_latest_moderation(self, id: int) -> Optional[Dict[str, Any]]:
+        await self._round_trip()
+        rows = [row for row in self.moderations.values() if row["item_id"] == id]
+        if not rows:
+            return None
+        return dict(max(rows, key=self._latest_key))
+
+    async def select_moderations_by_ids(self, ids: Sequence[int]) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [dict(self.moderations[id]) for id in ids if id in self.moderations]
+
+    async def select_latest_moderations(self, item_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        latest: Dict[int, Dict[str, Any]] = {}
+        for row in self.moderations.values():
+            if row["item_id"] not in item_ids:
+                continue
+            current = latest.get(row["item_id"])
+            if current is None or self._latest_key(row) > self._latest_key(current):
+                latest[row["item_id"]] = row
+        return [dict(latest[item_id]) for item_id in sorted(latest)]
+
+    @staticmethod
+    def _latest_key(row: Mapping[str, Any]) -> Tuple[bool, datetime]:
+        # ORDER BY processed_at DESC в Postgres ставит NULL первыми
+        return row["processed_at"] is None, row["processed_at"] or datetime.min
+
+    async def select_moderations(self) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        return [dict(row) for row in reversed(self.moderations.values())]
+
+    def _delete_moderations(self, predicate: Callable[[Mapping[str, Any]], bool]) -> List[Dict[str, Any]]:
+        # ON DELETE CASCADE: вместе с задачами удаляются их записи outbox
+        deleted = [self.moderations.pop(task_id) for task_id, row in list(self.moderations.items()) if predicate(row)]
+        task_ids = {row["id"] for row in deleted}
+        for outbox_id in [outbox_id for outbox_id, row in self.outbox.items() if row["task_id"] in task_ids]:
+            del self.outbox[outbox_id]
+        return deleted
+
+    async def delete_moderation(self, id: int) -> Dict[str, Any]:
+        await self._round_trip()
+        if id not in self.moderations:
+            raise ModerationNotFoundError()
+        return self._delete_moderations(lambda row: row["id"] == id)[0]
+
+    async def delete_moderations_by_item_id(self, item_id: int) -> None:
+        await self._round_trip()
+        self._delete_moderations(lambda row: row["item_id"] == item_id)
+
+    async def update_moderation(self, id: int, **updates: Any) -> Dict[str, Any]:
+        await self._round_trip()
+        if id not in self.moderations:
+            raise ModerationNotFoundError()
+        self.moderations[id].update(updates)
+        return dict(self.moderations[id])
+
+    async def select_open_item_ids_by_seller(self, seller_id: int) -> List[int]:
+        await self._round_trip()
+        return [item_id for item_id, ad in self.ads.items() if ad["seller_id"] == seller_id and not ad["is_closed"]]
+
+    # moderation_outbox
+
+    async def claim_outbox(self, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+        await self._round_trip()
+        now = _now()
+        claimed = []
+        for row in sorted(self.outbox.values(), key=lambda row: row["id"]):
+            if len(claimed) >= limit:
+                break
+            if row["available_at"] > now:
+                continue
+            row.update(available_at=now + timedelta(seconds=lease_seconds), attempts=row["attempts"] + 1)
+            claimed.append(dict(row, age_seconds=(now - row["created_at"]).total_seconds()))
+        return claimed
+
+    async def delete_outbox(self, ids: Sequence[int]) -> None:
+        await self._round_trip()
+        for id in ids:
+            self.outbox.pop(id, None)
+
+    async def reschedule_outbox(self, ids: Sequence[int], delay_seconds: float, error: Optional[str]) -> None:
+        await self._round_trip()
+        for id in ids:
+            if id in self.outbox:
+                self.outbox[id].update(available_at=_now() + timedelta(seconds=delay_seconds), last_error=error)
+
+    async def outbox_stats(self) -> Dict[str, Any]:
+        await self._round_trip()
+        oldest = min((row["created_at"] for row in self.outbox.values()), default=None)
+        return {"pending": len(self.outbox),
+                "oldest_age_seconds": (_now() - oldest).total_seconds() if oldest else 0.0}
+
+    def storage_methods(self) -> Dict[Tuple[str, str, str], Callable]:
+        """(модуль, класс хранилища, метод) -> реализация в памяти."""
+        return {
+            ("repositories.sellers", "SellerPostgresStorage", "create"): self.create_seller,
+            ("repositories.sellers", "SellerPostgresStorage", "delete"): self.delete_seller,
+            ("repositories.sellers", "SellerPostgresStorage", "select_by_seller_id"): self.select_seller,
+            ("repositories.sellers", "SellerPostgresStorage", "select_by_login_and_password"): self.select_seller_by_login,
+            ("repositories.sellers", "SellerPostgresStorage", "select_many"): self.select_sellers,
+            ("repositories.sellers", "SellerPostgresStorage", "update"): self.update_seller,
+            ("repositories.ads", "AdPostgresStorage", "create"): self.create_ad,
+            ("repositories.ads", "AdPostgresStorage", "copy_many"): self.copy_ads,
+            ("repositories.ads", "AdPostgresStorage", "select_existing_seller_ids"): self.select_existing_seller_ids,
+            ("repositories.ads", "AdPostgresStorage", "select_by_item_id"): self.select_ad,
+            ("repositories.ads", "AdPostgresStorage", "select_for_prediction"): self.select_ad_for_prediction,
+            ("repositories.ads", "AdPostgresStorage", "delete"): self.delete_ad,
+            ("repositories.ads", "AdPostgresStorage", "select_by_seller_id"): self.select_ads_by_seller,
+            ("repositories.ads", "AdPostgresStorage", "select_many"): self.select_ads,
+            ("repositories.ads", "AdPostgresStorage", "update"): self.update_ad,
+            ("repositories.moderations", "ModerationPostgresStorage", "create"): self.create_moderation,
+            ("repositories.moderations", "ModerationPostgresStorage", "create_pending_many"): self.create_pending_moderations,
+            ("repositories.moderations", "ModerationPostgresStorage", "create_pending_many_with_outbox"): self.create_pending_moderations_with_outbox,
+            ("repositories.moderations", "ModerationPostgresStorage", "submit_with_outbox"): self.submit_moderation_with_outbox,
+            ("repositories.moderations", "ModerationPostgresStorage", "submit_for_prediction"): self.submit_moderation_for_prediction,
+            ("repositories.moderations", "ModerationPostgresStorage", "ensure_idempotency"): self.ensure_idempotency,
+            ("repositories.moderations", "ModerationPostgresStorage", "select_by_task_id"): self.select_moderation,
+            ("repositories.moderations", "ModerationPostgresStorage", "select_latest_by_item_id"): self.select_latest_moderation,
+            ("repositories.moderations", "ModerationPostgresStorage", "select_by_task_ids"): self.select_moderations_by_ids,
+            ("repositories.moderations", "ModerationPostgresStorage", "select_latest_by_item_ids"): self.select_latest_moderations,
+            ("repositories.moderations", "ModerationPostgresStorage", "select_many"): self.select_moderations,
+            ("repositories.moderations", "ModerationPostgresStorage", "delete"): self.delete_moderation,
+            ("repositories.moderations", "ModerationPostgresStorage", "delete_by_item_id"): self.delete_moderations_by_item_id,
+            ("repositories.moderations", "ModerationPostgresStorage", "update"): self.update_moderation,
+            ("repositories.moderations", "ModerationPostgresStorage", "select_item_ids_by_seller_id"): self.select_open_item_ids_by_seller,
+            ("repositories.outbox", "OutboxPostgresStorage", "claim"): self.claim_outbox,
+            ("repositories.outbox", "OutboxPostgresStorage", "delete"): self.delete_outbox,
+            ("repositories.outbox", "OutboxPostgresStorage", "reschedule"): self.reschedule_outbox,
+            ("repositories.outbox", "OutboxPostgresStorage", "stats"): self.outbox_stats,
+        }
+
+    def install(self) -> None:
+        """Подменяет методы *PostgresStorage, сохраняя метрики и спаны, которые висят на настоящих."""
+        import importlib
+        from metrics import DB_QUERY_DURATION, instrument_methods
+        from tracing import trace_methods
+
+        methods: Dict[Tuple[str, str], Dict[str, Callable]] = defaultdict(dict)
+        for (module_name, class_name, method_name), implementation in self.storage_methods().items():
+            methods[module_name, class_name][method_name] = _unbound(implementation, method_name)
+
+        for (module_name, class_name), replacements in methods.items():
+            # Класс-двойник с тем же именем проходит через те же декораторы, что и хранилище,
+            # поэтому метки (класс, метод) в DB_QUERY_DURATION и имена спанов не меняются
+            twin = trace_methods(**{"db.system": "postgresql"})(
+                instrument_methods(DB_QUERY_DURATION)(type(class_name, (), replacements)))
+            storage_class = getattr(importlib.import_module(module_name), class_name)
+            for method_name in replacements:
+                setattr(storage_class, method_name, vars(twin)[method_name])
+
+
+def _unbound(implementation: Callable, name: str) -> Callable:
+    async def method(self, *args, **kwargs):
+        return await implementation(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+class FakeRedisPipeline:
+
+    def __init__(self, redis: "FakeRedis"):
+        self._redis = redis
+        self._commands: List[Tuple[str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> List[Any]:
+        await self._redis._round_trip()
+        return [getattr(self._redis, f"_{name}")(*args, **kwargs) for name, args, kwargs in self._commands]
+
+
+class FakeRedis:
+    """Подмножество команд redis.asyncio.Redis, которое использует сервис. TTL не истекают."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.data: Dict[str, bytes] = {}
+        self.buckets: Dict[str, Any] = {}
+        self.published = 0
+
+    async def _round_trip(self) -> None:
+        self.round_trips += 1
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    @staticmethod
+    def _encode(value: Any) -> bytes:
+        return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+    def _set(self, name: str, value: Any, ex: Any = None, **kwargs: Any) -> bool:
+        self.data[name] = self._encode(value)
+        return True
+
+    def _get(self, name: str) -> Optional[bytes]:
+        return self.data.get(name)
+
+    def _mget(self, keys: Sequence[str], *args: str) -> List[Optional[bytes]]:
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        return [self.data.get(key) for key in [*keys, *args]]
+
+    def _delete(self, *names: str) -> int:
+        return sum(self.data.pop(name, None) is not None for name in names)
+
+    def _expire(self, name: str, time: Any) -> bool:
+        return name in self.data
+
+    def _publish(self, channel: str, message: Any) -> int:
+        # Подписчиков в бенчмарках нет: только считаем, чтобы не раздувать память
+        self.published += 1
+        return 0
+
+    def _evalsha(self, sha: str, numkeys: int, key: str, rate: float, burst: int) -> List[int]:
+        # Единственный Lua-скрипт сервиса - токен-бакет лимитера, эмулируем его напрямую
+        from services.rate_limits import TokenBucket
+
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(float(rate), int(burst))
+        allowed, retry_after = bucket.take()
+        return [int(allowed), int(retry_after * 1000)]
+
+    def _eval(self, script: str, numkeys: int, key: str, rate: float, burst: int) -> List[int]:
+        return self._evalsha("", numkeys, key, rate, burst)
+
+    def pipeline(self, transaction: bool = True) -> FakeRedisPipeline:
+        return FakeRedisPipeline(self)
+
+    def __getattr__(self, name: str):
+        command = getattr(self, f"_{name}", None)
+        if command is None:
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            await self._round_trip()
+            return command(*args, **kwargs)
+        return call
+
+    async def aclose(self) -> None:
+        pass
+
+    def install(self) -> None:
+        import clients.redis
+
+        original = clients.redis.get_redis_connection
+
+        @asynccontextmanager
+        async def get_fake_redis_connection():
+            yield self
+
+        # Модули импортируют get_redis_connection по имени - подменяем во всех загруженных
+        for module in list(sys.modules.values()):
+            if getattr(module, "get_redis_connection", None) is original:
+                module.get_redis_connection = get_fake_redis_connection
+
+
+@dataclass
+class BrokerRecord:
+    topic: str
+    partition: int
+    offset: int
+    key: Optional[bytes]
+    value: Any
+    headers: List[Tuple[str, bytes]] = field(default_factory=list)
+    timestamp: int = 0
+
+
+class InMemoryBroker:
+    """Топики Kafka в памяти: список сообщений на топик, один раздел."""
+
+    def __init__(self):
+        self.topics: Dict[str, List[BrokerRecord]] = defaultdict(list)
+        self.committed: Dict[Tuple[str, str], int] = {}
+        self.sent = 0
+        self._waiters: List[asyncio.Future] = []
+
+    def append(self, topic: str, key: Optional[bytes], value: Any,
+               headers: Optional[Sequence[Tuple[str, bytes]]] = None) -> BrokerRecord:
+        records = self.topics[topic]
+        record = BrokerRecord(topic, 0, len(records), key, value, list(headers or []),
+                              int(datetime.now(timezone.utc).timestamp() * 1000))
+        records.append(record)
+        self.sent += 1
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+        return record
+
+    async def wait_for_append(self, timeout: Optional[float]) -> None:
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def producer_factory(self) -> Callable[..., "InMemoryProducer"]:
+        def create(*args, **kwargs) -> InMemoryProducer:
+            return InMemoryProducer(self, **kwargs)
+        return create
+
+    def install_producer(self) -> None:
+        import clients.kafka
+
+        clients.kafka.AIOKafkaProducer = self.producer_factory()
+
+    def consumer_factory(self) -> Callable[..., "InMemoryConsumer"]:
+        def create(*topics: str, **kwargs) -> InMemoryConsumer:
+            return InMemoryConsumer(self, *topics, **kwargs)
+        return create
+
+    def install_worker(self) -> None:
+        import workers.moderation_worker
+
+        workers.moderation_worker.AIOKafkaConsumer = self.consumer_factory()
+        workers.moderation_worker.AIOKafkaProducer = self.producer_factory()
+
+
+class InMemoryProducer:
+    """Стенд-ин AIOKafkaProducer: сериализует как настоящий и складывает в InMemoryBroker."""
+
+    def __init__(self, broker: InMemoryBroker, value_serializer: Optional[Callable] = None,
+                 key_serializer: Optional[Callable] = None, **kwargs: Any):
+        self._broker = broker
+        self._value_serializer = value_serializer
+        self._key_serializer = key_serializer
+        self.started = False
+
+    async def start(self) -> None:
+        self.started = True
+
+    async def stop(self) -> None:
+        self.started = False
+
+    async def flush(self) -> None:
+        pass
+
+    def _append(self, topic: str, value: Any, key: Any, headers: Optional[Sequence[Tuple[str, bytes]]]) -> BrokerRecord:
+        if self._value_serializer is not None:
+            value = self._value_serializer(value)
+        if key is not None and self._key_serializer is not None:
+            key = self._key_serializer(key)
+        return self._broker.append(topic, key, value, headers)
+
+    async def send_and_wait(self, topic: str, value: Any = None, key: Any = None, partition: Optional[int] = None,
+                            timestamp_ms: Optional[int] = None, headers: Optional[Sequence[Tuple[str, bytes]]] = None):
+        return self._append(topic, value, key, headers)
+
+    async def send(self, topic: str, value: Any = None, key: Any = None, partition: Optional[int] = None,
+                   timestamp_ms: Optional[int] = None, headers: Optional[Sequence[Tuple[str, bytes]]] = None):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(self._append(topic, value, key, headers))
+        return future
+
+
+class InMemoryConsumer:
+    """Стенд-ин AIOKafkaConsumer над InMemoryBroker: getone/getmany, commit,
+    pause/resume и асинхронная итерация. Позиция группы хранится в брокере."""
+
+    def __init__(self, broker: InMemoryBroker, *topics: str, group_id: Optional[str] = None,
+                 value_deserializer: Optional[Callable] = None, key_deserializer: Optional[Callable] = None,
+                 **kwargs: Any):
+        from aiokafka.structs import TopicPartition
+
+        self._broker = broker
+        self._group_id = group_id or ""
+        self._value_deserializer = value_deserializer
+        self._key_deserializer = key_deserializer
+        self._partitions = [TopicPartition(topic, 0) for topic in topics]
+        self._positions: Dict[Any, int] = {}
+        self._paused: Set[Any] = set()
+        self._stopped = True
+
+    async def start(self) -> None:
+        self._stopped = False
+        for partition in self._partitions:
+            self._positions[partition] = self._broker.committed.get((self._group_id, partition.topic), 0)
+
+    async def stop(self) -> None:
+        self._stopped = True
+        for waiter in self._broker._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def assignment(self) -> Set[Any]:
+        return set(self._partitions)
+
+    def pause(self, *partitions: Any) -> None:
+        self._paused.update(partitions)
+
+    def resume(self, *partitions: Any) -> None:
+        self._paused.difference_update(partitions)
+
+    def paused(self) -> Set[Any]:
+        return set(self._paused)
+
+    def position(self, partition: Any) -> int:
+        return self._positions[partition]
+
+    async def committed(self, partition: Any) -> Optional[int]:
+        return self._broker.committed.get((self._group_id, partition.topic))
+
+    async def commit(self, offsets: Optional[Mapping[Any, int]] = None) -> None:
+        for partition, offset in (offsets or self._positions).items():
+            self._broker.committed[self._group_id, partition.topic] = offset
+
+    def _deliver(self, record: BrokerRecord):
+        from aiokafka.structs import ConsumerRecord
+
+        key, value = record.key, record.value
+        if key is not None and self._key_deserializer is not None:
+            key = self._key_deserializer(key)
+        if self._value_deserializer is not None:
+            value = self._value_deserializer(value)
+        return ConsumerRecord(record.topic, record.partition, record.offset, record.timestamp, 0, key, value,
+                              None, len(record.key or b""), len(record.value or b""), tuple(record.headers))
+
+    def _fetch(self, max_records: Optional[int]) -> Dict[Any, List[Any]]:
+        batches = {}
+        for partition in self._partitions:
+            if partition in self._paused:
+                continue
+            records = self._broker.topics[partition.topic]
+            start = self._positions[partition]
+            end = len(records) if max_records is None else min(len(records), start + max_records)
+            if end > start:
+                batches[partition] = [self._deliver(record) for record in records[start:end]]
+                self._positions[partition] = end
+                if max_records is not None:
+                    max_records -= end - start
+                    if max_records <= 0:
+                        break
+        return batches
+
+    async def getmany(self, *partitions: Any, timeout_ms: int = 0, max_records: Optional[int] = None):
+        batches = self._fetch(max_records)
+        if not batches and timeout_ms and not self._stopped:
+            await self._broker.wait_for_append(timeout_ms / 1000)
+            batches = self._fetch(max_records)
+        return batches
+
+    async def getone(self, *partitions: Any):
+        from aiokafka.errors import ConsumerStoppedError
+
+        while not self._stopped:
+            batches = self._fetch(1)
+            if batches:
+                return next(iter(batches.values()))[0]
+            await self._broker.wait_for_append(None)
+        raise ConsumerStoppedError()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        from aiokafka.errors import ConsumerStoppedError
+
+        try:
+            return await self.getone()
+        except ConsumerStoppedError:
+            raise StopAsyncIteration
+
+
+def install(postgres: str = "memory", redis: str = "memory", db_latency: float = 0.0,
+            redis_latency: float = 0.0) -> Dict[str, Any]:
+    """Подменяет Kafka брокером в памяти, а Postgres/Redis - заменителями, если выбран режим memory.
+    Вызывать после импорта приложения или воркера."""
+    standins: Dict[str, Any] = {"broker": InMemoryBroker()}
+    standins["broker"].install_producer()
+    if "workers.moderation_worker" in sys.modules:
+        standins["broker"].install_worker()
+
+    if postgres == "memory":
+        standins["db"] = InMemoryDatabase(latency=db_latency)
+        standins["db"].install()
+    if redis == "memory":
+        standins["redis"] = FakeRedis(latency=redis_latency)
+        standins["redis"].install()
+    return standins
@@ -0,0 +1,98 @@
+"""Бенчмарк времени старта: импорт приложения, загрузка модели и первое предсказание.
+
+Каждый замер выполняется в отдельном чистом процессе, итог - медиана по повторам.
+
+    python -m benchmarks.startup --repeat 5 --output bench/startup.json
+    python -m benchmarks.startup --baseline bench/startup.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from benchmarks.baseline import compare, load_results, save_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_SCRIPT = """
+import asyncio, json, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from model import model_singleton
+from services.predictions import PredictionService
+model_singleton.load()
+loaded = time.perf_counter()
+asyncio.run(PredictionService().predict(1, True, 1, "name", "description", 5, 3))
+predicted = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - started,
+    "model_load_s": loaded - imported,
+    "first_prediction_s": predicted - loaded,
+    "time_to_first_prediction_s": predicted - started,
+}}))
+"""
+
+
+def measure_once(module: str) -> Dict[str, float]:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT.format(module=module)],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_time_top(module: str, top: int) -> List[Tuple[float, str]]:
+    """Самые тяжёлые импорты по данным `python -X importtime` (cumulative, секунды)."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stderr
+
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        entries.append((int(cumulative) / 1e6, name.strip()))
+
+    return sorted(entries, reverse=True)[:top]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="Модуль точки входа (main или workers.moderation_worker)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Куда сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON с базовыми результатами для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимое относительное ухудшение")
+    parser.add_argument("--importtime-top", type=int, default=0, help="Показать N самых тяжёлых импортов")
+    args = parser.parse_args()
+
+    runs = [measure_once(args.module) for _ in range(args.repeat)]
+    metrics = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+    results = {"module": args.module, "repeat": args.repeat, "metrics": metrics}
+
+    for name, value in metrics.items():
+        print(f"{name:>28}: {value * 1000:10.1f} ms")
+
+    for seconds, name in import_time_top(args.module, args.importtime_top):
+        print(f"{seconds * 1000:10.1f} ms  {name}")
+
+    if args.output:
+        save_results(args.output, results)
+
+    if args.baseline:
+        regressions = compare(metrics, load_results(args.baseline)["metrics"], args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
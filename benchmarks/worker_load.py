@@ -0,0 +1,295 @@
+"""Бенчмарк пропускной способности KafkaConsumerWorker на брокере в памяти.
+
+В топик заранее кладётся N сообщений moderation_request по засеянной базе, после чего
+воркер (настоящий KafkaConsumerWorker, aiokafka заменён benchmarks.standins) вычитывает
+их до конца. Каждая комбинация параметров выполняется в отдельном процессе, чтобы
+пиковый RSS и состояние синглтонов не переходили между прогонами.
+
+Параметры сетки:
+    --concurrency    сколько сообщений обрабатывается одновременно (WORKER_CONCURRENCY, 0 - без ограничения)
+    --failure-rates  доля попыток скоринга, падающих с повторяемой ошибкой (путь повторов)
+    --missing-rate   доля сообщений по закрытым объявлениям (AdNotFoundError, сразу в DLQ)
+    --fatal-rate     доля попыток с неповторяемой ошибкой (в DLQ без повторов)
+    --schema-version версия схемы сообщений в топике (1 - JSON, 2 - бинарная)
+
+    python -m benchmarks.worker_load --messages 5000 --concurrency 0,16,64 --failure-rates 0,0.05 \\
+        --output bench/worker.json
+    python -m benchmarks.worker_load --baseline bench/worker.json --threshold 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+os.environ.setdefault("MODEL_RELOAD_INTERVAL", "0")
+os.environ.setdefault("WORKER_METRICS_PORT", "0")
+os.environ.setdefault("WORKER_PROFILE_PORT", "0")
+
+from benchmarks.baseline import compare, load_results, save_results
+from benchmarks.http_load import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPORTED_METRICS = ("messages_per_s", "e2e_p50_ms", "e2e_p99_ms", "db_round_trips_per_message", "peak_rss_mb")
+HIGHER_IS_BETTER = ("messages_per_s",)
+
+
+class InjectedRetryableError(ConnectionError):
+    """Повторяемая ошибка (подкласс ConnectionError из RETRYABLE_ERRORS)."""
+
+
+class InjectedFatalError(ValueError):
+    pass
+
+
+def bench_worker_class():
+    from workers.moderation_worker import KafkaConsumerWorker
+
+    class BenchWorker(KafkaConsumerWorker):
+        """Воркер с точками замера: начало обработки и исход сообщения."""
+
+        def __init__(self, concurrency: int, retry_delay: float, failure_rate: float, fatal_rate: float,
+                     rng: random.Random):
+            super().__init__(concurrency)
+            self.INITIAL_RETRY_DELAY = retry_delay
+            self._rng = rng
+            self._failure_rate = failure_rate
+            self._fatal_rate = fatal_rate
+            self.started_at: Dict[Any, float] = {}
+            self.latencies: List[float] = []
+            self.attempts = 0
+            self.processed = 0
+            self.dead_lettered = 0
+            self.done = asyncio.Event()
+            self.expected = 0
+
+            score = self.ml_service.score
+
+            async def score_with_failures(*args, **kwargs):
+                draw = self._rng.random()
+                if draw < self._failure_rate:
+                    raise InjectedRetryableError("injected retryable failure")
+                if draw < self._failure_rate + self._fatal_rate:
+                    raise InjectedFatalError("injected fatal failure")
+                return await score(*args, **kwargs)
+
+            self.ml_service.score = score_with_failures
+
+        def _finish(self, task_id: Any) -> None:
+            started_at = self.started_at.pop(task_id, None)
+            if started_at is not None:
+                self.latencies.append(time.perf_counter() - started_at)
+            if self.processed + self.dead_lettered >= self.expected:
+                self.done.set()
+
+        async def process_with_retry(self, message: Dict[str, Any], current_retry_count: int = 0):
+            if current_retry_count == 0:
+                self.started_at.setdefault(message.get("task_id"), time.perf_counter())
+            await super().process_with_retry(message, current_retry_count)
+
+        async def process_observed(self, message: Dict[str, Any], retry_count: int = 0) -> bool:
+            self.attempts += 1
+            processed = await super().process_observed(message, retry_count)
+            if processed:
+                self.processed += 1
+                self._finish(message.get("task_id"))
+            return processed
+
+        async def send_to_dlq(self, error: str, original_message: Dict[str, Any], retry_count: int = None):
+            await super().send_to_dlq(error, original_message, retry_count)
+            self.dead_lettered += 1
+            self._finish(original_message.get("task_id"))
+
+    return BenchWorker
+
+
+async def seed_messages(broker, messages: int, items: int, missing_rate: float, rng: random.Random,
+                        schema_version: int = 2):
+    """Продавец, объявления (часть закрыта - для пути AdNotFoundError), pending-задачи
+    и сообщения в топике в формате API."""
+    from clients import moderation_codec
+    from clients.kafka import kafka_producer
+    from kafka_settings import TOPIC
+    from repositories.ads import AdPostgresStorage
+    from repositories.moderations import ModerationPostgresStorage
+    from repositories.sellers import SellerPostgresStorage
+
+    seller = await SellerPostgresStorage().create(
+        username="bench", email=f"bench-{os.getpid()}-{time.time_ns()}@example.com",
+        password="bench", is_verified=True,
+    )
+    rows = [
+        {"seller_id": seller["seller_id"], "name": f"Item {i}", "description": f"Benchmark item number {i}",
+         "category": i % 100, "images_qty": i % 10}
+        for i in range(items + 1)
+    ]
+    item_ids = list(await AdPostgresStorage().copy_many(rows))
+    closed_item_id = item_ids.pop()
+    await AdPostgresStorage().update(closed_item_id, is_closed=True)
+
+    message_items = [closed_item_id if rng.random() < missing_rate else item_ids[i % len(item_ids)]
+                     for i in range(messages)]
+    tasks = await ModerationPostgresStorage().create_pending_many(message_items)
+
+    for task in tasks:
+        value, headers = moderation_codec.encode(kafka_producer.build_moderation_request(task["item_id"], task["id"]),
+                                                 schema_version)
+        broker.append(TOPIC, str(task["item_id"]).encode("utf-8"), value, headers)
+
+    return seller["seller_id"]
+
+
+async def run_once(args: argparse.Namespace) -> Dict[str, Any]:
+    from benchmarks.standins import install
+    from model import model_singleton
+    from repositories.sellers import SellerPostgresStorage
+    import workers.moderation_worker  # noqa: F401 - install() подменяет aiokafka в этом модуле
+
+    logging.getLogger().setLevel(args.log_level)
+    standins = install(args.postgres, args.redis, args.db_latency_ms / 1000, args.redis_latency_ms / 1000)
+    broker, db, redis = standins["broker"], standins.get("db"), standins.get("redis")
+    rng = random.Random(args.seed)
+
+    await asyncio.to_thread(model_singleton.load)
+    seller_id = await seed_messages(broker, args.messages, args.items, args.missing_rate, rng, args.schema_version)
+
+    worker = bench_worker_class()(args.concurrency, args.retry_delay, args.failure_rate, args.fatal_rate, rng)
+    worker.expected = args.messages
+    await worker.initialize()
+
+    db_before = db.round_trips if db else 0
+    redis_before = redis.round_trips if redis else 0
+    started = time.perf_counter()
+    running = asyncio.create_task(worker.run())
+    try:
+        await asyncio.wait_for(worker.done.wait(), args.timeout)
+    finally:
+        elapsed = time.perf_counter() - started
+        running.cancel()
+        await asyncio.gather(running, return_exceptions=True)
+        await SellerPostgresStorage().delete(seller_id)
+
+    latencies = sorted(worker.latencies)
+    completed = worker.processed + worker.dead_lettered
+    result = {
+        "messages": args.messages,
+        "processed": worker.processed,
+        "dead_lettered": worker.dead_lettered,
+        "attempts": worker.attempts,
+        "key_contended": worker.executor.contended,
+        "elapsed_s": elapsed,
+        "messages_per_s": completed / elapsed if elapsed > 0 else 0.0,
+        "e2e_p50_ms": percentile(latencies, 50) * 1000,
+        "e2e_p95_ms": percentile(latencies, 95) * 1000,
+        "e2e_p99_ms": percentile(latencies, 99) * 1000,
+        # ru_maxrss в Linux - в килобайтах
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if db is not None:
+        result["db_round_trips_per_message"] = (db.round_trips - db_before) / args.messages
+    if redis is not None:
+        result["redis_round_trips_per_message"] = (redis.round_trips - redis_before) / args.messages
+    return result
+
+
+def run_child(args: argparse.Namespace, concurrency: int, failure_rate: float) -> Dict[str, Any]:
+    command = [
+        sys.executable, "-m", "benchmarks.worker_load", "--child",
+        "--concurrency", str(concurrency), "--failure-rates", str(failure_rate),
+        "--messages", str(args.messages), "--items", str(args.items),
+        "--missing-rate", str(args.missing_rate), "--fatal-rate", str(args.fatal_rate),
+        "--retry-delay", str(args.retry_delay), "--postgres", args.postgres, "--redis", args.redis,
+        "--db-latency-ms", str(args.db_latency_ms), "--redis-latency-ms", str(args.redis_latency_ms),
+        "--timeout", str(args.timeout), "--seed", str(args.seed), "--log-level", args.log_level,
+        "--schema-version", str(args.schema_version),
+    ]
+    completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr[-4000:])
+        raise RuntimeError(f"Benchmark run concurrency={concurrency} failure_rate={failure_rate} failed")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def format_row(name: str, result: Dict[str, Any]) -> str:
+    return (f"{name:>28}: {result['messages_per_s']:9.1f} msg/s  p50 {result['e2e_p50_ms']:8.2f}  "
+            f"p99 {result['e2e_p99_ms']:8.2f} ms  dlq {result['dead_lettered']:6d}  "
+            f"db/msg {result.get('db_round_trips_per_message', float('nan')):5.2f}  "
+            f"rss {result['peak_rss_mb']:7.1f} MB")
+
+
+def flatten(results: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    return {f"{name}.{metric}": result[metric]
+            for name, result in results.items() for metric in REPORTED_METRICS if metric in result}
+
+
+def _numbers(cast):
+    return lambda value: [cast(part) for part in value.split(",") if part.strip()]
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--items", type=int, default=1000, help="Объявлений, по которым распределены сообщения")
+    parser.add_argument("--concurrency", type=_numbers(int), default=[0, 16, 64])
+    parser.add_argument("--failure-rates", type=_numbers(float), default=[0.0, 0.05])
+    parser.add_argument("--missing-rate", type=float, default=0.0)
+    parser.add_argument("--fatal-rate", type=float, default=0.0)
+    parser.add_argument("--retry-delay", type=float, default=0.0,
+                        help="INITIAL_RETRY_DELAY воркера, секунды (в проде 5)")
+    parser.add_argument("--postgres", choices=("memory", "env"), default="memory")
+    parser.add_argument("--redis", choices=("memory", "env"), default="memory")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0)
+    parser.add_argument("--redis-latency-ms", type=float, default=0.0)
+    parser.add_argument("--schema-version", type=int, choices=(1, 2), default=2)
+    parser.add_argument("--timeout", type=float, default=600.0, help="Предел на один прогон, секунды")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--output", help="Куда сохранить результаты в JSON")
+    parser.add_argument("--baseline", help="JSON с базовыми результатами для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимое относительное ухудшение")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main() -> int:
+    args = parse_args()
+
+    if args.child:
+        args.concurrency, args.failure_rate = args.concurrency[0], args.failure_rates[0]
+        print(json.dumps(asyncio.run(run_once(args))))
+        return 0
+
+    results = {}
+    for concurrency in args.concurrency:
+        for failure_rate in args.failure_rates:
+            name = f"concurrency={concurrency},failure={failure_rate:g}"
+            results[name] = run_child(args, concurrency, failure_rate)
+            print(format_row(name, results[name]), flush=True)
+
+    report = {"messages": args.messages, "postgres": args.postgres, "redis": args.redis,
+              "missing_rate": args.missing_rate, "fatal_rate": args.fatal_rate,
+              "schema_version": args.schema_version, "runs": results}
+
+    if args.output:
+        save_results(args.output, report)
+
+    if args.baseline:
+        baseline = flatten(load_results(args.baseline)["runs"])
+        higher_is_better = [name for name in baseline if name.endswith(HIGHER_IS_BETTER)]
+        regressions = compare(flatten(results), baseline, args.threshold, higher_is_better)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,13 @@
-import json
+import asyncio
 import logging
-from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, List, Sequence
 from aiokafka import AIOKafkaProducer
-from aiokafka.errors import KafkaError
+from clients import moderation_codec
 from kafka_settings import TOPIC
+from metrics import KAFKA_SEND_DURATION
+from opentelemetry.trace import SpanKind
+from tracing import inject_traceparent, start_span
 
 logger = logging.getLogger(__name__)
 
@@ -33,8 +36,8 @@ class KafkaProducer:
         
     async def start(self) -> None:
         try:
+            # Значения кодирует moderation_codec, версия схемы - в заголовках
             self._producer = AIOKafkaProducer(bootstrap_servers=self._bootstrap,
-                                                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
                                                 key_serializer=lambda k: str(k).encode('utf-8'))
             await self._producer.start()
             logger.info(
@@ -56,38 +59,36 @@ class KafkaProducer:
                 self._producer = None
     
     
-    async def send_moderation_request(self, item_id: int, task_id: int) -> bool:
-        message = {
-            "task_id": task_id,
-            "item_id": item_id,
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "event_type": "moderation_request",
-            "metadata": {
-                "source": "advertisement_service",
-                "version": "1.0"
-            }
-        }
-        
-        try:
-            await self._producer.send_and_wait(
-                topic=TOPIC,
-                key=str(item_id),
-                value=message
-            )
-            
-            logger.info(
-                f"Moderation request sent to Kafka. Item ID: {item_id}"
-            )
-            return True
-            
-        except KafkaError as e:
-            logger.error(f"Error in Kafka during sending moderation request for item_id={item_id}: {e}")
-            return False
-            
-        except Exception as e:
-            logger.error(f"Unexpected error during sending the moderation request: {e}")
-            return False
+    def build_moderation_request(self, item_id: int, task_id: int) -> Dict[str, Any]:
+        # traceparent текущего спана: воркер продолжит ту же трассу
+        return moderation_codec.build_request(item_id, task_id, inject_traceparent({}))
     
+    async def send_messages(self, messages: Sequence[Dict[str, Any]]) -> List[Optional[BaseException]]:
+        """Отправляет готовые сообщения (moderation_codec.build_request) пачкой и ждёт подтверждения
+        всех сразу. Возвращает ошибку по каждому сообщению или None, если оно доставлено."""
+        started_at = time.perf_counter()
+        with start_span(f"{TOPIC} publish batch", kind=SpanKind.PRODUCER,
+                        attributes={"messaging.destination.name": TOPIC, "messaging.batch.message_count": len(messages)}):
+            futures = []
+            try:
+                for message in messages:
+                    value, headers = moderation_codec.encode(message)
+                    futures.append(await self._producer.send(
+                        topic=TOPIC,
+                        key=str(message["item_id"]),
+                        value=value,
+                        headers=headers
+                    ))
+            except Exception as e:
+                logger.error(f"Error during batch sending of moderation requests: {e}")
+                # Уже поставленные в буфер сообщения ещё могут дойти - дожидаемся их
+                results = await asyncio.gather(*futures, return_exceptions=True)
+                return [result if isinstance(result, BaseException) else None for result in results] + \
+                    [e] * (len(messages) - len(futures))
+
+            results = await asyncio.gather(*futures, return_exceptions=True)
+        KAFKA_SEND_DURATION.labels(TOPIC).observe(time.perf_counter() - started_at)
+        return [result if isinstance(result, BaseException) else None for result in results]
     
     @property
     def is_ready(self) -> bool:
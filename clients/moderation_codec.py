@@ -0,0 +1,138 @@
+"""Кодек сообщений топика модерации.
+
+Версия схемы передаётся заголовком schema-version. Версия 2 - 25 байт struct
+(task_id, item_id, время отправки в миллисекундах, retry_count), постоянные поля
+(event_type, source) и traceparent - в заголовках Kafka. Сообщения без заголовка - прежний
+JSON (версия 1): воркер принимает обе версии, поэтому сначала обновляются воркеры, затем
+продюсеры переключаются на MODERATION_SCHEMA_VERSION=2. По умолчанию продюсеры пишут версию 1:
+API или relay, выкатанные раньше воркеров, не должны слать то, что старые воркеры не разберут.
+
+Декодированное сообщение - словарь с полями task_id, item_id, retry_count, event_type,
+metadata и timestamp_ms (в версии 2) или timestamp в ISO 8601 (в версии 1).
+"""
+import json
+import os
+import struct
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from errors import MessageDecodeError
+from tracing import TRACEPARENT
+
+SCHEMA_VERSION_HEADER = "schema-version"
+EVENT_TYPE_HEADER = "event-type"
+SOURCE_HEADER = "source"
+
+EVENT_TYPE = "moderation_request"
+SOURCE = "advertisement_service"
+
+MODERATION_SCHEMA_VERSION = int(os.getenv("MODERATION_SCHEMA_VERSION", "1"))
+
+Headers = List[Tuple[str, bytes]]
+
+_V2 = struct.Struct("<qqqB")
+_V2_HEADERS: Headers = [
+    (SCHEMA_VERSION_HEADER, b"2"),
+    (EVENT_TYPE_HEADER, EVENT_TYPE.encode("utf-8")),
+    (SOURCE_HEADER, SOURCE.encode("utf-8")),
+]
+
+
+def now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+def build_request(item_id: int, task_id: int, metadata: Optional[Dict[str, str]] = None,
+                  retry_count: int = 0) -> Dict[str, Any]:
+    return {
+        "task_id": task_id,
+        "item_id": item_id,
+        "timestamp_ms": now_ms(),
+        "retry_count": retry_count,
+        "event_type": EVENT_TYPE,
+        "metadata": dict(metadata or {}, source=SOURCE),
+    }
+
+
+def sent_at_ms(message: Mapping[str, Any]) -> Optional[int]:
+    """Время отправки сообщения любой версии в миллисекундах."""
+    if "timestamp_ms" in message:
+        return message["timestamp_ms"]
+    try:
+        return int(datetime.fromisoformat(message["timestamp"]).timestamp() * 1000)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def encode(message: Mapping[str, Any], version: int = MODERATION_SCHEMA_VERSION) -> Tuple[bytes, Headers]:
+    """Значение и заголовки сообщения в заданной версии схемы."""
+    metadata = message.get("metadata") or {}
+    traceparent = metadata.get(TRACEPARENT)
+    timestamp_ms = sent_at_ms(message)
+    if timestamp_ms is None:
+        timestamp_ms = now_ms()
+
+    if version == 2:
+        value = _V2.pack(message["task_id"], message["item_id"], timestamp_ms, message.get("retry_count", 0))
+        headers = list(_V2_HEADERS)
+    elif version == 1:
+        legacy = {key: value for key, value in message.items() if key != "timestamp_ms"}
+        legacy["timestamp"] = datetime.fromtimestamp(timestamp_ms / 1000, timezone.utc).isoformat()
+        legacy.setdefault("event_type", EVENT_TYPE)
+        legacy["metadata"] = dict(metadata, source=metadata.get("source", SOURCE), version="1.0")
+        value = json.dumps(legacy).encode("utf-8")
+        headers = []
+    else:
+        raise ValueError(f"Unknown moderation schema version: {version}")
+
+    if traceparent:
+        headers.append((TRACEPARENT, traceparent.encode("utf-8")))
+    return value, headers
+
+
+def schema_version(headers: Optional[Sequence[Tuple[str, bytes]]]) -> int:
+    for key, value in headers or ():
+        if key == SCHEMA_VERSION_HEADER:
+            try:
+                return int(value)
+            except ValueError:
+                raise MessageDecodeError(f"Malformed schema version header: {value!r}") from None
+    return 1
+
+
+def decode(value: bytes, headers: Optional[Sequence[Tuple[str, bytes]]] = None) -> Dict[str, Any]:
+    version = schema_version(headers)
+    if version == 1:
+        try:
+            message = json.loads(value)
+        except (TypeError, ValueError) as e:
+            # TypeError - пустое значение (tombstone)
+            raise MessageDecodeError(f"Malformed legacy moderation message: {e}") from e
+        if not isinstance(message, dict):
+            raise MessageDecodeError(f"Legacy moderation message must be a JSON object, got {type(message).__name__}")
+        return message
+    if version != 2:
+        raise MessageDecodeError(f"Unsupported moderation schema version: {version}")
+
+    try:
+        task_id, item_id, timestamp_ms, retry_count = _V2.unpack(value)
+    except struct.error as e:
+        raise MessageDecodeError(f"Malformed moderation message v2: {e}") from e
+    metadata: Dict[str, str] = {}
+    event_type = EVENT_TYPE
+    for key, header in headers:
+        if key == TRACEPARENT:
+            metadata[TRACEPARENT] = header.decode("utf-8")
+        elif key == SOURCE_HEADER:
+            metadata["source"] = header.decode("utf-8")
+        elif key == EVENT_TYPE_HEADER:
+            event_type = header.decode("utf-8")
+    return {
+        "task_id": task_id,
+        "item_id": item_id,
+        "timestamp_ms": timestamp_ms,
+        "retry_count": retry_count,
+        "event_type": event_type,
+        "metadata": metadata,
+    }
@@ -2,11 +2,14 @@ from typing import Optional, Dict, Any
 import asyncpg
 from contextlib import asynccontextmanager
 import os
+import time
+from metrics import PG_CONNECT_DURATION, PG_CONNECTIONS_IN_USE
 
 
 
 @asynccontextmanager
 async def get_pg_connection():
+    started_at = time.perf_counter()
     conn = await asyncpg.connect(
         host=os.getenv("DB_HOST", "localhost"),
         port=int(os.getenv("DB_PORT", 5432)),
@@ -14,7 +17,10 @@ async def get_pg_connection():
         password=os.getenv("DB_PASSWORD", "postgres"),
         database=os.getenv("DB_NAME", "moderation_db")
     )
+    PG_CONNECT_DURATION.observe(time.perf_counter() - started_at)
+    PG_CONNECTIONS_IN_USE.inc()
     try:
         yield conn
     finally:
+        PG_CONNECTIONS_IN_USE.dec()
         await conn.close()
\ No newline at end of file
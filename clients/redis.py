@@ -1,12 +1,16 @@
 import redis.asyncio as redis
 from typing import AsyncGenerator
 from contextlib import asynccontextmanager
+from metrics import REDIS_CONNECTIONS_IN_USE
 
 
 @asynccontextmanager
 async def get_redis_connection() -> AsyncGenerator[redis.Redis, None]:
     connection = redis.Redis(host="localhost", port=6379)
+    REDIS_CONNECTIONS_IN_USE.inc()
 
-    yield connection
-
-    await connection.aclose()
\ No newline at end of file
+    try:
+        yield connection
+    finally:
+        REDIS_CONNECTIONS_IN_USE.dec()
+        await connection.aclose()
\ No newline at end of file
@@ -0,0 +1 @@
+ALTER TABLE moderation_results ADD COLUMN IF NOT EXISTS model_version TEXT;
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS moderation_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    task_id INTEGER NOT NULL REFERENCES moderation_results(id) ON DELETE CASCADE,
+    item_id INTEGER NOT NULL,
+    traceparent TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP,
+    available_at TIMESTAMP NOT NULL DEFAULT LOCALTIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_moderation_outbox_available_at ON moderation_outbox(available_at, id);
+CREATE INDEX IF NOT EXISTS idx_moderation_outbox_task_id ON moderation_outbox(task_id);
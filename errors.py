@@ -8,4 +8,18 @@ class ModerationNotFoundError(Exception):
     pass
 
 class AdNotFoundError(Exception):
-    pass
\ No newline at end of file
+    pass
+
+class InferenceQueueFullError(Exception):
+    pass
+
+class ProfilingInProgressError(Exception):
+    pass
+
+class RateLimitExceededError(Exception):
+    def __init__(self, retry_after: float = 1.0):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after:.3f}s")
+        self.retry_after = retry_after
+
+class MessageDecodeError(ValueError):
+    pass
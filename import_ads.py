@@ -0,0 +1,63 @@
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+from dotenv import load_dotenv
+from logging_setup import setup_logging
+from services.ad_imports import AdImportService, DEFAULT_CHUNK_SIZE, NDJSON, CSV, SUPPORTED_FORMATS
+
+
+logger = logging.getLogger(__name__)
+
+
+async def read_lines(path: str) -> AsyncIterator[bytes]:
+    # Байты, а не текст: строку с битой кодировкой отклонит import_lines, а не весь импорт
+    with open(path, 'rb') as f:
+        for line in f:
+            yield line.rstrip(b'\r\n')
+
+
+def guess_format(path: str) -> Optional[str]:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.ndjson', '.jsonl'):
+        return NDJSON
+    if extension == '.csv':
+        return CSV
+    return None
+
+
+async def run(args: argparse.Namespace) -> int:
+    fmt = args.format or guess_format(args.path)
+    if fmt not in SUPPORTED_FORMATS:
+        logger.error(f"Cannot detect file format, pass --format ({', '.join(SUPPORTED_FORMATS)})")
+        return 2
+
+    result = await AdImportService().import_lines(
+        read_lines(args.path),
+        fmt=fmt,
+        default_seller_id=args.seller_id,
+        enqueue_moderation=args.enqueue_moderation,
+        chunk_size=args.chunk_size,
+    )
+
+    print(result.model_dump_json(indent=2))
+    return 0 if not result.rejected else 1
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    setup_logging(mode="sync")
+
+    parser = argparse.ArgumentParser(description='Bulk import of ads from NDJSON or CSV file')
+    parser.add_argument('path', help='Path to .ndjson/.jsonl or .csv file')
+    parser.add_argument('--format', choices=SUPPORTED_FORMATS, help='Input format (detected by extension by default)')
+    parser.add_argument('--seller-id', type=int, default=None, help='seller_id for rows without one')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--enqueue-moderation', action='store_true', help='Create pending moderation tasks and send them to Kafka')
+
+    sys.exit(asyncio.run(run(parser.parse_args())))
@@ -0,0 +1,161 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from errors import InferenceQueueFullError
+from metrics import INFERENCE_PENDING, MODEL_SCORING_DURATION
+
+logger = logging.getLogger(__name__)
+
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", INLINE).strip().lower()
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "64"))
+
+
+def _score(model, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    return model.predict(features), model.predict_proba(features)
+
+
+def _timed_score(model, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, float]:
+    # time.monotonic на Linux - общие для всех процессов часы, поэтому время ожидания
+    # в очереди корректно считается и для пула процессов
+    started_at = time.monotonic()
+    predictions, probabilities = _score(model, features)
+    return predictions, probabilities, started_at, time.monotonic()
+
+
+def _init_child(version: Optional[str]) -> None:
+    # Дочерний процесс не регистрирует модель в MLflow: иначе каждый старт пула
+    # публиковал бы новые версии и переносил алиас. Загружается версия, активная в родителе
+    os.environ["REGISTER_MLFLOW"] = "false"
+    from model import model_singleton
+
+    if version is None:
+        model_singleton.load()
+        return
+    model_singleton.swap(model_singleton.load_version(version), version)
+
+
+def _score_in_child(version: Optional[str], features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float, float]:
+    from model import model_singleton
+
+    model, active_version = model_singleton.snapshot()
+    if version is not None and version != active_version:
+        # Родитель подменил модель (hot reload) - догружаем ту же версию в дочернем процессе
+        model = model_singleton.load_version(version)
+        model_singleton.swap(model, version)
+    return _timed_score(model, features)
+
+
+@dataclass
+class InferenceStats:
+    submitted: int = 0
+    completed: int = 0
+    rejected: int = 0
+    failed: int = 0
+    queue_wait_seconds_total: float = 0.0
+    queue_wait_seconds_max: float = 0.0
+    run_seconds_total: float = 0.0
+
+
+class InferenceExecutor:
+    """Выполняет predict/predict_proba вне event loop.
+
+    inline - прямо в event loop (для крошечных моделей накладные расходы пула больше самого скоринга);
+    thread - пул потоков (sklearn/NumPy отпускают GIL на тяжёлых операциях);
+    process - пул процессов, в каждом из которых модель загружена заранее.
+
+    Очередь ограничена: при max_queue задач в очереди и в работе новые отклоняются
+    InferenceQueueFullError, чтобы перегрузка не копилась в памяти."""
+
+    def __init__(self, mode: str = INFERENCE_MODE, workers: int = INFERENCE_WORKERS,
+                 max_queue: int = INFERENCE_MAX_QUEUE):
+        if mode not in (INLINE, THREAD, PROCESS):
+            raise ValueError(f"Unknown inference mode: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self.max_queue = max_queue
+        self.stats = InferenceStats()
+        self._pending = 0
+        self._pool: Optional[Executor] = None
+        self._duration = MODEL_SCORING_DURATION.labels(mode)
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.mode == THREAD:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+            else:
+                from model import model_singleton
+
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_child,
+                    initargs=(model_singleton.version,),
+                )
+            logger.info(f"Inference executor started: mode={self.mode}, workers={self.workers}")
+        return self._pool
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, model, version: Optional[str], features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        if self.mode == INLINE:
+            started_at = time.perf_counter()
+            result = _score(model, features)
+            self._duration.observe(time.perf_counter() - started_at)
+            return result
+
+        if self._pending >= self.max_queue:
+            self.stats.rejected += 1
+            raise InferenceQueueFullError
+
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        INFERENCE_PENDING.inc()
+        self.stats.submitted += 1
+        enqueued_at = time.monotonic()
+        try:
+            if self.mode == THREAD:
+                future = loop.run_in_executor(self._get_pool(), _timed_score, model, features)
+            else:
+                future = loop.run_in_executor(self._get_pool(), _score_in_child, version, features)
+            predictions, probabilities, started_at, finished_at = await future
+        except Exception:
+            self.stats.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+            INFERENCE_PENDING.dec()
+            self._duration.observe(time.monotonic() - enqueued_at)
+
+        queue_wait = max(started_at - enqueued_at, 0.0)
+        self.stats.completed += 1
+        self.stats.queue_wait_seconds_total += queue_wait
+        self.stats.queue_wait_seconds_max = max(self.stats.queue_wait_seconds_max, queue_wait)
+        self.stats.run_seconds_total += finished_at - started_at
+        return predictions, probabilities
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "workers": self.workers, "max_queue": self.max_queue,
+                "pending": self._pending, **asdict(self.stats)}
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+
+inference_executor = InferenceExecutor()
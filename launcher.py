@@ -0,0 +1,335 @@
+"""Production-запуск API в несколько процессов с общей предзагруженной моделью.
+
+Мастер один раз импортирует приложение и загружает модель, замораживает кучу
+(gc.freeze) и форкает воркеров. Каждый воркер слушает тот же порт через SO_REUSEPORT,
+поэтому соединения балансирует ядро, а страницы модели и импортированных модулей
+остаются общими copy-on-write.
+
+    python launcher.py --workers 4 --port 8000
+
+Сигналы мастеру: SIGHUP - поочерёдный перезапуск воркеров (с обновлением модели в мастере),
+SIGUSR1 - отчёт по памяти воркеров, SIGTERM/SIGINT - плавная остановка.
+
+Новую версию модели отслеживает только мастер (раз в MODEL_RELOAD_INTERVAL): он загружает её
+и поочерёдно перезапускает воркеров. Собственный watcher в воркерах выключен - иначе каждый
+загрузил бы приватную копию модели, а процессы какое-то время отвечали бы разными версиями.
+"""
+import argparse
+import gc
+import importlib.util
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+from logging_setup import setup_logging, shutdown_logging
+
+
+logger = logging.getLogger("launcher")
+
+WORKER_READY_TIMEOUT = float(os.getenv("WORKER_READY_TIMEOUT", "60"))
+WORKER_STOP_TIMEOUT = float(os.getenv("WORKER_STOP_TIMEOUT", "30"))
+RSS_REPORT_INTERVAL = float(os.getenv("RSS_REPORT_INTERVAL", "300"))
+MIN_RESTART_INTERVAL = 1.0
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+
+
+def event_loop_impl() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_impl() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """RSS/PSS/shared/private процесса в килобайтах по /proc/<pid>/smaps_rollup.
+
+    PSS делит общие страницы между процессами: если модель действительно общая,
+    сумма PSS воркеров заметно меньше суммы их RSS."""
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    usage[name] = int(value.split()[0])
+    except OSError:
+        return {}
+
+    return {
+        "rss_kb": usage.get("Rss", 0),
+        "pss_kb": usage.get("Pss", 0),
+        "shared_kb": usage.get("Shared_Clean", 0) + usage.get("Shared_Dirty", 0),
+        "private_kb": usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0),
+    }
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def mark_worker_dead(pid: int) -> None:
+    from metrics import mark_process_dead
+
+    mark_process_dead(pid)
+
+
+def preload() -> None:
+    """Импортирует граф модулей приложения и загружает модель до форка."""
+    import main  # noqa: F401
+    from model import model_singleton
+
+    model_singleton.load()
+    logger.info(f"Preloaded application and model version {model_singleton.version}")
+    # Объекты, созданные до форка, больше не трогает циклический GC:
+    # иначе он пишет в их заголовки и превращает общие страницы в приватные
+    gc.collect()
+    gc.freeze()
+
+
+def refresh_model(version: Optional[str] = None) -> bool:
+    """Загружает в мастере версию, на которую указывает источник модели (или переданную).
+    Возвращает True, если активная версия сменилась."""
+    from model import model_singleton
+
+    try:
+        version = version or model_singleton.resolve_source_version()
+        if version == model_singleton.version:
+            return False
+        model_singleton.swap(model_singleton.load_version(version), version)
+        gc.collect()
+        gc.freeze()
+        return True
+    except Exception as e:
+        logger.error(f"Failed to refresh model in master, workers keep version {model_singleton.version}: {e}")
+        return False
+
+
+def serve_worker(host: str, port: int, ready_fd: int) -> None:
+    import uvicorn
+    from main import app
+    from model_watcher import model_watcher
+
+    # Обновления модели приходят через поочерёдный перезапуск из мастера
+    model_watcher.disable()
+
+    class Server(uvicorn.Server):
+        async def startup(self, sockets=None):
+            await super().startup(sockets=sockets)
+            if not self.should_exit:
+                os.write(ready_fd, b"1")
+            os.close(ready_fd)
+
+    config = uvicorn.Config(app, loop=event_loop_impl(), http=http_impl(), lifespan="on")
+    Server(config).run(sockets=[bind_socket(host, port)])
+
+
+class Launcher:
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.children: Dict[int, float] = {}
+        self._stopping = False
+        self._reload_requested = False
+        self._report_requested = False
+        self._last_spawn = 0.0
+        self._rejected_version: Optional[str] = None
+
+    def spawn(self) -> Optional[int]:
+        """Форкает воркера и ждёт, пока он поднимет lifespan. None - воркер не стартовал."""
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+
+        if pid == 0:
+            os.close(ready_read)
+            for signum in (signal.SIGHUP, signal.SIGUSR1, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                signal.signal(signum, signal.SIG_DFL)
+            code = 0
+            try:
+                serve_worker(self.host, self.port, ready_write)
+            except BaseException as e:
+                logger.error("Worker %s crashed: %s", os.getpid(), e)
+                code = 1
+            finally:
+                # os._exit не вызывает atexit: дописываем очередь логов сами
+                shutdown_logging()
+                os._exit(code)
+
+        os.close(ready_write)
+        self._last_spawn = time.monotonic()
+        self.children[pid] = self._last_spawn
+        try:
+            readable, _, _ = select.select([ready_read], [], [], WORKER_READY_TIMEOUT)
+            ready = bool(readable) and os.read(ready_read, 1) == b"1"
+        except InterruptedError:
+            ready = False
+        finally:
+            os.close(ready_read)
+
+        if ready:
+            logger.info(f"Worker {pid} is ready")
+            return pid
+        logger.error(f"Worker {pid} did not become ready in {WORKER_READY_TIMEOUT}s")
+        self.stop_child(pid)
+        return None
+
+    def stop_child(self, pid: int) -> None:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.children.pop(pid, None)
+            return
+
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        while time.monotonic() < deadline:
+            finished, _ = os.waitpid(pid, os.WNOHANG)
+            if finished:
+                break
+            time.sleep(0.1)
+        else:
+            logger.warning(f"Worker {pid} did not stop in {WORKER_STOP_TIMEOUT}s, killing")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.children.pop(pid, None)
+        mark_worker_dead(pid)
+
+    def check_model(self) -> bool:
+        """Один опрос источника модели. При новой версии загружает её в мастере и
+        перезапускает воркеров; версия, которая не загрузилась, больше не пробуется."""
+        from model import model_singleton
+
+        try:
+            version = model_singleton.resolve_source_version()
+        except Exception as e:
+            logger.error(f"Failed to check model version: {e}")
+            return False
+        if version in (model_singleton.version, self._rejected_version):
+            return False
+
+        logger.info(f"New model version detected: {version} (active: {model_singleton.version})")
+        if not refresh_model(version):
+            self._rejected_version = version
+            return False
+        self.restart_workers()
+        return True
+
+    def rolling_restart(self) -> None:
+        refresh_model()
+        self.restart_workers()
+
+    def restart_workers(self) -> None:
+        logger.info("Rolling restart of workers")
+        for old_pid in list(self.children):
+            if self._stopping:
+                return
+            if self.spawn() is None:
+                logger.error("Rolling restart aborted: replacement worker failed to start")
+                return
+            self.stop_child(old_pid)
+        logger.info("Rolling restart finished")
+
+    def report_memory(self) -> List[Dict[str, int]]:
+        report = [{"pid": os.getpid(), "role": "master", **memory_usage(os.getpid())}]
+        report += [{"pid": pid, "role": "worker", **memory_usage(pid)} for pid in sorted(self.children)]
+
+        for entry in report:
+            logger.info(
+                "%(role)s %(pid)s: rss=%(rss)s kB pss=%(pss)s kB shared=%(shared)s kB private=%(private)s kB",
+                {"role": entry["role"], "pid": entry["pid"], "rss": entry.get("rss_kb"),
+                 "pss": entry.get("pss_kb"), "shared": entry.get("shared_kb"), "private": entry.get("private_kb")}
+            )
+        workers = [entry for entry in report if entry["role"] == "worker"]
+        logger.info(
+            f"Workers total: rss={sum(e.get('rss_kb', 0) for e in workers)} kB, "
+            f"pss={sum(e.get('pss_kb', 0) for e in workers)} kB"
+        )
+        return report
+
+    def reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            mark_worker_dead(pid)
+            if self.children.pop(pid, None) is not None and not self._stopping:
+                logger.error(f"Worker {pid} exited unexpectedly (status {status}), restarting")
+
+    def _install_signals(self) -> None:
+        def stop(signum, frame):
+            self._stopping = True
+
+        def reload(signum, frame):
+            self._reload_requested = True
+
+        def report(signum, frame):
+            self._report_requested = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGHUP, reload)
+        signal.signal(signal.SIGUSR1, report)
+
+    def run(self) -> None:
+        preload()
+        self._install_signals()
+        logger.info(
+            f"Starting {self.workers} workers on {self.host}:{self.port} "
+            f"(loop={event_loop_impl()}, http={http_impl()})"
+        )
+        for _ in range(self.workers):
+            self.spawn()
+
+        next_report = time.monotonic() + RSS_REPORT_INTERVAL
+        next_model_check = time.monotonic() + MODEL_RELOAD_INTERVAL
+        while not self._stopping:
+            self.reap()
+
+            if len(self.children) < self.workers and time.monotonic() - self._last_spawn >= MIN_RESTART_INTERVAL:
+                self.spawn()
+            if self._reload_requested:
+                self._reload_requested = False
+                self.rolling_restart()
+            if MODEL_RELOAD_INTERVAL > 0 and time.monotonic() >= next_model_check:
+                self.check_model()
+                next_model_check = time.monotonic() + MODEL_RELOAD_INTERVAL
+            if self._report_requested or time.monotonic() >= next_report:
+                self._report_requested = False
+                next_report = time.monotonic() + RSS_REPORT_INTERVAL
+                self.report_memory()
+
+            time.sleep(0.2)
+
+        logger.info("Stopping workers...")
+        for pid in list(self.children):
+            os.kill(pid, signal.SIGTERM)
+        for pid in list(self.children):
+            self.stop_child(pid)
+        logger.info("Launcher stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    args = parser.parse_args()
+
+    setup_logging()
+    Launcher(args.host, args.port, args.workers).run()
+    sys.exit(0)
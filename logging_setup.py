@@ -0,0 +1,219 @@
+"""Настройка логирования сервиса и воркера.
+
+LOG_MODE:
+    queue - обработчик только кладёт запись в очередь, форматирование и запись в поток вывода
+            делает отдельный поток QueueListener (по умолчанию): event loop не ждёт I/O;
+    sync  - обычный StreamHandler, как logging.basicConfig.
+Переполнение очереди (LOG_QUEUE_SIZE) не блокирует вызывающего: запись отбрасывается
+и учитывается в dropped_records().
+
+LOG_SAMPLING - доли записей ниже WARNING, которые пишутся, в виде "ключ=доля,...".
+Ключ - событие (extra={"event": ...}), маршрут (extra={"route": ...}) или имя логгера
+(правило для "workers" действует и на "workers.moderation_worker"). Предупреждения и
+ошибки не отбрасываются никогда. Пример: LOG_SAMPLING="predict.request=0.01,worker.message=0.1".
+
+LOG_MAX_PAYLOAD - предел длины строковых аргументов и полей записи (0 - без ограничения).
+LOG_FORMAT - text (по умолчанию) или json: одна JSON-строка на запись с полями из extra.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Mapping, Optional, TextIO
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_MODE = os.getenv("LOG_MODE", "queue").strip().lower()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").strip().lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "")
+LOG_MAX_PAYLOAD = int(os.getenv("LOG_MAX_PAYLOAD", "256"))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Атрибуты, которые есть у любой LogRecord: всё остальное пришло из extra
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_handler: Optional[logging.Handler] = None
+_listener: Optional[QueueListener] = None
+_dropped = 0
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        key, rate = part.split("=", 1)
+        rates[key.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+def record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """Структурированные поля записи, переданные через extra."""
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю записей ниже WARNING по правилам для события, маршрута или логгера."""
+
+    def __init__(self, rates: Mapping[str, float]):
+        super().__init__()
+        self.rates = dict(rates)
+
+    def rate_for(self, record: logging.LogRecord) -> float:
+        for key in (getattr(record, "event", None), getattr(record, "route", None)):
+            if key is not None and key in self.rates:
+                return self.rates[key]
+
+        name = record.name
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rate_for(record)
+        return rate >= 1.0 or random.random() < rate
+
+
+def _truncate(value: Any, limit: int) -> Any:
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}...(+{len(value) - limit})"
+    return value
+
+
+class PayloadLimitFilter(logging.Filter):
+    """Обрезает длинные строковые аргументы и поля extra до limit символов."""
+
+    def __init__(self, limit: int):
+        super().__init__()
+        self.limit = limit
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0:
+            return True
+        if not record.args:
+            # Сообщение без аргументов (уже отформатированная строка, args == ()) обрезаем целиком
+            record.msg = _truncate(record.msg, self.limit * 4)
+        elif isinstance(record.args, tuple):
+            record.args = tuple(_truncate(arg, self.limit) for arg in record.args)
+        elif isinstance(record.args, Mapping):
+            record.args = {key: _truncate(value, self.limit) for key, value in record.args.items()}
+        for key, value in record_fields(record).items():
+            setattr(record, key, _truncate(value, self.limit))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler без форматирования в вызывающем потоке: сообщение собирается
+    в потоке QueueListener. Трейсбек превращается в текст сразу - кадры стека
+    к моменту записи уже могут измениться."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+
+def dropped_records() -> int:
+    return _dropped
+
+
+def _formatter(fmt: str) -> logging.Formatter:
+    return JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+
+
+def _start_listener(handler: NonBlockingQueueHandler, target: logging.Handler) -> QueueListener:
+    listener = QueueListener(handler.queue, target, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def _restart_listener_after_fork() -> None:
+    # Поток слушателя не переживает fork: в дочернем процессе заводим новую очередь
+    # и новый поток, иначе записи копились бы в очереди без читателя
+    global _listener
+    if _listener is None or not isinstance(_handler, NonBlockingQueueHandler):
+        return
+    targets = _listener.handlers
+    _handler.queue = queue.Queue(LOG_QUEUE_SIZE)
+    _listener = QueueListener(_handler.queue, *targets, respect_handler_level=True)
+    _listener.start()
+
+
+def setup_logging(level: str = LOG_LEVEL, mode: str = LOG_MODE, fmt: str = LOG_FORMAT,
+                  sampling: str = LOG_SAMPLING, max_payload: int = LOG_MAX_PAYLOAD,
+                  stream: Optional[TextIO] = None) -> None:
+    """Ставит обработчик корневого логгера. Повторный вызов заменяет предыдущую настройку."""
+    global _handler, _listener
+    shutdown_logging()
+
+    target = logging.StreamHandler(stream or sys.stderr)
+    target.setFormatter(_formatter(fmt))
+    target.addFilter(PayloadLimitFilter(max_payload))
+
+    if mode == "queue":
+        _handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _listener = _start_listener(_handler, target)
+    else:
+        _handler = target
+
+    _handler.addFilter(SamplingFilter(parse_sampling(sampling)))
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+
+
+def shutdown_logging() -> None:
+    """Дописывает очередь и снимает обработчик. Безопасно вызывать несколько раз."""
+    global _handler, _listener, _dropped
+    if _listener is not None:
+        _listener.stop()
+        if _dropped:
+            for target in _listener.handlers:
+                target.handle(logging.makeLogRecord({
+                    "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": "%d log records were dropped: logging queue was full", "args": (_dropped,),
+                }))
+            _dropped = 0
+        _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+atexit.register(shutdown_logging)
+os.register_at_fork(after_in_child=_restart_listener_after_fork)
@@ -1,31 +1,52 @@
+import asyncio
 from fastapi import FastAPI, HTTPException
 import uvicorn
-from routers import health, async_predict, ads, sellers, moderation_results, predict
+from routers import health, async_predict, ads, sellers, moderation_results, predict, metrics, debug
+from middlewares.admission import AdmissionMiddleware
+from middlewares.metrics import MetricsMiddleware
+from middlewares.tracing import TracingMiddleware
+from tracing import setup_tracing, shutdown_tracing
+from logging_setup import setup_logging
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 import os
 import warnings
 import logging
-from clients.kafka import kafka_producer
-from kafka_settings import KAFKA_BOOTSTRAP
+from model import model_singleton
+from model_watcher import model_watcher
+from inference import inference_executor
+from services.shadow import shadow_scorer
+from services.result_notifier import result_notifier
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 
+setup_logging()
 logger = logging.getLogger(__name__)
 
+async def load_model() -> None:
+    try:
+        await asyncio.to_thread(model_singleton.load)
+        logger.info(f"Model is ready, version: {model_singleton.version}")
+    except Exception as e:
+        logger.error(f"Model loading failed, prediction endpoints stay unavailable: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
-    logger.info(f"Configuring Kafka Producer with servers: {KAFKA_BOOTSTRAP}")
-    await kafka_producer.configure(KAFKA_BOOTSTRAP)
-    logger.info("Starting Kafka Producer...")
-    await kafka_producer.start()
+    # Модель грузится в фоне: сервер принимает запросы сразу, а эндпоинты
+    # предсказаний и /ready отвечают 503, пока модель не готова
+    setup_tracing("moderation-api")
+    # Kafka API не нужна: сообщения о задачах отправляет outbox relay
+    model_loading = asyncio.create_task(load_model())
+    await model_watcher.start()
+    shadow_starting = asyncio.create_task(shadow_scorer.start())
     yield
-    logger.info("Stopping Kafka Producer...")
-    await kafka_producer.stop()
+    await model_watcher.stop()
+    await result_notifier.stop()
+    await shadow_starting
+    await shadow_scorer.stop()
+    await model_loading
+    inference_executor.shutdown()
+    shutdown_tracing()
 
 app = FastAPI(
     title = 'Ad Moderation Service',
@@ -34,8 +55,13 @@ app = FastAPI(
     lifespan = lifespan
 )
 
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(health.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
 app.include_router(async_predict.router)
 app.include_router(predict.router)
 app.include_router(ads.router, prefix='/ads')
@@ -0,0 +1,178 @@
+"""Метрики Prometheus для API и воркера.
+
+Все метрики живут в памяти процесса, запись - пара perf_counter и observe без
+обращений к сети, поэтому инструментирование остаётся включённым в production.
+При запуске в несколько процессов (launcher.py) задайте PROMETHEUS_MULTIPROC_DIR -
+тогда /metrics любого воркера отдаёт сумму по всем процессам.
+"""
+import functools
+import inspect
+import os
+import time
+from typing import Callable, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Для отдельных запросов к Postgres/Redis и скоринга стандартные бакеты слишком грубые
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route"),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests being processed", multiprocess_mode="livesum",
+)
+
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight", "Requests admitted by the admission middleware", ("route_class",),
+    multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth", "Requests waiting for an admission slot", ("route_class",),
+    multiprocess_mode="livesum",
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total", "Requests shed with 503 by the admission middleware", ("route_class", "reason"),
+)
+
+RATE_LIMIT_REJECTED = Counter(
+    "rate_limit_rejected_total", "Moderation submissions rejected by the per-seller rate limit", ("endpoint", "tier"),
+)
+RATE_LIMIT_FALLBACK = Counter(
+    "rate_limit_fallback_total", "Rate limit decisions made in-process because Redis was unavailable",
+)
+RESULT_WAITERS = Gauge(
+    "moderation_result_waiters", "Long-poll and SSE requests waiting for moderation results", multiprocess_mode="livesum",
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Postgres storage call latency including connection setup",
+    ("storage", "method"), buckets=FAST_BUCKETS,
+)
+PG_CONNECT_DURATION = Histogram(
+    "postgres_connect_duration_seconds", "Time to open a Postgres connection", buckets=FAST_BUCKETS,
+)
+PG_CONNECTIONS_IN_USE = Gauge(
+    "postgres_connections_in_use", "Open Postgres connections", multiprocess_mode="livesum",
+)
+REDIS_OP_DURATION = Histogram(
+    "redis_operation_duration_seconds", "Redis storage call latency",
+    ("storage", "method"), buckets=FAST_BUCKETS,
+)
+REDIS_CONNECTIONS_IN_USE = Gauge(
+    "redis_connections_in_use", "Open Redis clients", multiprocess_mode="livesum",
+)
+
+MODEL_SCORING_DURATION = Histogram(
+    "model_scoring_duration_seconds", "Model scoring latency including inference queue wait",
+    ("mode",), buckets=FAST_BUCKETS,
+)
+INFERENCE_PENDING = Gauge(
+    "inference_pending", "Scoring calls queued or running in the inference executor", multiprocess_mode="livesum",
+)
+
+KAFKA_SEND_DURATION = Histogram(
+    "kafka_send_duration_seconds", "Kafka produce latency until broker acknowledgement",
+    ("topic",), buckets=FAST_BUCKETS,
+)
+
+OUTBOX_MESSAGES = Counter(
+    "outbox_messages_total", "Outbox rows handled by the relay", ("outcome",),
+)
+OUTBOX_LAG = Histogram(
+    "outbox_lag_seconds", "Time from outbox insert to Kafka acknowledgement",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+WORKER_MESSAGES = Counter(
+    "worker_messages_total", "Moderation messages handled by the worker", ("outcome",),
+)
+WORKER_MESSAGE_DURATION = Histogram(
+    "worker_message_duration_seconds", "Moderation message processing latency", buckets=FAST_BUCKETS,
+)
+WORKER_MESSAGE_SCHEMA = Counter(
+    "worker_message_schema_total", "Consumed moderation messages by schema version", ("version",),
+)
+WORKER_IN_FLIGHT = Gauge(
+    "worker_tasks_in_flight", "Moderation messages being processed", multiprocess_mode="livesum",
+)
+WORKER_PROCESS_RESTARTS = Counter(
+    "worker_process_restarts_total", "Worker processes restarted by the supervisor", ("cause",),
+)
+WORKER_KEYED_BACKLOG = Gauge(
+    "worker_keyed_backlog", "Messages queued in per-key executor queues", multiprocess_mode="livesum",
+)
+WORKER_ACTIVE_KEYS = Gauge(
+    "worker_active_keys", "Keys with queued or running messages", multiprocess_mode="livesum",
+)
+WORKER_KEY_CONTENDED = Counter(
+    "worker_key_contended_total", "Messages queued behind a message with the same key",
+)
+WORKER_SUBMIT_WAIT = Histogram(
+    "worker_submit_wait_seconds", "Time the consumer loop waited for executor backlog space", buckets=FAST_BUCKETS,
+)
+
+
+def _timed(func: Callable, observer) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            observer.observe(time.perf_counter() - started_at)
+    return wrapper
+
+
+def instrument_methods(histogram: Histogram):
+    """Декоратор класса: замеряет все публичные корутины в histogram с метками (класс, метод).
+    Дочерние серии создаются один раз при декорировании, а не на каждом вызове."""
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.iscoroutinefunction(method):
+                continue
+            setattr(cls, name, _timed(method, histogram.labels(cls.__name__, name)))
+        return cls
+    return decorate
+
+
+def _registry() -> CollectorRegistry:
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int) -> Optional[int]:
+    """HTTP-сервер /metrics в отдельном потоке - для процессов без FastAPI (воркер)."""
+    if port <= 0:
+        return None
+    start_http_server(port, registry=_registry())
+    return port
+
+
+def mark_process_dead(pid: int) -> None:
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,204 @@
+"""Контроль допуска: ограничение одновременных запросов по классу маршрута.
+
+Когда хранилище замедляется, запросы копятся в event loop и растёт латентность всех
+запросов сразу. Здесь у каждого класса маршрутов свой лимит одновременных запросов и
+короткая ограниченная очередь ожидания: запрос сверх лимита ждёт свободного места
+не дольше ADMISSION_MAX_WAIT_MS, а при полной очереди или по истечении ожидания
+сразу получает 503 с Retry-After.
+
+ADMISSION_LIMITS и ADMISSION_QUEUES - "класс=число,...", 0 в лимите снимает ограничение.
+Классы: predict, async_submit, reads, crud и waits - long-poll и SSE ожидания результатов, которые
+держат место десятки секунд и не должны занимать лимит reads. /health, /ready, /metrics и /debug
+не ограничиваются.
+"""
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Mapping, Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+from metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTED
+
+PREDICT = "predict"
+ASYNC_SUBMIT = "async_submit"
+READS = "reads"
+CRUD = "crud"
+WAITS = "waits"
+
+DEFAULT_LIMITS = {PREDICT: 64, ASYNC_SUBMIT: 128, READS: 256, CRUD: 64, WAITS: 2048}
+DEFAULT_QUEUES = {PREDICT: 64, ASYNC_SUBMIT: 128, READS: 256, CRUD: 64, WAITS: 0}
+
+EXEMPT_PREFIXES = ("/health", "/ready", "/metrics", "/debug", "/docs", "/redoc", "/openapi.json")
+
+ADMISSION_MAX_WAIT_MS = float(os.getenv("ADMISSION_MAX_WAIT_MS", "100"))
+ADMISSION_RETRY_AFTER = os.getenv("ADMISSION_RETRY_AFTER", "1")
+
+
+def parse_limits(spec: str, defaults: Mapping[str, int]) -> Dict[str, int]:
+    limits = dict(defaults)
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        route_class, value = part.split("=", 1)
+        limits[route_class.strip()] = max(int(value), 0)
+    return limits
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """Класс маршрута по методу и пути (маршрутизация ещё не выполнена). None - без ограничений."""
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path == "/predict" or path.startswith("/simple_predict/"):
+        return PREDICT
+    if path.startswith("/async_predict/"):
+        return ASYNC_SUBMIT
+    if path.startswith("/moderation_results/") and (path.endswith("/wait") or path == "/moderation_results/stream"):
+        return WAITS
+    if path == "/moderation_results/lookup":
+        return READS
+    if method in ("GET", "HEAD"):
+        return READS
+    return CRUD
+
+
+class AdmissionGate:
+    """Счётный семафор с ограниченной FIFO-очередью ожидающих. Освободившееся место
+    передаётся первому ожидающему напрямую, без повторной конкуренции."""
+
+    def __init__(self, name: str, limit: int, queue_size: int):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._in_flight_gauge = ADMISSION_IN_FLIGHT.labels(name)
+        self._queue_gauge = ADMISSION_QUEUE_DEPTH.labels(name)
+
+    def _admit(self) -> bool:
+        self.in_flight += 1
+        self.admitted += 1
+        self._in_flight_gauge.inc()
+        return True
+
+    def _reject(self, reason: str) -> bool:
+        if reason == "queue_full":
+            self.rejected_queue_full += 1
+        else:
+            self.rejected_timeout += 1
+        ADMISSION_REJECTED.labels(self.name, reason).inc()
+        return False
+
+    async def acquire(self, max_wait: float) -> bool:
+        if self.limit <= 0:
+            return self._admit()
+        if self.in_flight < self.limit and not self._waiters:
+            return self._admit()
+        if len(self._waiters) >= self.queue_size or max_wait <= 0:
+            return self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queue_gauge.inc()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # Клиент ушёл, пока ждал: если место уже передали, возвращаем его
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            self._queue_gauge.dec()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+        if waiter.done() and not waiter.cancelled():
+            # Место передано в release(): in_flight уже учитывает этот запрос
+            self.admitted += 1
+            return True
+        waiter.cancel()
+        return self._reject("timeout")
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.in_flight -= 1
+        self._in_flight_gauge.dec()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+class AdmissionController:
+
+    def __init__(self, limits: Mapping[str, int] = DEFAULT_LIMITS, queues: Mapping[str, int] = DEFAULT_QUEUES,
+                 max_wait_ms: float = ADMISSION_MAX_WAIT_MS):
+        self.max_wait = max_wait_ms / 1000
+        self.gates = {name: AdmissionGate(name, limit, queues.get(name, limit)) for name, limit in limits.items()}
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(parse_limits(os.getenv("ADMISSION_LIMITS", ""), DEFAULT_LIMITS),
+                   parse_limits(os.getenv("ADMISSION_QUEUES", ""), DEFAULT_QUEUES))
+
+    def gate_for(self, method: str, path: str) -> Optional[AdmissionGate]:
+        name = route_class(method, path)
+        return self.gates.get(name) if name is not None else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: gate.snapshot() for name, gate in self.gates.items()}
+
+
+admission_controller = AdmissionController.from_env()
+
+_OVERLOADED_BODY = json.dumps({"detail": "Service is overloaded, retry later"}).encode("utf-8")
+
+
+class AdmissionMiddleware:
+    """ASGI-middleware: до обработки занимает место в классе маршрута, при отказе отвечает 503."""
+
+    def __init__(self, app: ASGIApp, controller: Optional[AdmissionController] = None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        gate = self.controller.gate_for(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await gate.acquire(self.controller.max_wait):
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(_OVERLOADED_BODY)).encode("latin-1")),
+                    (b"retry-after", ADMISSION_RETRY_AFTER.encode("latin-1")),
+                ],
+            })
+            await send({"type": "http.response.body", "body": _OVERLOADED_BODY})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
@@ -0,0 +1,53 @@
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_DURATION, HTTP_REQUESTS
+
+# Несовпавшие пути (404, сканеры) сводим в одну серию, чтобы не раздувать число меток
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    path_regex = getattr(route, "path_regex", None)
+    if path_regex is not None and path_regex.match(scope["path"]):
+        return route.path
+    # Маршрут из роутера, подключённого с prefix, может хранить путь без префикса -
+    # тогда восстанавливаем шаблон, подставляя имена параметров в реальный путь
+    params = {str(value): f"{{{name}}}" for name, value in scope.get("path_params", {}).items()}
+    return "/".join(params.get(segment, segment) for segment in scope["path"].split("/"))
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: число запросов, латентность и запросы в работе по шаблону маршрута
+    (/ads/{item_id}, а не конкретный путь). Чистый ASGI без BaseHTTPMiddleware,
+    чтобы не добавлять лишнюю задачу и копирование тела на каждый запрос."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Роутер FastAPI кладёт совпавший маршрут в тот же scope
+            route = route_template(scope)
+            method = scope["method"]
+            HTTP_REQUEST_DURATION.labels(method, route).observe(time.perf_counter() - started_at)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
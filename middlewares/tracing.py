@@ -0,0 +1,42 @@
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from middlewares.metrics import route_template
+from tracing import TRACEPARENT, extract_context, is_enabled, start_span
+
+
+class TracingMiddleware:
+    """Серверный спан на каждый HTTP-запрос. Входящий traceparent продолжает трассу
+    вызывающей стороны; имя спана - метод и шаблон маршрута."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not is_enabled():
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"] if key == TRACEPARENT.encode()
+        }
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        with start_span(method, kind=SpanKind.SERVER, parent=extract_context(carrier)) as span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = route_template(scope)
+                span.update_name(f"{method} {route}")
+                span.set_attribute("http.request.method", method)
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.response.status_code", status_code)
+                if status_code >= 500:
+                    span.set_status(Status(StatusCode.ERROR))
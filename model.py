@@ -1,27 +1,49 @@
+from __future__ import annotations
+
 import numpy as np
-from sklearn.linear_model import LogisticRegression
-from sklearn.pipeline import Pipeline
 import pickle
+import hashlib
 import logging
-import mlflow
-from mlflow.sklearn import log_model
+import threading
 import os
 import warnings
-from mlflow.tracking import MlflowClient
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, TYPE_CHECKING
+from model_artifact import model_artifact_cache
+
+# sklearn и mlflow импортируются лениво внутри методов: импорт модуля не должен
+# стоить секунд старта для процессов, которым модель не нужна (или нужна позже)
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 
 logger = logging.getLogger(__name__)
 
+load_dotenv()
+
+MODEL_NAME = "moderation-model"
+MODEL_ALIAS = "production"
+MODEL_PATH = "model.pkl"
+CANDIDATE_ALIAS = "candidate"
+CANDIDATE_MODEL_PATH = os.getenv("CANDIDATE_MODEL_PATH", "candidate_model.pkl")
+MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI", "sqlite:///mlflow.db")
+
+# Фиксированная канареечная пачка признаков [is_verified_seller, images_qty, description_length, category],
+# на которой новая версия модели прогревается и проверяется перед подменой
+CANARY_FEATURES = np.array([
+    [0.0, 0.0, 0.01, 0.0],
+    [1.0, 0.5, 0.2, 0.05],
+    [0.0, 1.0, 1.0, 1.0],
+    [1.0, 0.0, 0.5, 0.5],
+])
+
 class ModelSingleton:
 
     _instance: Optional['ModelSingleton'] = None
     _model: Optional[Pipeline] = None
+    _version: Optional[str] = None
+    _previous_model: Optional[Pipeline] = None
+    _previous_version: Optional[str] = None
     
     def __new__(cls):
         if cls._instance is None:
@@ -31,13 +53,33 @@ class ModelSingleton:
     def __init__(self):
         if not hasattr(self, '_initialized'):
             self._initialized = True
+            self._swap_lock = threading.Lock()
+            self._load_lock = threading.Lock()
+            self._ready = threading.Event()
+
+    def load(self) -> None:
+        """Регистрирует (при REGISTER_MLFLOW) и загружает модель. Идемпотентен.
+        Блокирующий вызов - из event loop вызывать через asyncio.to_thread."""
+        with self._load_lock:
+            if self.is_loaded:
+                self._ready.set()
+                return
             register_mlflow = os.getenv("REGISTER_MLFLOW", "false").strip().lower() == "true"
             if register_mlflow:
-                self._model = self._register_model_in_mlflow()
-            self._model = self._load_model()
+                self._register_model_in_mlflow()
+            model, version = self._load_model()
+            self.validate(model)
+            self.swap(model, version)
+            self._ready.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        return self._ready.wait(timeout)
 
     def _train_model(self) -> Pipeline:
         """Обучает простую модель на синтетических данных."""
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import Pipeline
+
         np.random.seed(42)
         # Признаки: [is_verified_seller, images_qty, description_length, category]
         X = np.random.rand(1000, 4)
@@ -53,23 +95,26 @@ class ModelSingleton:
         model.fit(X, y)
         return model
 
-    def _save_model(self, model, path="model.pkl"):
+    def _save_model(self, model, path=MODEL_PATH):
         with open(path, "wb") as f:
             pickle.dump(model, f)
 
     def _register_model_in_mlflow(self):
         """Регистрирует модель в MLflow Model Registry"""
         try:
+            import mlflow
+            from mlflow.sklearn import log_model
+            from mlflow.tracking import MlflowClient
             
-            mlflow.set_tracking_uri("sqlite:///mlflow.db")
-            mlflow.set_experiment("moderation-model")
+            mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+            mlflow.set_experiment(MODEL_NAME)
             
             with mlflow.start_run() as run:
                 model = self._train_model()
                 log_model(
                     model, 
                     name = "model", 
-                    registered_model_name="moderation-model",
+                    registered_model_name=MODEL_NAME,
                     metadata={"suppress_pydantic_warnings": True},
                     serialization_format="skops"
                 )
@@ -77,14 +122,14 @@ class ModelSingleton:
                 client = MlflowClient()
                 
                 model_versions = client.search_model_versions(
-                    f"name='moderation-model' and run_id='{run.info.run_id}'"
+                    f"name='{MODEL_NAME}' and run_id='{run.info.run_id}'"
                 )
                 
                 if model_versions:
                     latest_version = model_versions[0].version
                     client.set_registered_model_alias(
-                        name="moderation-model",
-                        alias="production",
+                        name=MODEL_NAME,
+                        alias=MODEL_ALIAS,
                         version=latest_version
                     )
                     
@@ -101,34 +146,44 @@ class ModelSingleton:
             logger.error(f"Failed to register model in MLflow: {e}")
             raise
 
-    def _load_model(self, path="model.pkl"):
+    def _load_model(self, path=MODEL_PATH) -> Tuple[Pipeline, str]:
         use_mlflow = os.getenv("USE_MLFLOW", "false").strip().lower() == "true"
         
         if use_mlflow:
+            # Версию всегда спрашиваем у реестра (алиас мог переехать, а watcher может быть
+            # выключен), кэш отдаёт только байты этой версии. Сохранённый указатель алиаса
+            # используется, лишь когда реестр недоступен
             try:
-                return self._load_model_from_mlflow()
+                version = self._resolve_mlflow_version()
             except Exception as e:
+                cached_version = model_artifact_cache.get_alias_version(MODEL_NAME, MODEL_ALIAS)
+                cached_model = cached_version and model_artifact_cache.load(MODEL_NAME, cached_version)
+                if cached_model:
+                    logger.warning(f"MLflow is unavailable ({e}), serving cached model version {cached_version}")
+                    return cached_model, cached_version
                 logger.warning(f"MLflow loading failed, falling back to local file: {e}")
+            else:
+                return self._load_model_from_mlflow(version=version)
         try:
             with open(path, "rb") as f:
                 model = pickle.load(f)
             logger.info("Model loaded successfully from file: %s", path)
-            return model
+            return model, self._local_version(path)
         
         except FileNotFoundError:
             logger.info("Model not found at %s, training new model...", path)
             model = self._train_model()
             self._save_model(model)
             logger.info("Model trained and saved successfully to: %s", path)
-            return model
+            return model, self._local_version(path)
 
-    def _load_model_from_mlflow(self, model_name: str = "moderation-model", stage: str = "production"):
+    def _load_model_from_mlflow(self, model_name: str = MODEL_NAME, stage: str = MODEL_ALIAS,
+                                version: Optional[str] = None) -> Tuple[Pipeline, str]:
         try:
-            model_uri = f"models:/{model_name}@{stage}"
-            logger.info(f"Loading model from MLflow: {model_uri}")
-            model = mlflow.sklearn.load_model(model_uri)
-            logger.info("Model loaded successfully from MLflow")
-            return model
+            version = version or self._resolve_mlflow_version(model_name, stage)
+            model = self._load_registry_version(version, model_name)
+            model_artifact_cache.set_alias_version(model_name, stage, version)
+            return model, version
             
         except Exception as e:
             logger.error(f"Failed to load model from MLflow: {e}")
@@ -136,11 +191,122 @@ class ModelSingleton:
             model = self._train_model()
             self._save_model(model)
             logger.info("Model trained and saved successfully to: model.pkl")
-            return model
+            return model, self._local_version(MODEL_PATH)
+
+    def _load_registry_version(self, version: str, model_name: str = MODEL_NAME):
+        cached_model = model_artifact_cache.load(model_name, version)
+        if cached_model is not None:
+            logger.info(f"Model version {version} loaded from artifact cache")
+            return cached_model
+
+        import mlflow.sklearn
+
+        mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+        model_uri = f"models:/{model_name}/{version}"
+        logger.info(f"Loading model from MLflow: {model_uri}")
+        model = mlflow.sklearn.load_model(model_uri)
+        logger.info("Model loaded successfully from MLflow")
+
+        if model_artifact_cache.store(model_name, version, model):
+            # Дальше работаем с mmap-копией: её страницы общие для всех процессов
+            model = model_artifact_cache.load(model_name, version) or model
+        return model
+
+    def _resolve_mlflow_version(self, model_name: str = MODEL_NAME, stage: str = MODEL_ALIAS) -> str:
+        from mlflow.tracking import MlflowClient
+
+        client = MlflowClient(tracking_uri=MLFLOW_TRACKING_URI)
+        return str(client.get_model_version_by_alias(model_name, stage).version)
+
+    def _local_version(self, path: str = MODEL_PATH) -> str:
+        with open(path, "rb") as f:
+            return f"local-{hashlib.sha1(f.read()).hexdigest()[:12]}"
+
+    def resolve_source_version(self) -> str:
+        """Версия, на которую сейчас указывает источник модели (алиас в MLflow или model.pkl).
+        Блокирующий вызов - из event loop вызывать через asyncio.to_thread."""
+        use_mlflow = os.getenv("USE_MLFLOW", "false").strip().lower() == "true"
+        if use_mlflow:
+            return self._resolve_mlflow_version()
+        return self._local_version()
+
+    def load_version(self, version: str) -> Pipeline:
+        """Загружает, прогревает и проверяет на канареечной пачке конкретную версию модели.
+        Блокирующий вызов - из event loop вызывать через asyncio.to_thread."""
+        if version.startswith("local-"):
+            with open(MODEL_PATH, "rb") as f:
+                model = pickle.load(f)
+            self.validate(model)
+        else:
+            model = self._load_registry_version(version)
+            self.validate(model)
+            model_artifact_cache.set_alias_version(MODEL_NAME, MODEL_ALIAS, version)
+        return model
+
+    def resolve_candidate_version(self, alias: str = CANDIDATE_ALIAS) -> str:
+        """Версия, на которую сейчас указывает алиас кандидата (или CANDIDATE_MODEL_PATH без MLflow).
+        Блокирующий вызов - из event loop вызывать через asyncio.to_thread."""
+        use_mlflow = os.getenv("USE_MLFLOW", "false").strip().lower() == "true"
+        if use_mlflow:
+            return self._resolve_mlflow_version(MODEL_NAME, alias)
+        return self._local_version(CANDIDATE_MODEL_PATH)
+
+    def load_candidate(self, alias: str = CANDIDATE_ALIAS) -> Tuple[Pipeline, str]:
+        """Загружает и проверяет модель-кандидата для теневого скоринга, не трогая активную
+        модель и указатель production-алиаса. Без MLflow кандидат берётся из CANDIDATE_MODEL_PATH.
+        Блокирующий вызов - из event loop вызывать через asyncio.to_thread."""
+        use_mlflow = os.getenv("USE_MLFLOW", "false").strip().lower() == "true"
+        if use_mlflow:
+            version = self._resolve_mlflow_version(MODEL_NAME, alias)
+            model = self._load_registry_version(version)
+        else:
+            with open(CANDIDATE_MODEL_PATH, "rb") as f:
+                model = pickle.load(f)
+            version = self._local_version(CANDIDATE_MODEL_PATH)
+        self.validate(model)
+        return model, version
+
+    def validate(self, model: Pipeline) -> None:
+        probabilities = np.asarray(model.predict_proba(CANARY_FEATURES))
+        model.predict(CANARY_FEATURES)
+
+        if probabilities.shape != (len(CANARY_FEATURES), 2):
+            raise ValueError(f"Unexpected predict_proba shape on canary batch: {probabilities.shape}")
+        if not np.all(np.isfinite(probabilities)) or np.any(probabilities < 0) or np.any(probabilities > 1):
+            raise ValueError("Model returned invalid probabilities on canary batch")
+
+    def swap(self, model: Pipeline, version: Optional[str]) -> None:
+        """Атомарно подменяет активную модель; предыдущая остаётся прогретой для отката."""
+        with self._swap_lock:
+            if self._model is not None:
+                self._previous_model, self._previous_version = self._model, self._version
+            self._model, self._version = model, version
+        logger.info(f"Active model version: {version}")
+
+    def rollback(self) -> Optional[str]:
+        with self._swap_lock:
+            if self._previous_model is None:
+                return None
+            self._model, self._previous_model = self._previous_model, self._model
+            self._version, self._previous_version = self._previous_version, self._version
+            version = self._version
+        logger.warning(f"Model rolled back to version {version}")
+        return version
+
+    def snapshot(self) -> Tuple[Optional[Pipeline], Optional[str]]:
+        with self._swap_lock:
+            return self._model, self._version
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._version
+
+    @property
+    def previous_version(self) -> Optional[str]:
+        return self._previous_version
     
     @property
     def is_loaded(self) -> bool:
         return self._model is not None
 
-load_dotenv()
 model_singleton = ModelSingleton()
\ No newline at end of file
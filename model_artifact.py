@@ -0,0 +1,235 @@
+"""Компактный memory-mappable формат для линейных моделей модерации.
+
+Файл: 8 байт сигнатуры, uint32 длины заголовка, JSON-заголовок (выровнен до 64 байт)
+и сырые little-endian float64 массивы. Загрузка - mmap без копирования: форкнутые
+воркеры делят одни и те же страницы page cache, а старт не требует ни unpickle, ни MLflow.
+
+    python -m model_artifact export            # выгрузить активную модель в кэш версий
+    python -m model_artifact export --output model.bin
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MODART1\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", ".model_cache")
+
+
+class LinearArtifactModel:
+    """Логистическая регрессия поверх mmap-массивов с интерфейсом predict/predict_proba sklearn."""
+
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, classes: np.ndarray, header: Dict[str, Any]):
+        self.coef = coef
+        self.intercept = intercept
+        self.classes_ = classes
+        self.header = header
+
+    def decision_function(self, X) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) @ self.coef.T + self.intercept
+
+    def predict_proba(self, X) -> np.ndarray:
+        scores = self.decision_function(X)
+        if scores.shape[1] == 1:
+            positive = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1.0 - positive, positive])
+        scores = scores - scores.max(axis=1, keepdims=True)
+        exp_scores = np.exp(scores)
+        return exp_scores / exp_scores.sum(axis=1, keepdims=True)
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+def _linear_params(model) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Достаёт (coef, intercept, classes) из LogisticRegression или Pipeline
+    вида [StandardScaler?, LogisticRegression]. Для прочих моделей - None."""
+    if isinstance(model, LinearArtifactModel):
+        return model.coef, model.intercept, model.classes_
+
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    steps = [step for _, step in model.steps] if isinstance(model, Pipeline) else [model]
+    *preprocessing, clf = steps
+
+    if not isinstance(clf, LogisticRegression) or len(preprocessing) > 1:
+        return None
+
+    coef = np.asarray(clf.coef_, dtype=np.float64)
+    intercept = np.asarray(clf.intercept_, dtype=np.float64)
+
+    if preprocessing:
+        scaler = preprocessing[0]
+        if not isinstance(scaler, StandardScaler):
+            return None
+        # Сворачиваем (x - mean) / scale в веса: w' = w / scale, b' = b - w' @ mean
+        scale = scaler.scale_ if scaler.with_std else np.ones(coef.shape[1])
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(coef.shape[1])
+        coef = coef / scale
+        intercept = intercept - coef @ mean
+
+    return coef, intercept, np.asarray(clf.classes_)
+
+
+def export_artifact(model, path: str, version: Optional[str] = None) -> bool:
+    """Записывает модель в компактный формат. Возвращает False, если модель не поддерживается."""
+    params = _linear_params(model)
+    if params is None:
+        return False
+    coef, intercept, classes = params
+
+    arrays = {"coef": coef, "intercept": intercept}
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {"offset": offset, "shape": list(array.shape)}
+        offset += array.size * 8
+
+    header = {
+        "format": FORMAT_VERSION,
+        "kind": "logistic",
+        "version": version,
+        "n_features": int(coef.shape[1]),
+        "classes": classes.tolist(),
+        "arrays": layout,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix_length = len(MAGIC) + 4 + len(header_bytes)
+    header_bytes += b" " * (-prefix_length % ALIGNMENT)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for array in arrays.values():
+            f.write(np.ascontiguousarray(array, dtype="<f8").tobytes())
+    os.replace(tmp_path, path)
+    return True
+
+
+def load_artifact(path: str) -> LinearArtifactModel:
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a model artifact")
+
+    header_length, = struct.unpack_from("<I", buffer, len(MAGIC))
+    data_offset = len(MAGIC) + 4 + header_length
+    header = json.loads(bytes(buffer[len(MAGIC) + 4:data_offset]))
+
+    if header.get("format") != FORMAT_VERSION or header.get("kind") != "logistic":
+        raise ValueError(f"Unsupported model artifact: {header.get('kind')} v{header.get('format')}")
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        count = int(np.prod(spec["shape"]))
+        arrays[name] = np.frombuffer(
+            buffer, dtype="<f8", count=count, offset=data_offset + spec["offset"]
+        ).reshape(spec["shape"])
+
+    return LinearArtifactModel(arrays["coef"], arrays["intercept"], np.asarray(header["classes"]), header)
+
+
+class ModelArtifactCache:
+    """Кэш артефактов на диске, ключ - версия модели в реестре.
+
+    Рядом с артефактами хранится указатель <model>@<alias>.json на последнюю
+    загруженную версию алиаса: по нему рестарт поднимает модель, не обращаясь к MLflow."""
+
+    def __init__(self, directory: str = MODEL_CACHE_DIR):
+        self.directory = directory
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory)
+
+    def artifact_path(self, model_name: str, version: str) -> str:
+        return os.path.join(self.directory, f"{model_name}-{version}.bin")
+
+    def _pointer_path(self, model_name: str, alias: str) -> str:
+        return os.path.join(self.directory, f"{model_name}@{alias}.json")
+
+    def load(self, model_name: str, version: str) -> Optional[LinearArtifactModel]:
+        if not self.enabled:
+            return None
+        path = self.artifact_path(model_name, version)
+        if not os.path.exists(path):
+            return None
+        try:
+            return load_artifact(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring broken cached model artifact {path}: {e}")
+            return None
+
+    def store(self, model_name: str, version: str, model) -> bool:
+        if not self.enabled:
+            return False
+        try:
+            return export_artifact(model, self.artifact_path(model_name, version), version)
+        except OSError as e:
+            logger.warning(f"Failed to cache model artifact for version {version}: {e}")
+            return False
+
+    def get_alias_version(self, model_name: str, alias: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            with open(self._pointer_path(model_name, alias)) as f:
+                return json.load(f)["version"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set_alias_version(self, model_name: str, alias: str, version: str) -> None:
+        if not self.enabled:
+            return
+        path = self._pointer_path(model_name, alias)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.tmp.{os.getpid()}"
+            with open(tmp_path, "w") as f:
+                json.dump({"version": version}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to update cached alias pointer {path}: {e}")
+
+
+model_artifact_cache = ModelArtifactCache()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Выгрузить активную модель в компактный формат")
+    export_parser.add_argument("--output", help="Путь к файлу (по умолчанию - кэш версий)")
+    args = parser.parse_args()
+
+    # При запуске через -m этот файл - __main__, а model.py импортирует model_artifact
+    # отдельно; берём всё оттуда, чтобы isinstance видел один и тот же класс
+    from model import MODEL_NAME, model_singleton
+    from model_artifact import export_artifact, model_artifact_cache
+
+    model_singleton.load()
+    model, version = model_singleton.snapshot()
+    path = args.output or model_artifact_cache.artifact_path(MODEL_NAME, version)
+    if not export_artifact(model, path, version):
+        print(f"Model {type(model).__name__} is not supported by the compact format", file=sys.stderr)
+        sys.exit(1)
+    print(f"Model version {version} exported to {path}")
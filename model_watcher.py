@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+from model import ModelSingleton, model_singleton
+
+logger = logging.getLogger(__name__)
+
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+
+
+class ModelWatcher:
+    """Фоново опрашивает реестр MLflow (или model.pkl) и подменяет модель без рестарта процесса.
+
+    Загрузка, прогрев и проверка на канареечной пачке выполняются в отдельном потоке,
+    event loop блокируется только на время присваивания ссылки."""
+
+    def __init__(self, singleton: ModelSingleton = model_singleton, interval: float = MODEL_RELOAD_INTERVAL):
+        self._singleton = singleton
+        self._interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._rejected_version: Optional[str] = None
+
+    def disable(self) -> None:
+        """Выключает опрос до start(): в воркерах launcher.py модель обновляет мастер."""
+        self._interval = 0
+
+    async def start(self) -> None:
+        if self._interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Model watcher started, polling every {self._interval}s")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Model watcher stopped")
+
+    async def check(self) -> bool:
+        """Один цикл проверки. Возвращает True, если активная версия была заменена."""
+        if not self._singleton.is_loaded:
+            # Первичную загрузку делает lifespan, watcher занимается только обновлениями
+            return False
+        version = await asyncio.to_thread(self._singleton.resolve_source_version)
+        if version in (self._singleton.version, self._rejected_version):
+            return False
+
+        logger.info(f"New model version detected: {version} (active: {self._singleton.version})")
+        try:
+            model = await asyncio.to_thread(self._singleton.load_version, version)
+        except Exception:
+            # Не перезагружаем одну и ту же битую версию на каждом опросе
+            self._rejected_version = version
+            raise
+        self._singleton.swap(model, version)
+        return True
+
+    def rollback(self) -> Optional[str]:
+        """Откатывает активную модель и закрепляет откат: версия, с которой откатились, не
+        загружается повторно, пока алиас не укажет на другую. Возвращает активную версию
+        или None, если откатываться некуда."""
+        version = self._singleton.rollback()
+        if version is not None:
+            self._rejected_version = self._singleton.previous_version
+        return version
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Model reload failed, keeping version {self._singleton.version}: {e}")
+
+
+model_watcher = ModelWatcher()
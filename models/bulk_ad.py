@@ -0,0 +1,20 @@
+from pydantic import BaseModel, Field
+from typing import List
+
+
+class BulkAdRow(BaseModel):
+    seller_id: int = Field(..., gt = 0, description = 'Положительный ID продавца')
+    name: str = Field(..., min_length = 1, max_length = 500, description = 'Название товара')
+    description: str = Field('', max_length = 1000, description = 'Описание товара')
+    category: int = Field(..., ge = 0, le = 100, description = 'Категория товара (от 0 до 100)')
+    images_qty: int = Field(0, ge = 0, le = 10, description = 'Количество изображений от 0 до 10')
+
+class BulkAdReject(BaseModel):
+    row: int = Field(..., description = 'Номер строки во входном файле (с 1)')
+    error: str = Field(..., description = 'Причина отклонения строки')
+
+class BulkAdImportResponse(BaseModel):
+    accepted: int = Field(..., description = 'Количество загруженных объявлений')
+    item_ids: List[int] = Field(default_factory = list, description = 'ID созданных объявлений в порядке строк')
+    task_ids: List[int] = Field(default_factory = list, description = 'ID задач модерации, если они были поставлены')
+    rejected: List[BulkAdReject] = Field(default_factory = list, description = 'Отклонённые строки')
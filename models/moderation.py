@@ -10,5 +10,6 @@ class ModerationModel(BaseModel):
     is_violation: Optional[bool] = None
     probability: Optional[float]= None
     error_message: Optional[str] = None
+    model_version: Optional[str] = None
     created_at: Optional[datetime] = None
     processed_at: Optional[datetime] = None
\ No newline at end of file
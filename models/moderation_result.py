@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional, Union
 from datetime import datetime
 
 
@@ -9,9 +9,29 @@ class ErrorModerationResultResponse(BaseModel):
     is_violation: Optional[bool] = None
     probability: Optional[float] = None
     error_message: Optional[str] = None
+    model_version: Optional[str] = None
 
 class ModerationResultResponse(BaseModel):
     task_id: int
     status: str
     is_violation: Optional[bool] = None
     probability: Optional[float] = None
+    model_version: Optional[str] = None
+
+
+class ModerationLookupRequest(BaseModel):
+    task_ids: List[int] = Field(default_factory=list)
+    item_ids: List[int] = Field(default_factory=list)
+
+class ItemModerationResultResponse(BaseModel):
+    item_id: int
+    task_id: int
+    status: str
+    is_violation: Optional[bool] = None
+    probability: Optional[float] = None
+    model_version: Optional[str] = None
+
+class ModerationLookupResponse(BaseModel):
+    # В порядке запроса, null - задача не найдена или у объявления нет завершённой модерации
+    tasks: List[Optional[Union[ErrorModerationResultResponse, ModerationResultResponse]]]
+    items: List[Optional[ItemModerationResultResponse]]
@@ -0,0 +1,213 @@
+"""Сэмплирующий профилировщик, понимающий asyncio.
+
+За окно профилирования собираются два вида сэмплов с периодом interval:
+    thread:<имя>;...  - стеки всех потоков (sys._current_frames) - где тратится CPU,
+                        в том числе model.predict_proba в потоках инференса;
+    task:<маршрут>;...  - цепочки await всех задач event loop - где корутины ждут:
+                        get_pg_connection, вызовы Redis, отправка в Kafka.
+Результат - collapsed stacks ("кадр;кадр;кадр N"), совместимый с flamegraph.pl и speedscope.
+
+Нагрузка ограничена: одновременно идёт только один профиль, окно не больше
+PROFILE_MAX_SECONDS, за тик обходится не больше PROFILE_MAX_TASKS задач.
+"""
+import asyncio
+import gc
+import inspect
+import json
+import logging
+import os
+import secrets
+import sys
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from errors import ProfilingInProgressError
+
+logger = logging.getLogger(__name__)
+
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MAX_TASKS = int(os.getenv("PROFILE_MAX_TASKS", "1000"))
+PROFILE_DEFAULT_INTERVAL = 0.01
+PROFILE_MIN_INTERVAL = 0.001
+
+MAX_STACK_DEPTH = 200
+
+
+def check_debug_token(token: Optional[str]) -> Optional[bool]:
+    """None - отладочные эндпоинты выключены (DEBUG_TOKEN не задан), иначе - совпал ли токен."""
+    if not DEBUG_TOKEN:
+        return None
+    return token is not None and secrets.compare_digest(token, DEBUG_TOKEN)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _thread_stack(frame) -> List[str]:
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _request_route(frame) -> Optional[str]:
+    # Кадр ASGI-middleware держит scope запроса - по нему задача относится к маршруту
+    if frame.f_code.co_name != "__call__" or "scope" not in frame.f_code.co_varnames:
+        return None
+    scope = frame.f_locals.get("scope")
+    if not isinstance(scope, dict) or scope.get("type") != "http":
+        return None
+    from middlewares.metrics import route_template
+
+    return f"{scope.get('method')} {route_template(scope)}"
+
+
+def _awaited_generator(awaitable):
+    # async with над asynccontextmanager ждёт async_generator_asend, у которого нет
+    # публичной ссылки на генератор (get_pg_connection, get_redis_connection)
+    for referent in gc.get_referents(awaitable):
+        if inspect.isasyncgen(referent):
+            return referent
+    return None
+
+
+def _await_chain(coro) -> Tuple[List[str], Optional[str]]:
+    labels, route, awaitable = [], None, coro
+    while awaitable is not None and len(labels) < MAX_STACK_DEPTH:
+        frame = (getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+                 or getattr(awaitable, "ag_frame", None))
+        if frame is None:
+            generator = _awaited_generator(awaitable) if type(awaitable).__name__ == "async_generator_asend" else None
+            if generator is None:
+                labels.append(f"<{type(awaitable).__name__}>")
+                break
+            awaitable = generator
+            continue
+
+        labels.append(_frame_label(frame))
+        route = route or _request_route(frame)
+        awaitable = (getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+                     or getattr(awaitable, "ag_await", None))
+    return labels, route
+
+
+def render_collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class AsyncioProfiler:
+
+    def __init__(self, max_seconds: float = PROFILE_MAX_SECONDS, max_tasks: int = PROFILE_MAX_TASKS):
+        self.max_seconds = max_seconds
+        self.max_tasks = max_tasks
+        self._running = threading.Lock()
+
+    @property
+    def is_running(self) -> bool:
+        return self._running.locked()
+
+    def _sample_threads(self, stacks: Counter, interval: float, stop: threading.Event) -> None:
+        own_ident = threading.get_ident()
+        while not stop.wait(interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = _thread_stack(frame)
+                stacks[";".join([f"thread:{names.get(ident, ident)}", *stack])] += 1
+
+    def _sample_tasks(self, stacks: Counter, current: Optional[asyncio.Task]) -> None:
+        for index, task in enumerate(asyncio.all_tasks()):
+            if index >= self.max_tasks:
+                break
+            if task is current:
+                continue
+            labels, route = _await_chain(task.get_coro())
+            stacks[";".join([f"task:{route or task.get_name()}", *labels])] += 1
+
+    async def profile(self, seconds: float, interval: float = PROFILE_DEFAULT_INTERVAL) -> str:
+        """Профилирует процесс seconds секунд и возвращает collapsed stacks.
+        Второй профиль, пока идёт первый, получает ProfilingInProgressError."""
+        if not self._running.acquire(blocking=False):
+            raise ProfilingInProgressError
+        try:
+            seconds = min(max(seconds, interval), self.max_seconds)
+            interval = max(interval, PROFILE_MIN_INTERVAL)
+            thread_stacks, task_stacks = Counter(), Counter()
+            stop = threading.Event()
+            sampler = threading.Thread(target=self._sample_threads, args=(thread_stacks, interval, stop),
+                                       name="profiler", daemon=True)
+
+            loop = asyncio.get_running_loop()
+            current = asyncio.current_task()
+            deadline = loop.time() + seconds
+            logger.warning(f"Profiling started for {seconds}s with interval {interval}s")
+            sampler.start()
+            try:
+                while loop.time() < deadline:
+                    self._sample_tasks(task_stacks, current)
+                    await asyncio.sleep(interval)
+            finally:
+                stop.set()
+                await asyncio.to_thread(sampler.join)
+            logger.warning("Profiling finished")
+            return render_collapsed(thread_stacks + task_stacks)
+        finally:
+            self._running.release()
+
+
+profiler = AsyncioProfiler()
+
+
+def start_profile_server(port: int, loop: asyncio.AbstractEventLoop) -> Optional[ThreadingHTTPServer]:
+    """/debug/profile для процессов без FastAPI (воркер): HTTP-сервер в отдельном потоке,
+    профиль снимается в переданном event loop."""
+    if port <= 0 or not DEBUG_TOKEN:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, status: int, body: str, content_type: str = "application/json") -> None:
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/debug/profile":
+                self._reply(404, json.dumps({"detail": "Not Found"}))
+                return
+            if not check_debug_token(self.headers.get("X-Debug-Token")):
+                self._reply(403, json.dumps({"detail": "Invalid debug token"}))
+                return
+            query = parse_qs(url.query)
+            try:
+                seconds = float(query.get("seconds", ["10"])[0])
+                interval = float(query.get("interval", [str(PROFILE_DEFAULT_INTERVAL)])[0])
+            except ValueError:
+                self._reply(422, json.dumps({"detail": "seconds and interval must be numbers"}))
+                return
+            future = asyncio.run_coroutine_threadsafe(profiler.profile(seconds, interval), loop)
+            try:
+                self._reply(200, future.result(), "text/plain; charset=utf-8")
+            except ProfilingInProgressError:
+                self._reply(409, json.dumps({"detail": "Another profile is already running"}))
+
+        def log_message(self, format, *args):
+            logger.info("Profile server: " + format, *args)
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=server.serve_forever, name="profile-server", daemon=True).start()
+    return server
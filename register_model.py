@@ -5,14 +5,13 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from model import model_singleton
 import logging
+from logging_setup import setup_logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 
 logger = logging.getLogger(__name__)
 
 if __name__ == "__main__":
+    setup_logging(mode="sync")
     logger.info("Registering model in MLflow...")
+    model_singleton.load()
     logger.info("Model registered successfully!")
\ No newline at end of file
@@ -1,33 +1,78 @@
 from dataclasses import dataclass
-from typing import Mapping, Any, Sequence, Optional, Dict
+from typing import Mapping, Any, Sequence, Optional, Dict, Set
 from clients.postgres import get_pg_connection
 from errors import AdNotFoundError, SellerNotFoundError
 from models.seller import SellerModel
 from models.ad import AdModel
 from models.predict_request import PredictRequest
-from repositories.sellers import SellerPostgresStorage
 from repositories.moderations import ModerationRepository
 from datetime import datetime, timezone
+from metrics import DB_QUERY_DURATION, instrument_methods
+from tracing import trace_methods
 
+@trace_methods(**{"db.system": "postgresql"})
+@instrument_methods(DB_QUERY_DURATION)
 @dataclass(frozen=True)
 class AdPostgresStorage:
 
+    BULK_COLUMNS = ('item_id', 'seller_id', 'name', 'description', 'category', 'images_qty')
+
     async def create(self, seller_id: int,
                             name: str,
                             description: str,
                             category: int,
                             images_qty: int
                         ) -> Mapping[str, any]:
+        # Проверка продавца и вставка одним запросом: пустой результат - продавца нет
         query = '''
             INSERT INTO ads (seller_id, name, description, category, images_qty)
-            VALUES ($1, $2, $3, $4, $5)
+            SELECT $1::INTEGER, $2::TEXT, $3::TEXT, $4::INTEGER, $5::INTEGER
+            WHERE EXISTS (SELECT 1 FROM sellers WHERE seller_id = $1::INTEGER)
             RETURNING *
         '''
 
         async with get_pg_connection() as connection:
-            return dict(await connection.fetchrow(query, seller_id, name, 
-                                                  description, category, images_qty))
+            row = await connection.fetchrow(query, seller_id, name,
+                                            description, category, images_qty)
+
+            if row:
+                return dict(row)
+
+            raise SellerNotFoundError()
     
+    async def copy_many(self, rows: Sequence[Mapping[str, Any]]) -> Sequence[int]:
+        # COPY не умеет RETURNING, поэтому ID заранее берём из последовательности
+        # одним запросом и передаём их явно вместе со строками
+        ids_query = '''
+            SELECT nextval(pg_get_serial_sequence('ads', 'item_id'))::INTEGER AS item_id
+            FROM generate_series(1, $1::INTEGER)
+        '''
+
+        async with get_pg_connection() as connection:
+            async with connection.transaction():
+                item_ids = [row['item_id'] for row in await connection.fetch(ids_query, len(rows))]
+                await connection.copy_records_to_table(
+                    'ads',
+                    columns=self.BULK_COLUMNS,
+                    records=[
+                        (item_id, row['seller_id'], row['name'], row['description'],
+                         row['category'], row['images_qty'])
+                        for item_id, row in zip(item_ids, rows)
+                    ],
+                )
+            return item_ids
+
+    async def select_existing_seller_ids(self, seller_ids: Sequence[int]) -> Set[int]:
+        query = '''
+            SELECT seller_id
+            FROM sellers
+            WHERE seller_id = ANY($1::INTEGER[])
+        '''
+
+        async with get_pg_connection() as connection:
+            rows = await connection.fetch(query, list(seller_ids))
+            return {row['seller_id'] for row in rows}
+
     async def select_by_item_id(self, item_id: int) -> Mapping[str, any]:
 
         query = '''
@@ -71,10 +116,17 @@ class AdPostgresStorage:
             raise AdNotFoundError()
     
     async def delete(self, item_id: int) -> Mapping[str, any]:
+        # Модерации удалит ON DELETE CASCADE; их id (moderation_ids) нужны, чтобы сбросить кэш.
+        # Подзапрос видит снимок до удаления, поэтому возвращает все удаляемые задачи
         query = '''
-            DELETE FROM ads
-            WHERE item_id = $1::INTEGER
-            RETURNING *
+            WITH deleted AS (
+                DELETE FROM ads
+                WHERE item_id = $1::INTEGER
+                RETURNING *
+            )
+            SELECT deleted.*,
+                   ARRAY(SELECT id FROM moderation_results WHERE item_id = $1::INTEGER) AS moderation_ids
+            FROM deleted
         '''
         
         async with get_pg_connection() as connection:
@@ -112,7 +164,11 @@ class AdPostgresStorage:
             rows = await connection.fetch(query)
             return [dict(row) for row in rows]
     
-    async def update(self, id: int, **updates: Any) -> Mapping[str, Any]:
+    async def update(self, id: int, drop_pending: bool = False, **updates: Any) -> Mapping[str, Any]:
+        """Изменяет объявление и в том же запросе удаляет его устаревшие модерации - если последняя
+        из них завершена, как в invalidate_by_item_id; задача в работе остаётся и допишет результат.
+        drop_pending удаляет модерации безусловно (закрытие объявления). id удалённых задач
+        возвращаются в moderation_ids для сброса кэша."""
         keys, args = [], []
 
         for key, value in updates.items():
@@ -122,16 +178,35 @@ class AdPostgresStorage:
         keys.append('updated_at')
         args.append(datetime.now(timezone.utc).replace(tzinfo=None))
 
-        fields_str = ', '.join([f'{key} = ${i + 2}' for i, key in enumerate(keys)])
+        fields_str = ', '.join([f'{key} = ${i + 3}' for i, key in enumerate(keys)])
         query = f'''
-            UPDATE ads
-            SET {fields_str}
-            WHERE item_id = $1::INTEGER
-            RETURNING *
+            WITH updated AS (
+                UPDATE ads
+                SET {fields_str}
+                WHERE item_id = $1::INTEGER
+                RETURNING *
+            ), deleted AS (
+                DELETE FROM moderation_results m
+                USING updated
+                WHERE m.item_id = updated.item_id
+                AND (
+                    $2::BOOLEAN
+                    OR (
+                        SELECT status
+                        FROM moderation_results
+                        WHERE item_id = updated.item_id
+                        ORDER BY processed_at DESC
+                        LIMIT 1
+                    ) = 'completed'
+                )
+                RETURNING m.id
+            )
+            SELECT updated.*, ARRAY(SELECT id FROM deleted) AS moderation_ids
+            FROM updated
         '''
 
         async with get_pg_connection() as connection:
-            row = await connection.fetchrow(query, id, *args)
+            row = await connection.fetchrow(query, id, drop_pending, *args)
 
             if row:
                 return dict(row)
@@ -142,7 +217,6 @@ class AdPostgresStorage:
 @dataclass(frozen=True)
 class AdRepository:
     ad_storage: AdPostgresStorage = AdPostgresStorage()
-    seller_storage: SellerPostgresStorage = SellerPostgresStorage()
     moderation_repo: ModerationRepository = ModerationRepository()
     
     async def create(self, seller_id: int,
@@ -150,12 +224,6 @@ class AdRepository:
                             description: str,
                             category: int,
                             images_qty: int) -> AdModel:
-        
-        seller = await self.seller_storage.select_by_seller_id(seller_id)
-
-        if not seller:
-            raise SellerNotFoundError
-        
         raw_ad = await self.ad_storage.create(
             seller_id=seller_id,
             name=name,
@@ -165,6 +233,16 @@ class AdRepository:
         )
 
         return AdModel(**raw_ad)
+
+    async def get_existing_seller_ids(self, seller_ids: Sequence[int]) -> Set[int]:
+        if not seller_ids:
+            return set()
+        return await self.ad_storage.select_existing_seller_ids(seller_ids)
+
+    async def create_many(self, rows: Sequence[Mapping[str, Any]]) -> Sequence[int]:
+        if not rows:
+            return []
+        return await self.ad_storage.copy_many(rows)
     
     async def get_for_simple_predict(self, item_id: int) -> PredictRequest:
         item_data = await self.ad_storage.select_for_prediction(item_id)
@@ -180,7 +258,7 @@ class AdRepository:
     
     async def delete(self, item_id: int) -> AdModel:
         raw_ad = await self.ad_storage.delete(item_id)
-        await self.moderation_repo.delete_all_by_item_id(item_id)
+        await self.moderation_repo.evict_cached(item_id, raw_ad.pop('moderation_ids'))
         return AdModel(**raw_ad)
     
 
@@ -192,11 +270,11 @@ class AdRepository:
         ]
 
     async def update(self, item_id: int, **changes: Mapping[str, Any]) -> SellerModel:
-        raw_ad= await self.ad_storage.update(item_id, **changes)
-        await self.moderation_repo.invalidate_by_item_id(item_id)
+        raw_ad = await self.ad_storage.update(item_id, **changes)
+        await self.moderation_repo.evict_cached(item_id, raw_ad.pop('moderation_ids'))
         return AdModel(**raw_ad)
     
     async def close(self, item_id: int) -> None:
-        raw_ad = await self.ad_storage.update(item_id, is_closed=True)
-        await self.moderation_repo.delete_all_by_item_id(item_id)
+        raw_ad = await self.ad_storage.update(item_id, drop_pending=True, is_closed=True)
+        await self.moderation_repo.evict_cached(item_id, raw_ad.pop('moderation_ids'))
         return AdModel(**raw_ad)
@@ -1,8 +1,9 @@
 from dataclasses import dataclass
-from typing import Mapping, Any, Sequence, Optional, Dict
+from typing import Mapping, Any, Sequence, Optional, Dict, Tuple
 from clients.postgres import get_pg_connection
-from errors import ModerationNotFoundError
+from errors import AdNotFoundError, ModerationNotFoundError
 from models.moderation import ModerationModel
+from models.predict_request import PredictRequest
 from clients.redis import get_redis_connection
 from json import loads, dumps
 from datetime import timedelta
@@ -10,14 +11,15 @@ from async_lru import alru_cache
 import logging
 from datetime import datetime, date
 import json
+from metrics import DB_QUERY_DURATION, REDIS_OP_DURATION, instrument_methods
+from tracing import trace_methods
+from redis.exceptions import RedisError
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 
 logger = logging.getLogger(__name__)
 
+@trace_methods(**{"db.system": "postgresql"})
+@instrument_methods(DB_QUERY_DURATION)
 @dataclass(frozen = True)
 class ModerationPostgresStorage:
 
@@ -38,6 +40,118 @@ class ModerationPostgresStorage:
                 query, item_id, status, is_violation, probability, error_message
             ))
     
+    async def create_pending_many(self, item_ids: Sequence[int]) -> Sequence[Mapping[str, Any]]:
+        query = ''' INSERT INTO moderation_results (item_id, status)
+                    SELECT item_id, 'pending'
+                    FROM unnest($1::INTEGER[]) WITH ORDINALITY AS t(item_id, ord)
+                    ORDER BY ord
+                    RETURNING *
+                '''
+
+        async with get_pg_connection() as connection:
+            rows = await connection.fetch(query, list(item_ids))
+            return [dict(row) for row in rows]
+
+    async def create_pending_many_with_outbox(self, item_ids: Sequence[int],
+                                              traceparent: Optional[str]) -> Sequence[Mapping[str, Any]]:
+        # Как submit_with_outbox для пачки новых объявлений: задачи и записи outbox одним оператором
+        query = ''' WITH task AS (
+                        INSERT INTO moderation_results (item_id, status)
+                        SELECT item_id, 'pending'
+                        FROM unnest($1::INTEGER[]) WITH ORDINALITY AS t(item_id, ord)
+                        ORDER BY ord
+                        RETURNING *
+                    ), outbox AS (
+                        INSERT INTO moderation_outbox (task_id, item_id, traceparent)
+                        SELECT id, item_id, $2 FROM task
+                    )
+                    SELECT * FROM task
+                    ORDER BY id
+                '''
+
+        async with get_pg_connection() as connection:
+            rows = await connection.fetch(query, list(item_ids), traceparent)
+            return [dict(row) for row in rows]
+
+    async def submit_with_outbox(self, item_id: int, traceparent: Optional[str]) -> Mapping[str, Any]:
+        # Готовый результат (последняя строка в порядке select_latest_by_item_id завершена) или
+        # новая pending-задача вместе с записью outbox для relay - одним оператором, то есть в одной
+        # транзакции: pending-задачи без сообщения в Kafka не бывает
+        query = ''' WITH existing AS (
+                        SELECT *
+                        FROM (
+                            SELECT *
+                            FROM moderation_results
+                            WHERE item_id = $1::INTEGER
+                            ORDER BY processed_at DESC
+                            LIMIT 1
+                        ) AS latest
+                        WHERE status = 'completed'
+                    ), task AS (
+                        INSERT INTO moderation_results (item_id, status)
+                        SELECT $1, 'pending'
+                        WHERE NOT EXISTS (SELECT 1 FROM existing)
+                        RETURNING *
+                    ), outbox AS (
+                        INSERT INTO moderation_outbox (task_id, item_id, traceparent)
+                        SELECT id, item_id, $2 FROM task
+                    )
+                    SELECT * FROM existing
+                    UNION ALL
+                    SELECT * FROM task
+                '''
+
+        async with get_pg_connection() as connection:
+            return dict(await connection.fetchrow(query, item_id, traceparent))
+
+    async def submit_for_prediction(self, item_id: int) -> Mapping[str, Any]:
+        # То же для синхронного пути, плюс признаки объявления из select_for_prediction: задача
+        # создаётся только для открытого объявления, скорингу не нужен отдельный запрос
+        query = ''' WITH ad AS (
+                        SELECT
+                            s.seller_id AS seller_id,
+                            s.is_verified AS is_verified_seller,
+                            a.item_id AS item_id,
+                            a.name,
+                            COALESCE(a.description, '') AS description,
+                            a.category,
+                            a.images_qty
+                        FROM ads a
+                        JOIN sellers s
+                        ON a.seller_id = s.seller_id
+                            AND a.is_closed = FALSE
+                        WHERE a.item_id = $1::INTEGER
+                    ), existing AS (
+                        SELECT *
+                        FROM (
+                            SELECT *
+                            FROM moderation_results
+                            WHERE item_id = $1::INTEGER
+                            ORDER BY processed_at DESC
+                            LIMIT 1
+                        ) AS latest
+                        WHERE status = 'completed'
+                    ), task AS (
+                        INSERT INTO moderation_results (item_id, status)
+                        SELECT item_id, 'pending'
+                        FROM ad
+                        WHERE NOT EXISTS (SELECT 1 FROM existing)
+                        RETURNING *
+                    )
+                    SELECT result.*, ad.seller_id, ad.is_verified_seller, ad.name, ad.description,
+                           ad.category, ad.images_qty
+                    FROM (SELECT * FROM existing UNION ALL SELECT * FROM task) AS result
+                    LEFT JOIN ad ON TRUE
+                '''
+
+        async with get_pg_connection() as connection:
+            row = await connection.fetchrow(query, item_id)
+
+            if row:
+                return dict(row)
+
+            raise AdNotFoundError()
+
     async def ensure_idempotency(self, item_id: int,
                                     status: str,
                                     is_violation: bool,
@@ -88,6 +202,30 @@ class ModerationPostgresStorage:
             return None
         
     
+    async def select_by_task_ids(self, ids: Sequence[int]) -> Sequence[Mapping[str, Any]]:
+        query = '''
+            SELECT *
+            FROM moderation_results
+            WHERE id = ANY($1::INTEGER[])
+        '''
+
+        async with get_pg_connection() as connection:
+            rows = await connection.fetch(query, list(ids))
+            return [dict(row) for row in rows]
+
+    async def select_latest_by_item_ids(self, item_ids: Sequence[int]) -> Sequence[Mapping[str, Any]]:
+        # Тот же порядок, что в select_latest_by_item_id, но для всех объявлений одним запросом
+        query = '''
+            SELECT DISTINCT ON (item_id) *
+            FROM moderation_results
+            WHERE item_id = ANY($1::INTEGER[])
+            ORDER BY item_id, processed_at DESC
+        '''
+
+        async with get_pg_connection() as connection:
+            rows = await connection.fetch(query, list(item_ids))
+            return [dict(row) for row in rows]
+
     async def select_many(self) -> Sequence[Mapping[str, Any]]:
         query = '''
             SELECT *
@@ -159,6 +297,8 @@ class CustomJSONEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super().default(obj)
         
+@trace_methods(**{"db.system": "redis"})
+@instrument_methods(REDIS_OP_DURATION)
 @dataclass(frozen=True)
 class ModerationRedisStorage:
 
@@ -174,6 +314,8 @@ class ModerationRedisStorage:
     
     TASK_PREFIX = "task:"
     ITEM_PREFIX = "item:"
+    # Канал уведомлений о завершённых задачах, его слушает services.result_notifier
+    RESULTS_CHANNEL = "moderation:results"
 
     async def set_by_task_id(self, task_id: int, row: Mapping[str, Any]) -> None:
         async with get_redis_connection() as connection:
@@ -195,6 +337,39 @@ class ModerationRedisStorage:
             pipeline.expire(f"{self.ITEM_PREFIX}{item_id}", self._TTL)
             await pipeline.execute()
     
+    async def get_many(self, task_ids: Sequence[int],
+                       item_ids: Sequence[int]) -> Tuple[Dict[int, Mapping[str, Any]], Dict[int, Mapping[str, Any]]]:
+        """Задачи и последние результаты объявлений одним MGET. Возвращает только найденные."""
+        keys = [f"{self.TASK_PREFIX}{task_id}" for task_id in task_ids] + \
+               [f"{self.ITEM_PREFIX}{item_id}" for item_id in item_ids]
+        if not keys:
+            return {}, {}
+
+        async with get_redis_connection() as connection:
+            values = await connection.mget(keys)
+
+        by_task = {task_id: loads(value) for task_id, value in zip(task_ids, values) if value}
+        by_item = {item_id: loads(value) for item_id, value in zip(item_ids, values[len(task_ids):]) if value}
+        return by_task, by_item
+
+    async def set_many(self, rows: Sequence[Mapping[str, Any]]) -> None:
+        """Кладёт строки под task: и item: ключи одним pipeline."""
+        if not rows:
+            return
+
+        async with get_redis_connection() as connection:
+            pipeline = connection.pipeline()
+            for row in rows:
+                value = dumps(row, cls=CustomJSONEncoder)
+                for key in (f"{self.TASK_PREFIX}{row['id']}", f"{self.ITEM_PREFIX}{row['item_id']}"):
+                    pipeline.set(name=key, value=value)
+                    pipeline.expire(key, self._TTL)
+            await pipeline.execute()
+
+    async def publish_result(self, row: Mapping[str, Any]) -> None:
+        async with get_redis_connection() as connection:
+            await connection.publish(self.RESULTS_CHANNEL, dumps(row, cls=CustomJSONEncoder))
+
     async def get_by_task_id(self, task_id: int) -> Mapping[str, Any] | None:
         async with get_redis_connection() as connection:
             row = await connection.get(f"{self.TASK_PREFIX}{task_id}")
@@ -221,6 +396,16 @@ class ModerationRedisStorage:
         async with get_redis_connection() as connection:
             await connection.delete(f"{self.ITEM_PREFIX}{item_id}")
 
+    async def delete_many(self, task_ids: Sequence[int], item_ids: Sequence[int]) -> None:
+        """Удаляет task: и item: ключи одной командой DEL."""
+        keys = [f"{self.TASK_PREFIX}{task_id}" for task_id in task_ids] + \
+               [f"{self.ITEM_PREFIX}{item_id}" for item_id in item_ids]
+        if not keys:
+            return
+
+        async with get_redis_connection() as connection:
+            await connection.delete(*keys)
+
 @dataclass(frozen=True)
 class ModerationRepository:
     moderation_storage: ModerationPostgresStorage = ModerationPostgresStorage()
@@ -243,6 +428,41 @@ class ModerationRepository:
         mod_model = ModerationModel(**raw_mod)
         
         return mod_model
+
+    async def submit_with_outbox(self, item_id: int, traceparent: Optional[str] = None) -> ModerationModel:
+        """Готовый результат из кэша или одним запросом к БД: завершённый или новая pending-задача."""
+        raw_mod = await self.moderation_redis_storage.get_latest_by_item_id(item_id)
+        if raw_mod:
+            return ModerationModel(**raw_mod)
+
+        raw_mod = await self.moderation_storage.submit_with_outbox(item_id, traceparent)
+        if raw_mod["status"] == "completed":
+            await self._cache_completed(raw_mod)
+        return ModerationModel(**raw_mod)
+
+    async def submit_for_prediction(self, item_id: int) -> Tuple[ModerationModel, Optional[PredictRequest]]:
+        """Как submit_with_outbox, но для новой задачи возвращает и признаки для скоринга."""
+        raw_mod = await self.moderation_redis_storage.get_latest_by_item_id(item_id)
+        if raw_mod:
+            return ModerationModel(**raw_mod), None
+
+        row = await self.moderation_storage.submit_for_prediction(item_id)
+        raw_mod = {key: row[key] for key in ModerationModel.model_fields if key in row}
+        if raw_mod["status"] == "completed":
+            await self._cache_completed(raw_mod)
+            return ModerationModel(**raw_mod), None
+        return ModerationModel(**raw_mod), PredictRequest(**{key: row[key] for key in PredictRequest.model_fields})
+
+    async def _cache_completed(self, raw_mod: Mapping[str, Any]) -> None:
+        await self.moderation_redis_storage.set_latest_by_item_id(raw_mod["item_id"], raw_mod)
+        await self.moderation_redis_storage.set_by_task_id(raw_mod["id"], raw_mod)
+
+    async def create_pending_many_with_outbox(self, item_ids: Sequence[int],
+                                              traceparent: Optional[str] = None) -> Sequence[ModerationModel]:
+        if not item_ids:
+            return []
+        raw_mods = await self.moderation_storage.create_pending_many_with_outbox(item_ids, traceparent)
+        return [ModerationModel(**raw_mod) for raw_mod in raw_mods]
     
     async def ensure_idempotency(self, item_id: int,
                             status: str,
@@ -290,6 +510,34 @@ class ModerationRepository:
         return None
     
 
+    async def lookup(self, task_ids: Sequence[int],
+                     item_ids: Sequence[int]) -> Tuple[Dict[int, ModerationModel], Dict[int, ModerationModel]]:
+        """Пакетные get_by_task_id и get_latest_by_item_id: один MGET, промахи - не больше двух
+        запросов в БД, завершённые результаты кладутся в кэш одним pipeline."""
+        task_ids, item_ids = list(dict.fromkeys(task_ids)), list(dict.fromkeys(item_ids))
+        by_task, by_item = await self.moderation_redis_storage.get_many(task_ids, item_ids)
+
+        to_cache = {}
+        missed_tasks = [task_id for task_id in task_ids if task_id not in by_task]
+        if missed_tasks:
+            for raw_mod in await self.moderation_storage.select_by_task_ids(missed_tasks):
+                by_task[raw_mod["id"]] = raw_mod
+                if raw_mod["status"] == "completed":
+                    to_cache[raw_mod["id"]] = raw_mod
+
+        missed_items = [item_id for item_id in item_ids if item_id not in by_item]
+        if missed_items:
+            for raw_mod in await self.moderation_storage.select_latest_by_item_ids(missed_items):
+                # Как в get_latest_by_item_id: незавершённая последняя задача - результата нет
+                if raw_mod["status"] == "completed":
+                    by_item[raw_mod["item_id"]] = raw_mod
+                    to_cache[raw_mod["id"]] = raw_mod
+
+        await self.moderation_redis_storage.set_many(list(to_cache.values()))
+
+        return ({task_id: ModerationModel(**raw_mod) for task_id, raw_mod in by_task.items()},
+                {item_id: ModerationModel(**raw_mod) for item_id, raw_mod in by_item.items()})
+
     async def update(self, id: int, **changes: Mapping[str, Any]) -> ModerationModel:
         raw_mod = await self.moderation_storage.update(id, **changes)
         
@@ -298,6 +546,13 @@ class ModerationRepository:
         if mod_model.status == "completed":
             await self.moderation_redis_storage.set_by_task_id(mod_model.id, raw_mod)
             await self.moderation_redis_storage.set_latest_by_item_id(mod_model.item_id, raw_mod)
+
+        if mod_model.status in ("completed", "failed"):
+            try:
+                await self.moderation_redis_storage.publish_result(raw_mod)
+            except RedisError as e:
+                # Результат уже в БД: ожидающие клиенты увидят его при перечитывании по таймауту
+                logger.warning("Failed to publish result of task %s: %s", mod_model.id, e)
         
         return mod_model
 
@@ -325,20 +580,25 @@ class ModerationRepository:
             await self.moderation_redis_storage.delete_by_task_id(latest.id)
         await self.moderation_redis_storage.delete_latest_by_item_id(item_id)
         
-        logger.info(f"All moderation results for item_id={item_id} deleted")
+        logger.info("All moderation results for item_id=%s deleted", item_id)
     
+    async def evict_cached(self, item_id: int, task_ids: Sequence[int]) -> None:
+        """Сбрасывает кэш объявления, чьи модерации уже удалены в БД (см. AdPostgresStorage.update)."""
+        await self.moderation_redis_storage.delete_many(task_ids, [item_id])
+        logger.info("Cache evicted for item_id=%s, %d tasks", item_id, len(task_ids))
+
     async def delete_all_by_seller_id(self, seller_id: int) -> None:
 
         item_ids = await self.moderation_storage.select_item_ids_by_seller_id(seller_id)
         
         if not item_ids:
-            logger.info(f"No items found for seller_id={seller_id}")
+            logger.info("No items found for seller_id=%s", seller_id)
             return
         
         for item_id in item_ids:
             await self.delete_all_by_item_id(item_id)
         
-        logger.info(f"Deleted cache and moderation results for seller_id={seller_id}, {len(item_ids)} items affected")
+        logger.info("Deleted cache and moderation results for seller_id=%s, %d items affected", seller_id, len(item_ids))
 
     
     async def invalidate_by_item_id(self, item_id: int) -> None:
@@ -348,20 +608,20 @@ class ModerationRepository:
             await self.moderation_redis_storage.delete_by_task_id(latest.id)
             await self.moderation_redis_storage.delete_latest_by_item_id(item_id)
             await self.moderation_storage.delete_by_item_id(item_id)
-            logger.info(f"Cache invalidated for item_id={item_id}, task_id={latest.id}")
+            logger.info("Cache invalidated for item_id=%s, task_id=%s", item_id, latest.id)
     
     async def invalidate_by_seller_id(self, seller_id: int) -> None:
         
         item_ids = await self.moderation_storage.select_item_ids_by_seller_id(seller_id)
         
         if not item_ids:
-            logger.info(f"No items found for seller_id={seller_id}")
+            logger.info("No items found for seller_id=%s", seller_id)
             return
         
         for item_id in item_ids:
             await self.invalidate_by_item_id(item_id)
         
-        logger.info(f"Invalidated cache for seller_id={seller_id}, {len(item_ids)} items affected")
+        logger.info("Invalidated cache for seller_id=%s, %d items affected", seller_id, len(item_ids))
 
         
     async def get_many(self) -> Sequence[ModerationModel]:
@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+from typing import Any, Mapping, Optional, Sequence
+from clients.postgres import get_pg_connection
+from metrics import DB_QUERY_DURATION, instrument_methods
+from tracing import trace_methods
+
+
+@trace_methods(**{"db.system": "postgresql"})
+@instrument_methods(DB_QUERY_DURATION)
+@dataclass(frozen=True)
+class OutboxPostgresStorage:
+    """Очередь moderation_outbox для relay. Записи добавляются вместе с задачей
+    (ModerationPostgresStorage.submit_with_outbox) и удаляются после отправки в Kafka."""
+
+    async def claim(self, limit: int, lease_seconds: float) -> Sequence[Mapping[str, Any]]:
+        # SKIP LOCKED - несколько relay разбирают очередь, не дожидаясь друг друга. Захваченные
+        # записи скрываются на lease_seconds: если relay упадёт, не отправив их, их заберёт другой
+        query = ''' WITH claimed AS (
+                        SELECT id
+                        FROM moderation_outbox
+                        WHERE available_at <= LOCALTIMESTAMP
+                        ORDER BY id
+                        LIMIT $1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE moderation_outbox AS outbox
+                    SET available_at = LOCALTIMESTAMP + make_interval(secs => $2),
+                        attempts = outbox.attempts + 1
+                    FROM claimed
+                    WHERE outbox.id = claimed.id
+                    RETURNING outbox.*, EXTRACT(EPOCH FROM LOCALTIMESTAMP - outbox.created_at)::FLOAT AS age_seconds
+                '''
+
+        async with get_pg_connection() as connection:
+            rows = await connection.fetch(query, limit, lease_seconds)
+            return sorted((dict(row) for row in rows), key=lambda row: row["id"])
+
+    async def delete(self, ids: Sequence[int]) -> None:
+        query = ''' DELETE FROM moderation_outbox
+                    WHERE id = ANY($1::BIGINT[])
+                '''
+
+        async with get_pg_connection() as connection:
+            await connection.execute(query, list(ids))
+
+    async def reschedule(self, ids: Sequence[int], delay_seconds: float, error: Optional[str]) -> None:
+        query = ''' UPDATE moderation_outbox
+                    SET available_at = LOCALTIMESTAMP + make_interval(secs => $2),
+                        last_error = $3
+                    WHERE id = ANY($1::BIGINT[])
+                '''
+
+        async with get_pg_connection() as connection:
+            await connection.execute(query, list(ids), delay_seconds, error)
+
+    async def stats(self) -> Mapping[str, Any]:
+        query = ''' SELECT COUNT(*) AS pending,
+                           COALESCE(EXTRACT(EPOCH FROM LOCALTIMESTAMP - MIN(created_at)), 0)::FLOAT AS oldest_age_seconds
+                    FROM moderation_outbox
+                '''
+
+        async with get_pg_connection() as connection:
+            return dict(await connection.fetchrow(query))
@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Tuple
+from redis.exceptions import NoScriptError
+from clients.redis import get_redis_connection
+from metrics import REDIS_OP_DURATION, instrument_methods
+from tracing import trace_methods
+import hashlib
+
+# Токен-бакет целиком на стороне Redis: пополнение, списание и TTL ключа - одна атомарная
+# операция и один round trip. Время берётся из TIME самого Redis, чтобы процессы API
+# с разными часами делили один бакет корректно.
+# Возвращает {1, 0} при успехе или {0, мс до появления токена}.
+TOKEN_BUCKET_LUA = '''
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+
+local allowed = 0
+local retry_ms = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_ms = math.ceil((1 - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return {allowed, retry_ms}
+'''
+
+TOKEN_BUCKET_SHA = hashlib.sha1(TOKEN_BUCKET_LUA.encode('utf-8')).hexdigest()
+
+
+@trace_methods(**{"db.system": "redis"})
+@instrument_methods(REDIS_OP_DURATION)
+@dataclass(frozen=True)
+class RateLimitRedisStorage:
+
+    PREFIX = "ratelimit:"
+
+    async def take(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        """Списывает токен из бакета key. Возвращает (разрешено, секунд до следующего токена)."""
+        args = (rate, burst)
+        async with get_redis_connection() as connection:
+            try:
+                allowed, retry_ms = await connection.evalsha(TOKEN_BUCKET_SHA, 1, f"{self.PREFIX}{key}", *args)
+            except NoScriptError:
+                # Скрипт ещё не в кэше этого Redis (рестарт, SCRIPT FLUSH) - EVAL загрузит его
+                allowed, retry_ms = await connection.eval(TOKEN_BUCKET_LUA, 1, f"{self.PREFIX}{key}", *args)
+
+        return bool(allowed), int(retry_ms) / 1000
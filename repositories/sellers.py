@@ -5,7 +5,11 @@ from errors import SellerNotFoundError
 from models.seller import SellerModel
 from repositories.moderations import ModerationRepository
 from datetime import datetime, timezone
+from metrics import DB_QUERY_DURATION, instrument_methods
+from tracing import trace_methods
 
+@trace_methods(**{"db.system": "postgresql"})
+@instrument_methods(DB_QUERY_DURATION)
 @dataclass(frozen = True)
 class SellerPostgresStorage:
 
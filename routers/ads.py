@@ -1,12 +1,22 @@
 from fastapi import APIRouter, HTTPException, status, Response, Request
-from typing import Sequence, Mapping, Any
+from typing import Sequence, Mapping, Any, Optional
 from pydantic import BaseModel
 from models.ad import AdModel
+from models.bulk_ad import BulkAdImportResponse
 from services.advertisements import AdvertisementService
+from services.ad_imports import AdImportService, aiter_lines, NDJSON, CSV, SUPPORTED_FORMATS
 from errors import SellerNotFoundError, AdNotFoundError
 
 router = APIRouter(tags=['Ads'])
 ad_service = AdvertisementService()
+ad_import_service = AdImportService()
+
+_CONTENT_TYPE_FORMATS = {
+    'application/x-ndjson': NDJSON,
+    'application/jsonl': NDJSON,
+    'application/json-seq': NDJSON,
+    'text/csv': CSV,
+}
 
 class CreateAdInDto(BaseModel):
     name: str
@@ -24,7 +34,39 @@ async def create(data: CreateAdInDto, request: Request) -> AdModel:
             detail='Unauthorized',
         )
     data['seller_id'] = int(current_seller_id)
-    return await ad_service.create(data)
+    try:
+        return await ad_service.create(data)
+    except SellerNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f'Seller {current_seller_id} is not found',
+        )
+
+@router.post('/bulk', status_code=status.HTTP_200_OK)
+async def bulk_create(request: Request,
+                      format: Optional[str] = None,
+                      enqueue_moderation: bool = False) -> BulkAdImportResponse:
+    current_seller_id = request.cookies.get('x-user-id')
+    if not current_seller_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Unauthorized',
+        )
+
+    content_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    fmt = format or _CONTENT_TYPE_FORMATS.get(content_type)
+    if fmt not in SUPPORTED_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f'Supported formats: {", ".join(SUPPORTED_FORMATS)}',
+        )
+
+    return await ad_import_service.import_lines(
+        aiter_lines(request.stream()),
+        fmt=fmt,
+        seller_id=int(current_seller_id),
+        enqueue_moderation=enqueue_moderation,
+    )
 
 @router.get('/{item_id}')
 async def get_by_item_id(item_id: int) -> AdModel:
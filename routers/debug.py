@@ -0,0 +1,39 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+from errors import ProfilingInProgressError
+from profiling import (
+    PROFILE_DEFAULT_INTERVAL,
+    PROFILE_MAX_SECONDS,
+    PROFILE_MIN_INTERVAL,
+    check_debug_token,
+    profiler,
+)
+
+
+def require_debug_token(x_debug_token: Optional[str] = Header(None)) -> None:
+    allowed = check_debug_token(x_debug_token)
+    if allowed is None:
+        # Без DEBUG_TOKEN отладочных эндпоинтов как будто нет
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not allowed:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid debug token")
+
+
+router = APIRouter(prefix="/debug", tags=["Debug"], include_in_schema=False,
+                   dependencies=[Depends(require_debug_token)])
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+                  interval: float = Query(PROFILE_DEFAULT_INTERVAL, ge=PROFILE_MIN_INTERVAL, le=1)):
+    try:
+        collapsed = await profiler.profile(seconds, interval)
+    except ProfilingInProgressError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Another profile is already running",
+        )
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
+    )
@@ -0,0 +1,21 @@
+import math
+from typing import Callable, Awaitable
+from fastapi import HTTPException
+from errors import RateLimitExceededError
+from services.rate_limits import rate_limiter
+
+
+def rate_limited(endpoint: str) -> Callable[[int], Awaitable[None]]:
+    """Зависимость FastAPI: 429 с Retry-After, если владелец объявления исчерпал лимит отправок на endpoint."""
+
+    async def dependency(item_id: int) -> None:
+        try:
+            await rate_limiter.check(endpoint, item_id)
+        except RateLimitExceededError as e:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many moderation requests, retry later",
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
+
+    return dependency
@@ -1,8 +1,47 @@
-from fastapi import APIRouter, Depends
-from clients.kafka import kafka_producer
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from model import model_singleton
+from model_watcher import model_watcher
+from routers.debug import require_debug_token
+from inference import inference_executor
+from services.shadow import shadow_scorer
+from middlewares.admission import admission_controller
+from services.result_notifier import result_notifier
 
 router = APIRouter(tags=["Health"])
 
 @router.get("/health")
 def health():
-    return {"status": "healthy", "kafka_producer_loaded": kafka_producer._initialized}
\ No newline at end of file
+    return {
+        "status": "healthy",
+        "model_loaded": model_singleton.is_loaded,
+        "model_version": model_singleton.version,
+        "previous_model_version": model_singleton.previous_version,
+        "inference": inference_executor.snapshot(),
+        "admission": admission_controller.snapshot(),
+        "result_notifier": result_notifier.snapshot(),
+    }
+
+@router.get("/ready")
+def ready(response: Response):
+    is_ready = model_singleton.is_loaded
+    if not is_ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "ready": is_ready,
+        "model_loaded": model_singleton.is_loaded,
+    }
+
+@router.post("/health/model/rollback", dependencies=[Depends(require_debug_token)])
+def rollback_model():
+    # Меняет модель процесса, поэтому закрыт тем же DEBUG_TOKEN, что и /debug
+    version = model_watcher.rollback()
+    if version is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="There is no previous model version to roll back to",
+        )
+    return {"model_version": version, "previous_model_version": model_singleton.previous_version}
+
+@router.get("/health/model/shadow")
+def shadow_stats():
+    return shadow_scorer.snapshot()
@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from metrics import render_metrics
+
+router = APIRouter(tags=["Metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
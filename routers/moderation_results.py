@@ -1,36 +1,176 @@
-from fastapi import APIRouter, HTTPException, status, Response, Request
-from typing import Sequence, Mapping, Any
+from fastapi import APIRouter, HTTPException, Query, status, Response, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, List, Sequence, Mapping, Any, Union
 from services.moderations import ModerationService
+from services.result_notifier import TERMINAL_STATUSES, result_notifier
 from errors import ModerationNotFoundError
-from models.moderation_result import ErrorModerationResultResponse, ModerationResultResponse
+from models.moderation_result import (
+    ErrorModerationResultResponse,
+    ItemModerationResultResponse,
+    ModerationLookupRequest,
+    ModerationLookupResponse,
+    ModerationResultResponse,
+)
 from models.moderation import ModerationModel
+import asyncio
+import json
 import logging
+import os
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 
 logger = logging.getLogger(__name__)
 
+RESULT_WAIT_TIMEOUT = float(os.getenv("RESULT_WAIT_TIMEOUT", "30"))
+RESULT_WAIT_MAX_TIMEOUT = float(os.getenv("RESULT_WAIT_MAX_TIMEOUT", "60"))
+RESULT_STREAM_MAX_TIMEOUT = float(os.getenv("RESULT_STREAM_MAX_TIMEOUT", "300"))
+RESULT_STREAM_MAX_TASKS = int(os.getenv("RESULT_STREAM_MAX_TASKS", "100"))
+RESULT_STREAM_HEARTBEAT = float(os.getenv("RESULT_STREAM_HEARTBEAT", "15"))
+RESULT_LOOKUP_MAX_IDS = int(os.getenv("RESULT_LOOKUP_MAX_IDS", "1000"))
+
 router = APIRouter(tags=["Moderation Results"])
 mod_service = ModerationService()
 
+
+def to_response(task_id: int, mod_result: ModerationModel) -> Union[ModerationResultResponse, ErrorModerationResultResponse]:
+    response_data = {
+        "task_id": task_id,
+        "status": mod_result.status,
+        "is_violation": mod_result.is_violation,
+        "probability": mod_result.probability,
+        "model_version": mod_result.model_version,
+    }
+    if mod_result.status == "failed":
+        response_data["error_message"] = mod_result.error_message
+        return ErrorModerationResultResponse(**response_data)
+    return ModerationResultResponse(**response_data)
+
+
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+async def _result_events(task_ids: Sequence[int], timeout: float) -> AsyncIterator[str]:
+    pending = set(task_ids)
+    queue = result_notifier.subscribe(pending)
+    try:
+        await result_notifier.start()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        reread = True
+        generation = result_notifier.generation
+        while pending:
+            if reread:
+                generation = result_notifier.generation
+                for task_id in sorted(pending):
+                    try:
+                        mod_result = await mod_service.get_by_task_id(task_id)
+                    except ModerationNotFoundError:
+                        pending.discard(task_id)
+                        yield _sse("not_found", json.dumps({"task_id": task_id}))
+                        continue
+                    if mod_result.status in TERMINAL_STATUSES:
+                        pending.discard(task_id)
+                        yield _sse("result", to_response(task_id, mod_result).model_dump_json())
+                if not pending:
+                    break
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                yield _sse("timeout", json.dumps({"task_ids": sorted(pending)}))
+                break
+
+            row = await result_notifier.next_result(queue, min(remaining, RESULT_STREAM_HEARTBEAT))
+            # Без подписки или после переподключения (результаты из разрыва не пришли)
+            # перечитываем статусы, иначе достаточно уведомлений
+            reread = not result_notifier.healthy or result_notifier.generation != generation
+            if row is None:
+                yield ": ping\n\n"
+                continue
+            if row["id"] in pending:
+                pending.discard(row["id"])
+                yield _sse("result", to_response(row["id"], ModerationModel(**row)).model_dump_json())
+    finally:
+        result_notifier.unsubscribe(queue, task_ids)
+
+
+@router.post('/lookup', response_model=ModerationLookupResponse)
+async def lookup(request: ModerationLookupRequest) -> ModerationLookupResponse:
+    """Результаты по списку задач и/или объявлений за один MGET и не больше двух запросов в БД."""
+    if len(request.task_ids) + len(request.item_ids) > RESULT_LOOKUP_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'At most {RESULT_LOOKUP_MAX_IDS} ids per lookup',
+        )
+
+    by_task, by_item = await mod_service.lookup(request.task_ids, request.item_ids)
+    return ModerationLookupResponse(
+        tasks=[to_response(task_id, by_task[task_id]) if task_id in by_task else None
+               for task_id in request.task_ids],
+        items=[ItemModerationResultResponse(item_id=item_id, task_id=by_item[item_id].id,
+                                            status=by_item[item_id].status,
+                                            is_violation=by_item[item_id].is_violation,
+                                            probability=by_item[item_id].probability,
+                                            model_version=by_item[item_id].model_version)
+               if item_id in by_item else None
+               for item_id in request.item_ids],
+    )
+
+
+# /stream и /{task_id}/wait объявлены раньше /{task_id}, чтобы не перехватываться им
+@router.get('/stream')
+async def stream(task_ids: List[int] = Query(...),
+                 timeout: float = Query(RESULT_STREAM_MAX_TIMEOUT, gt=0, le=RESULT_STREAM_MAX_TIMEOUT)):
+    """SSE: событие result по каждой задаче по мере завершения, timeout - для незавершённых к сроку."""
+    if len(task_ids) > RESULT_STREAM_MAX_TASKS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'At most {RESULT_STREAM_MAX_TASKS} task ids per stream',
+        )
+    return StreamingResponse(
+        _result_events(list(dict.fromkeys(task_ids)), timeout),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get('/{task_id}/wait')
+async def wait(task_id: int, timeout: float = Query(RESULT_WAIT_TIMEOUT, ge=0, le=RESULT_WAIT_MAX_TIMEOUT)):
+    """Long-poll: отвечает, как только задача завершится, или текущим статусом по истечении timeout."""
+    queue = result_notifier.subscribe([task_id])
+    try:
+        await result_notifier.start()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        reread = True
+        generation = result_notifier.generation
+        while True:
+            remaining = deadline - loop.time()
+            if reread or remaining <= 0:
+                generation = result_notifier.generation
+                mod_result = await mod_service.get_by_task_id(task_id)
+                if mod_result.status in TERMINAL_STATUSES or remaining <= 0:
+                    return to_response(task_id, mod_result)
+
+            row = await result_notifier.next_result(queue, min(remaining, RESULT_STREAM_HEARTBEAT))
+            if row is not None:
+                return to_response(task_id, ModerationModel(**row))
+            # Как в _result_events: результат из разрыва подписки не придёт уведомлением
+            reread = not result_notifier.healthy or result_notifier.generation != generation
+
+    except ModerationNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f'Moderation result from task {task_id} is not found',
+        )
+    finally:
+        result_notifier.unsubscribe(queue, [task_id])
+
+
 @router.get('/{task_id}')
 async def get_by_task_id(task_id: int):
     try:
         mod_result =  await mod_service.get_by_task_id(task_id)
-        response_data = {
-            "task_id": task_id,
-            "status": mod_result.status,
-            "is_violation": mod_result.is_violation,
-            "probability": mod_result.probability,
-        }
-        if mod_result.status == "failed":
-            response_data["error_message"] = mod_result.error_message
-            return ErrorModerationResultResponse(**response_data)
-        else:
-            return ModerationResultResponse(**response_data)
+        return to_response(task_id, mod_result)
 
     except ModerationNotFoundError:
         raise HTTPException(
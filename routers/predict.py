@@ -5,38 +5,35 @@ from models.predict_request import PredictRequest, SimplePredictRequest
 from models.predict_response import PredictResponse
 from services.predictions import PredictionService
 from services.moderations import ModerationService
-from errors import ModelNotLoadedError, AdNotFoundError
+from errors import ModelNotLoadedError, AdNotFoundError, InferenceQueueFullError
 import logging
-from typing import Optional
-from pydantic import BaseModel
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from model import model_singleton
+from routers.dependencies import rate_limited
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(tags=["Prediction"])
+def require_model_ready() -> None:
+    if not model_singleton.is_loaded:
+        raise HTTPException(
+                status_code=503,
+                detail="Model is not loaded. Service temporarily unavailable."
+            )
+
+
+router = APIRouter(tags=["Prediction"], dependencies=[Depends(require_model_ready)])
 
 pred_service = PredictionService()
 mod_service = ModerationService()
 
-class CreateModerationInDto(BaseModel):
-    item_id: int
-    status: str
-    is_violation: Optional[bool] = None
-    probability: Optional[float] = None
-    error_message: Optional[str] = None
-
-    
 @router.post("/predict", response_model = PredictResponse)
 async def predict(request: PredictRequest) -> PredictResponse:
     try:      
-        logger.info(f"""Processing ad moderation request: seller_id - {request.seller_id}, item_id - {request.item_id}, name - {request.name}, 
-                            is_verified_seller - {request.is_verified_seller}, description - {request.description}, 
-                            category - {request.category}, images_qty - {request.images_qty}
-                        """)
+        # Полный запрос - только на DEBUG: описание обрезается до LOG_MAX_PAYLOAD
+        logger.debug("Processing ad moderation request: seller_id - %s, item_id - %s, name - %s, "
+                     "is_verified_seller - %s, description - %s, category - %s, images_qty - %s",
+                     request.seller_id, request.item_id, request.name, request.is_verified_seller,
+                     request.description, request.category, request.images_qty,
+                     extra={"event": "predict.request"})
         
         is_violation, probability = await pred_service.predict(
                                                             request.seller_id,
@@ -46,10 +43,9 @@ async def predict(request: PredictRequest) -> PredictResponse:
                                                             request.description,
                                                             request.category,
                                                             request.images_qty)
-        logger.info(
-            f"Ad moderation for seller_id {request.seller_id} item {request.item_id} (name: '{request.name}...'): "
-            f"violation={is_violation}, probability={probability:.3f}"
-        )
+        logger.info("Ad moderation for seller_id %s item %s: violation=%s, probability=%.3f",
+                    request.seller_id, request.item_id, is_violation, probability,
+                    extra={"event": "predict.result", "route": "/predict"})
         return PredictResponse(is_violation=is_violation, probability = probability)
     
     except ModelNotLoadedError:
@@ -57,30 +53,36 @@ async def predict(request: PredictRequest) -> PredictResponse:
                 status_code=503,
                 detail="Model is not loaded. Service temporarily unavailable."
             )
+    except InferenceQueueFullError:
+        raise HTTPException(
+                status_code=503,
+                detail="Inference queue is full. Service temporarily unavailable.",
+                headers={"Retry-After": "1"}
+            )
     except Exception as e:
-        logger.error(f'Error processing ad moderation: {str(e)}')
+        logger.error('Error processing ad moderation: %s', e)
         raise HTTPException(status_code=500, detail=f'Internal server error: {str(e)}')
     
 
-@router.post("/simple_predict/{item_id}", response_model=PredictResponse)
+@router.post("/simple_predict/{item_id}", response_model=PredictResponse,
+             dependencies=[Depends(rate_limited("simple_predict"))])
 async def simple_predict(request: SimplePredictRequest) -> PredictResponse:
 
     try:
-        logger.info(f"""Processing ad moderation request: item_id - {request.item_id}""")
-        ready_moderation = await mod_service.get_latest_by_item_id(request.item_id)
+        logger.debug("Processing ad moderation request: item_id - %s", request.item_id,
+                     extra={"event": "simple_predict.request"})
+        # Готовый результат или новая задача вместе с признаками - один запрос к БД,
+        # второй - запись результата
+        moderation_result, predict_request = await mod_service.submit_for_prediction(request.item_id)
     
-        if ready_moderation and ready_moderation.status == "completed":
-            return PredictResponse(is_violation=ready_moderation.is_violation, 
-                                   probability=ready_moderation.probability)
-        
-        mod_data = CreateModerationInDto(item_id=request.item_id, status="pending")
-        moderation_result = await mod_service.register(dict(mod_data))
+        if moderation_result.status == "completed":
+            return PredictResponse(is_violation=moderation_result.is_violation, 
+                                   probability=moderation_result.probability)
 
-        is_violation, probability = await pred_service.simple_predict(request.item_id, moderation_result.id)
-        logger.info(
-            f"Ad moderation for item {request.item_id}: "
-            f"violation={is_violation}, probability={probability:.3f}"
-        )
+        is_violation, probability = await pred_service.predict_for_task(predict_request, moderation_result.id)
+        logger.info("Ad moderation for item %s: violation=%s, probability=%.3f",
+                    request.item_id, is_violation, probability,
+                    extra={"event": "simple_predict.result", "route": "/simple_predict/{item_id}"})
         return PredictResponse(is_violation=is_violation, probability = probability)
         
     except AdNotFoundError:
@@ -93,6 +95,12 @@ async def simple_predict(request: SimplePredictRequest) -> PredictResponse:
                 status_code=503,
                 detail="Model is not loaded. Service temporarily unavailable."
             )
+    except InferenceQueueFullError:
+        raise HTTPException(
+                status_code=503,
+                detail="Inference queue is full. Service temporarily unavailable.",
+                headers={"Retry-After": "1"}
+            )
     except Exception as e:
-        logger.error(f'Error processing ad moderation: {str(e)}')
+        logger.error('Error processing ad moderation: %s', e)
         raise HTTPException(status_code=500, detail=f'Internal server error: {str(e)}')
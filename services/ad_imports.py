@@ -0,0 +1,166 @@
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, List, Mapping, Optional, Sequence, Tuple, Union
+import asyncpg
+from pydantic import ValidationError
+from models.bulk_ad import BulkAdRow, BulkAdReject, BulkAdImportResponse
+from repositories.ads import AdRepository
+from services.moderations import ModerationService
+import logging
+
+logger = logging.getLogger(__name__)
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+SUPPORTED_FORMATS = (NDJSON, CSV)
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+async def aiter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Режет поток байтов (тело запроса, файл) на строки без буферизации всего тела.
+    Строки отдаются байтами: декодирует их import_lines, чтобы битая строка отклонялась отдельно."""
+    buffer = bytearray()
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b'\n', start)) != -1:
+            buffer += chunk[start:end]
+            yield bytes(buffer).rstrip(b'\r')
+            buffer.clear()
+            start = end + 1
+        buffer += chunk[start:]
+    if buffer:
+        yield bytes(buffer).rstrip(b'\r')
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return '; '.join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}"
+        for err in error.errors()
+    )
+
+
+@dataclass
+class _RowParser:
+    """Превращает строки NDJSON/CSV в словари. Для CSV первая строка - заголовок.
+    Поля CSV с переводами строк внутри кавычек не поддерживаются."""
+
+    fmt: str
+    header: Optional[List[str]] = None
+
+    def parse(self, line: str) -> Optional[Mapping[str, Any]]:
+        if self.fmt == NDJSON:
+            raw = json.loads(line)
+            if not isinstance(raw, dict):
+                raise ValueError('row must be a JSON object')
+            return raw
+
+        values = next(csv.reader([line]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        if len(values) != len(self.header):
+            raise ValueError(f'expected {len(self.header)} columns, got {len(values)}')
+        return {
+            name: value
+            for name, value in zip(self.header, values)
+            if value != '' or name == 'description'
+        }
+
+
+@dataclass
+class _ImportState:
+    item_ids: List[int] = field(default_factory=list)
+    task_ids: List[int] = field(default_factory=list)
+    rejected: List[BulkAdReject] = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class AdImportService:
+
+    ad_repo: AdRepository = AdRepository()
+    mod_service: ModerationService = ModerationService()
+
+    async def import_lines(self,
+                           lines: AsyncIterable[Union[bytes, str]],
+                           fmt: str,
+                           default_seller_id: Optional[int] = None,
+                           seller_id: Optional[int] = None,
+                           enqueue_moderation: bool = False,
+                           chunk_size: int = DEFAULT_CHUNK_SIZE) -> BulkAdImportResponse:
+        if fmt not in SUPPORTED_FORMATS:
+            raise ValueError(f'Unsupported import format: {fmt}')
+
+        parser = _RowParser(fmt)
+        state = _ImportState()
+        chunk: List[Tuple[int, BulkAdRow]] = []
+        row_number = 0
+
+        async for line in lines:
+            if not line.strip():
+                continue
+            row_number += 1
+
+            try:
+                # UnicodeDecodeError - подкласс ValueError: строка с битой кодировкой отклоняется одна
+                raw = parser.parse(line.decode('utf-8') if isinstance(line, bytes) else line)
+                if raw is None:
+                    continue
+                if default_seller_id is not None or seller_id is not None:
+                    raw.setdefault('seller_id', seller_id if seller_id is not None else default_seller_id)
+                row = BulkAdRow.model_validate(raw)
+                # Через API продавец грузит только свои объявления, как в POST /ads/
+                if seller_id is not None and row.seller_id != seller_id:
+                    raise ValueError(f'seller_id {row.seller_id} does not match the current seller')
+                chunk.append((row_number, row))
+            except ValidationError as e:
+                state.rejected.append(BulkAdReject(row=row_number, error=_format_validation_error(e)))
+            except (ValueError, csv.Error) as e:
+                state.rejected.append(BulkAdReject(row=row_number, error=str(e)))
+
+            if len(chunk) >= chunk_size:
+                await self._load_chunk(chunk, state, enqueue_moderation)
+                chunk = []
+
+        if chunk:
+            await self._load_chunk(chunk, state, enqueue_moderation)
+
+        logger.info(f"Bulk import finished: {len(state.item_ids)} ads loaded, {len(state.rejected)} rows rejected")
+
+        return BulkAdImportResponse(
+            accepted=len(state.item_ids),
+            item_ids=state.item_ids,
+            task_ids=state.task_ids,
+            rejected=sorted(state.rejected, key=lambda reject: reject.row),
+        )
+
+    async def _load_chunk(self,
+                          chunk: Sequence[Tuple[int, BulkAdRow]],
+                          state: _ImportState,
+                          enqueue_moderation: bool) -> None:
+        existing = await self.ad_repo.get_existing_seller_ids({row.seller_id for _, row in chunk})
+
+        accepted = []
+        for row_number, row in chunk:
+            if row.seller_id in existing:
+                accepted.append((row_number, row))
+            else:
+                state.rejected.append(BulkAdReject(row=row_number, error=f'Seller {row.seller_id} is not found'))
+
+        if not accepted:
+            return
+
+        try:
+            item_ids = await self.ad_repo.create_many([row.model_dump() for _, row in accepted])
+        except asyncpg.exceptions.ForeignKeyViolationError as e:
+            # Продавца удалили между проверкой и COPY - отклоняем весь чанк целиком
+            state.rejected.extend(BulkAdReject(row=row_number, error=str(e)) for row_number, _ in accepted)
+            return
+
+        state.item_ids.extend(item_ids)
+
+        if enqueue_moderation:
+            # Задачи и записи outbox одним запросом; в Kafka их отправит outbox relay
+            moderations = await self.mod_service.submit_many(item_ids)
+            state.task_ids.extend(moderation.id for moderation in moderations)
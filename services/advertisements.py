@@ -7,13 +7,19 @@ from typing import Mapping
 from typing import Sequence
 from typing import Any
 from repositories.ads import AdRepository
+from errors import SellerNotFoundError
+import asyncpg
 
 class AdvertisementService:
 
     ad_repo: AdRepository = AdRepository()
 
     async def create(self, values: Mapping[str, Any]) -> AdModel:
-        return await self.ad_repo.create(**values)
+        try:
+            return await self.ad_repo.create(**values)
+        except asyncpg.exceptions.ForeignKeyViolationError:
+            # Продавца удалили между проверкой и вставкой
+            raise SellerNotFoundError
     
     async def get_for_simple_predict(self, item_id: int) -> PredictRequest:
         return await self.ad_repo.get_for_simple_predict(item_id)
@@ -2,9 +2,11 @@ from dataclasses import dataclass
 from models.moderation import ModerationModel
 from typing import Mapping
 from typing import Sequence
-from typing import Any
+from typing import Any, Dict, Optional, Tuple
+from models.predict_request import PredictRequest
 from repositories.moderations import ModerationRepository
 from errors import AdNotFoundError
+from tracing import TRACEPARENT, inject_traceparent
 import asyncpg
 
 @dataclass(frozen=True)
@@ -12,11 +14,24 @@ class ModerationService:
 
     moderation_repo: ModerationRepository = ModerationRepository()
 
-    async def register(self, values: Mapping[str, Any]) -> ModerationModel:
+    async def submit(self, item_id: int) -> ModerationModel:
+        """Готовый результат по объявлению или новая pending-задача с записью outbox в одной
+        транзакции; в Kafka её отправит outbox relay. traceparent текущего спана сохраняется,
+        чтобы воркер продолжил ту же трассу."""
+        traceparent = inject_traceparent({}).get(TRACEPARENT)
         try:
-            return await self.moderation_repo.create(**values)
+            return await self.moderation_repo.submit_with_outbox(item_id, traceparent)
         except asyncpg.exceptions.ForeignKeyViolationError:
             raise AdNotFoundError
+
+    async def submit_for_prediction(self, item_id: int) -> Tuple[ModerationModel, Optional[PredictRequest]]:
+        """Готовый результат (признаки не нужны) или новая pending-задача и признаки для скоринга."""
+        return await self.moderation_repo.submit_for_prediction(item_id)
+
+    async def submit_many(self, item_ids: Sequence[int]) -> Sequence[ModerationModel]:
+        """Pending-задачи для новых объявлений вместе с записями outbox, как в submit."""
+        traceparent = inject_traceparent({}).get(TRACEPARENT)
+        return await self.moderation_repo.create_pending_many_with_outbox(item_ids, traceparent)
     
     async def ensure_idempotency(self, values: Mapping[str, Any]) -> ModerationModel:
         return await self.moderation_repo.ensure_idempotency(**values)
@@ -29,6 +44,10 @@ class ModerationService:
 
     async def get_latest_by_item_id(self, item_id: int) -> ModerationModel:
         return await self.moderation_repo.get_latest_by_item_id(item_id)
+
+    async def lookup(self, task_ids: Sequence[int],
+                     item_ids: Sequence[int]) -> Tuple[Dict[int, ModerationModel], Dict[int, ModerationModel]]:
+        return await self.moderation_repo.lookup(task_ids, item_ids)
     
     async def delete(self, task_id: int) -> ModerationModel:
         return await self.moderation_repo.delete(task_id)
@@ -3,18 +3,20 @@ from dataclasses import dataclass
 from models.predict_request import PredictRequest
 from typing import Any
 from repositories.ads import  AdRepository
-from sklearn.pipeline import Pipeline
 from model import model_singleton
+from inference import inference_executor
 from errors import ModelNotLoadedError
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, TYPE_CHECKING
 from datetime import datetime, timezone
 from services.moderations import ModerationService
+from services.shadow import shadow_scorer
+from tracing import start_span
 import logging
+import time
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class PredictionService:
@@ -25,7 +27,7 @@ class PredictionService:
     async def get_for_simple_predict(self, item_id: int) -> PredictRequest:
         return await self.ad_repo.get_for_simple_predict(item_id)
     
-    def get_model() -> Pipeline:
+    def get_model() -> 'Pipeline':
         return model_singleton._model
     
     async def predict(self, 
@@ -37,28 +39,55 @@ class PredictionService:
                         category: int,
                         images_qty: int):
         
-        if not model_singleton.is_loaded:
-            raise ModelNotLoadedError
-        
-        model = model_singleton._model
+        is_violation, violation_probability, _ = await self.score(
+            seller_id, is_verified_seller, item_id, name, description, category, images_qty
+        )
+        return is_violation, violation_probability
+
+    @staticmethod
+    def build_features(is_verified_seller: bool, description: str, category: int, images_qty: int) -> np.ndarray:
         verified_feature = 1.0 if is_verified_seller else 0.0
         images_normalized = min(images_qty, 10) / 10.0
         desc_length_normalized = len(description) / 1000.0
         category_normalized = category / 100.0
-        
-        features_array = np.array([[
+
+        return np.array([[
             verified_feature,
             images_normalized,
             desc_length_normalized,
             category_normalized
         ]])
+
+    async def score(self,
+                        seller_id: int,
+                        is_verified_seller: bool,
+                        item_id: int,
+                        name: str,
+                        description: str,
+                        category: int,
+                        images_qty: int):
+        
+        # Модель и её версию берём одним снимком: watcher может подменить модель в любой момент
+        model, model_version = model_singleton.snapshot()
+        if model is None:
+            raise ModelNotLoadedError
         
-        prediction_class = model.predict(features_array)[0]
-        probabilities = model.predict_proba(features_array)[0]
+        features_array = self.build_features(is_verified_seller, description, category, images_qty)
+
+        started_at = time.perf_counter()
+        with start_span("model.score", attributes={"model.version": model_version or "",
+                                                   "inference.mode": inference_executor.mode}):
+            predictions, probabilities = await inference_executor.run(model, model_version, features_array)
+        production_seconds = time.perf_counter() - started_at
+        prediction_class = predictions[0]
+        probabilities = probabilities[0]
         violation_probability = float(probabilities[1])
         is_violation = bool(prediction_class)
 
-        return is_violation, violation_probability
+        # Кандидат скорится в фоне, ответ production-модели его не ждёт
+        shadow_scorer.submit(features_array, is_violation, violation_probability, production_seconds)
+
+        return is_violation, violation_probability, model_version
     
     def build_moderation_result(
         self,
@@ -67,7 +96,8 @@ class PredictionService:
         is_violation: bool = None,
         probability: float = None,
         error_message: Optional[str] = None,
-        retry_count: int = 0
+        retry_count: int = 0,
+        model_version: Optional[str] = None
     ) -> Dict[str, Any]:
         
         result =  {
@@ -76,6 +106,7 @@ class PredictionService:
             "is_violation": is_violation,
             "probability": probability,
             "error_message": error_message,
+            "model_version": model_version,
             "processed_at": datetime.now(timezone.utc).replace(tzinfo=None)
         }
 
@@ -85,7 +116,11 @@ class PredictionService:
                         item_id: int, task_id: int):
         
         predict_request = await self.get_for_simple_predict(item_id)
-        is_violation, violation_probability = await self.predict(
+        return await self.predict_for_task(predict_request, task_id)
+
+    async def predict_for_task(self, predict_request: PredictRequest, task_id: int):
+        """Скоринг по уже прочитанным признакам и завершение задачи task_id."""
+        is_violation, violation_probability, model_version = await self.score(
             predict_request.seller_id,
             predict_request.is_verified_seller, 
             predict_request.item_id,
@@ -95,13 +130,14 @@ class PredictionService:
             predict_request.images_qty)
         
         query = self.build_moderation_result(
-                item_id=item_id,
+                item_id=predict_request.item_id,
                 status="completed",
                 is_violation=is_violation,
                 probability=violation_probability,
+                model_version=model_version,
             )
 
-        logger.info(f"Updating status: {task_id}")
+        logger.debug("Updating status: %s", task_id)
         await self.mod_service.update_status(task_id, query)
         
         return is_violation, violation_probability
@@ -0,0 +1,147 @@
+"""Ограничение частоты отправки объявлений на модерацию по продавцу.
+
+Бакет ведётся в Redis (repositories.rate_limits), поэтому лимит общий для всех процессов
+API. Если Redis недоступен, решение принимается по бакету в памяти процесса: лимит
+становится "на процесс", но сервис не перестаёт принимать запросы.
+
+RATE_LIMITS - "эндпоинт.уровень=скорость/запас,...": скорость в запросах в секунду,
+запас - размер бакета. Уровни: verified и unverified, скорость 0 снимает ограничение.
+"""
+import logging
+import os
+import time
+from typing import Dict, Mapping, Tuple
+
+from redis.exceptions import RedisError
+
+from errors import AdNotFoundError, RateLimitExceededError
+from metrics import RATE_LIMIT_FALLBACK, RATE_LIMIT_REJECTED
+from repositories.ads import AdRepository
+from repositories.rate_limits import RateLimitRedisStorage
+
+logger = logging.getLogger(__name__)
+
+VERIFIED = "verified"
+UNVERIFIED = "unverified"
+
+DEFAULT_RATE_LIMITS = {
+    ("async_predict", VERIFIED): (5.0, 20),
+    ("async_predict", UNVERIFIED): (1.0, 5),
+    ("simple_predict", VERIFIED): (5.0, 20),
+    ("simple_predict", UNVERIFIED): (1.0, 5),
+}
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_IDENTITY_TTL = float(os.getenv("RATE_LIMIT_IDENTITY_TTL", "60"))
+RATE_LIMIT_IDENTITY_CACHE_SIZE = int(os.getenv("RATE_LIMIT_IDENTITY_CACHE_SIZE", "10000"))
+
+Limit = Tuple[float, int]
+
+
+def parse_rate_limits(spec: str, defaults: Mapping[Tuple[str, str], Limit]) -> Dict[Tuple[str, str], Limit]:
+    limits = dict(defaults)
+    for part in spec.split(","):
+        if "=" not in part or "." not in part.split("=", 1)[0]:
+            continue
+        key, value = part.split("=", 1)
+        endpoint, tier = key.strip().split(".", 1)
+        rate, _, burst = value.strip().partition("/")
+        rate = max(float(rate), 0.0)
+        limits[(endpoint, tier)] = (rate, max(int(burst), 1) if burst else max(int(rate), 1))
+    return limits
+
+
+class TokenBucket:
+    """Бакет в памяти процесса - запасной вариант на время недоступности Redis."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.ts = time.monotonic()
+
+    def take(self) -> Tuple[bool, float]:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True, 0.0
+        return False, (1 - self.tokens) / self.rate
+
+
+class RateLimitService:
+
+    def __init__(self, limits: Mapping[Tuple[str, str], Limit] = DEFAULT_RATE_LIMITS,
+                 storage: RateLimitRedisStorage = RateLimitRedisStorage(),
+                 ad_repo: AdRepository = AdRepository(),
+                 enabled: bool = RATE_LIMIT_ENABLED, identity_ttl: float = RATE_LIMIT_IDENTITY_TTL):
+        self.limits = dict(limits)
+        self.storage = storage
+        self.ad_repo = ad_repo
+        self.enabled = enabled
+        self.identity_ttl = identity_ttl
+        self._identities: Dict[int, Tuple[float, int, bool]] = {}
+        self._local_buckets: Dict[str, TokenBucket] = {}
+
+    @classmethod
+    def from_env(cls) -> "RateLimitService":
+        return cls(parse_rate_limits(os.getenv("RATE_LIMITS", ""), DEFAULT_RATE_LIMITS))
+
+    async def _identity(self, item_id: int) -> Tuple[int, bool]:
+        """(seller_id, is_verified) владельца объявления. Ключ всегда по владельцу, а не по cookie
+        x-user-id: cookie задаёт клиент, и с выдуманным продавцом лимит обходился бы.
+        Ответ кэшируется на identity_ttl, чтобы лимитер не добавлял запрос в БД на каждый вызов."""
+        cached = self._identities.get(item_id)
+        now = time.monotonic()
+        if cached is not None and cached[0] > now:
+            return cached[1], cached[2]
+
+        ad = await self.ad_repo.get_for_simple_predict(item_id)
+        identity = (ad.seller_id, ad.is_verified_seller)
+
+        if len(self._identities) >= RATE_LIMIT_IDENTITY_CACHE_SIZE:
+            self._identities.clear()
+        self._identities[item_id] = (now + self.identity_ttl, *identity)
+        return identity
+
+    def _take_local(self, key: str, rate: float, burst: int) -> Tuple[bool, float]:
+        bucket = self._local_buckets.get(key)
+        if bucket is None or bucket.rate != rate or bucket.burst != burst:
+            bucket = self._local_buckets[key] = TokenBucket(rate, burst)
+        return bucket.take()
+
+    async def check(self, endpoint: str, item_id: int) -> None:
+        """Списывает токен владельца объявления для endpoint. RateLimitExceededError - если бакет пуст."""
+        if not self.enabled:
+            return
+
+        try:
+            owner_id, is_verified = await self._identity(item_id)
+        except AdNotFoundError:
+            # Ставить в очередь нечего - обработчик ответит 404
+            return
+        except Exception as e:
+            # Недоступная БД - не повод отказывать: лимитер пропускает запрос
+            logger.warning("Rate limit identity lookup failed for item %s: %s", item_id, e)
+            return
+
+        tier = VERIFIED if is_verified else UNVERIFIED
+        rate, burst = self.limits.get((endpoint, tier), (0.0, 0))
+        if rate <= 0:
+            return
+
+        key = f"{endpoint}:{owner_id}"
+        try:
+            allowed, retry_after = await self.storage.take(key, rate, burst)
+        except (RedisError, ConnectionError, OSError) as e:
+            RATE_LIMIT_FALLBACK.inc()
+            logger.warning("Redis is unavailable for rate limiting, using in-process bucket: %s", e)
+            allowed, retry_after = self._take_local(key, rate, burst)
+
+        if not allowed:
+            RATE_LIMIT_REJECTED.labels(endpoint, tier).inc()
+            raise RateLimitExceededError(retry_after)
+
+
+rate_limiter = RateLimitService.from_env()
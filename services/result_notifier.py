@@ -0,0 +1,146 @@
+"""Доставка результатов модерации ожидающим запросам через Redis pub/sub.
+
+ModerationRepository.update публикует строку завершённой задачи в канал
+ModerationRedisStorage.RESULTS_CHANNEL. В каждом процессе API один подписчик слушает канал
+и раздаёт сообщения очередям запросов /moderation_results/{task_id}/wait и /stream,
+которые ждут эти task_id. Пока подписка не работает (Redis недоступен), ожидающие
+перечитывают статус раз в RESULT_POLL_INTERVAL секунд.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, Mapping, Optional, Set
+
+from clients.redis import get_redis_connection
+from metrics import RESULT_WAITERS
+from repositories.moderations import ModerationRedisStorage
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+RESULT_POLL_INTERVAL = float(os.getenv("RESULT_POLL_INTERVAL", "1"))
+RESULT_RECONNECT_DELAY = float(os.getenv("RESULT_RECONNECT_DELAY", "1"))
+RESULT_SUBSCRIBE_WAIT = float(os.getenv("RESULT_SUBSCRIBE_WAIT", "0.5"))
+
+
+class ResultNotifier:
+
+    def __init__(self, channel: str = ModerationRedisStorage.RESULTS_CHANNEL,
+                 reconnect_delay: float = RESULT_RECONNECT_DELAY):
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.delivered = 0
+        # Растёт при каждой (пере)подписке: сообщения, опубликованные в разрыве, потеряны,
+        # и ожидающие сверяют его, чтобы перечитать статусы
+        self.generation = 0
+        self._waiters: Dict[int, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._subscribed: Optional[asyncio.Event] = None
+        self._attempted: Optional[asyncio.Event] = None
+
+    @property
+    def healthy(self) -> bool:
+        """Подписка активна - ждать уведомления можно без перечитывания статуса."""
+        return self._subscribed is not None and self._subscribed.is_set()
+
+    async def start(self) -> None:
+        """Запускает подписчика при первом ожидающем (или после смены event loop) и даёт
+        первой попытке подписки до RESULT_SUBSCRIBE_WAIT секунд."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._subscribed = asyncio.Event()
+            self._attempted = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        if not self._attempted.is_set():
+            try:
+                await asyncio.wait_for(self._attempted.wait(), RESULT_SUBSCRIBE_WAIT)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        if task.get_loop() is not asyncio.get_running_loop():
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with get_redis_connection() as connection:
+                    pubsub = connection.pubsub()
+                    try:
+                        await pubsub.subscribe(self.channel)
+                        self.generation += 1
+                        self._subscribed.set()
+                        self._attempted.set()
+                        logger.info("Subscribed to %s", self.channel)
+                        async for message in pubsub.listen():
+                            if message["type"] == "message":
+                                self.dispatch(message["data"])
+                    finally:
+                        await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Result subscription to %s failed, waiters fall back to polling: %s", self.channel, e)
+            finally:
+                self._subscribed.clear()
+                self._attempted.set()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def dispatch(self, data: Any) -> None:
+        try:
+            row = json.loads(data)
+            queues = self._waiters.get(int(row["id"]), ())
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning("Malformed result notification: %s", e)
+            return
+        for queue in queues:
+            queue.put_nowait(row)
+            self.delivered += 1
+
+    def subscribe(self, task_ids: Iterable[int]) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        for task_id in task_ids:
+            self._waiters.setdefault(task_id, set()).add(queue)
+        RESULT_WAITERS.inc()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, task_ids: Iterable[int]) -> None:
+        for task_id in task_ids:
+            queues = self._waiters.get(task_id)
+            if queues is None:
+                continue
+            queues.discard(queue)
+            if not queues:
+                del self._waiters[task_id]
+        RESULT_WAITERS.dec()
+
+    async def next_result(self, queue: asyncio.Queue, timeout: float) -> Optional[Mapping[str, Any]]:
+        """Следующая строка из очереди или None, если за timeout её не было. Без подписки
+        ожидание сокращается до RESULT_POLL_INTERVAL, чтобы вызывающий перечитал статус."""
+        if not self.healthy:
+            timeout = min(timeout, RESULT_POLL_INTERVAL)
+        try:
+            return await asyncio.wait_for(queue.get(), max(timeout, 0))
+        except asyncio.TimeoutError:
+            return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "subscribed": self.healthy,
+            "generation": self.generation,
+            "waiting_tasks": len(self._waiters),
+            "delivered": self.delivered,
+        }
+
+
+result_notifier = ResultNotifier()
@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from model import CANDIDATE_ALIAS, ModelSingleton, model_singleton
+from model_watcher import MODEL_RELOAD_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+SHADOW_SAMPLE_RATE = float(os.getenv("SHADOW_SAMPLE_RATE", "0"))
+SHADOW_QUEUE_SIZE = int(os.getenv("SHADOW_QUEUE_SIZE", "1000"))
+SHADOW_BATCH_SIZE = int(os.getenv("SHADOW_BATCH_SIZE", "64"))
+
+
+@dataclass
+class ShadowStats:
+    sampled: int = 0
+    scored: int = 0
+    dropped: int = 0
+    failed: int = 0
+    batches: int = 0
+    disagreements: int = 0
+    abs_diff_total: float = 0.0
+    abs_diff_max: float = 0.0
+    production_seconds_total: float = 0.0
+    candidate_seconds_total: float = 0.0
+    lag_seconds_max: float = 0.0
+
+
+@dataclass
+class ShadowSample:
+    features: np.ndarray
+    is_violation: bool
+    probability: float
+    production_seconds: float
+    enqueued_at: float
+
+
+class ShadowScorer:
+    """Теневой скоринг модели-кандидата на живом трафике.
+
+    Доля запросов SHADOW_SAMPLE_RATE после ответа production-модели кладётся в
+    ограниченную очередь через put_nowait: при переполнении пример отбрасывается,
+    поэтому кандидат не добавляет задержки ни /predict, ни воркеру. Фоновая задача
+    забирает накопившиеся примеры пачкой до SHADOW_BATCH_SIZE и скорит их одним
+    вызовом predict_proba в отдельном потоке - общий пул инференса не занимается.
+
+    Раз в MODEL_RELOAD_INTERVAL алиас кандидата перепроверяется: если он переехал,
+    новая версия загружается, а статистика сравнения начинается заново."""
+
+    def __init__(self, singleton: ModelSingleton = model_singleton, sample_rate: float = SHADOW_SAMPLE_RATE,
+                 queue_size: int = SHADOW_QUEUE_SIZE, batch_size: int = SHADOW_BATCH_SIZE,
+                 alias: str = CANDIDATE_ALIAS, reload_interval: float = MODEL_RELOAD_INTERVAL):
+        self._singleton = singleton
+        self.sample_rate = sample_rate
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.alias = alias
+        self.reload_interval = reload_interval
+        self.stats = ShadowStats()
+        self._candidate = None
+        self._candidate_version: Optional[str] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self.sample_rate <= 0 or self._task is not None:
+            return
+        try:
+            model, version = await asyncio.to_thread(self._singleton.load_candidate, self.alias)
+        except Exception as e:
+            logger.error(f"Shadow scoring disabled, candidate model is unavailable: {e}")
+            return
+        self.set_candidate(model, version)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._task = asyncio.create_task(self._run())
+        if self.reload_interval > 0:
+            self._reload_task = asyncio.create_task(self._watch_candidate())
+        logger.info(f"Shadow scoring started: candidate version {version}, sample rate {self.sample_rate}")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        for task in (self._task, self._reload_task):
+            if task is None:
+                continue
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._task = self._reload_task = None
+        # Без очереди submit сразу выходит: после остановки примеры некому забирать
+        self._queue = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+        logger.info("Shadow scoring stopped")
+
+    async def check_candidate(self) -> bool:
+        """Один опрос алиаса кандидата. Возвращает True, если кандидат был заменён."""
+        version = await asyncio.to_thread(self._singleton.resolve_candidate_version, self.alias)
+        if version == self._candidate_version:
+            return False
+        model, version = await asyncio.to_thread(self._singleton.load_candidate, self.alias)
+        self.set_candidate(model, version)
+        logger.info(f"Shadow candidate reloaded: version {version}")
+        return True
+
+    async def _watch_candidate(self) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                await self.check_candidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Shadow candidate reload failed, keeping version {self._candidate_version}: {e}")
+
+    def set_candidate(self, model, version: Optional[str]) -> None:
+        self._candidate, self._candidate_version = model, version
+        self.stats = ShadowStats()
+
+    def submit(self, features: np.ndarray, is_violation: bool, probability: float,
+               production_seconds: float) -> None:
+        """Неблокирующая постановка примера в теневую очередь; вызывается после ответа production-модели."""
+        if self._queue is None or random.random() >= self.sample_rate:
+            return
+        self.stats.sampled += 1
+        try:
+            self._queue.put_nowait(
+                ShadowSample(features, is_violation, probability, production_seconds, time.monotonic())
+            )
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+
+    def _drain(self, first: ShadowSample) -> List[ShadowSample]:
+        batch = [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    def _score(self, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+        started_at = time.perf_counter()
+        predictions, probabilities = self._candidate.predict(features), self._candidate.predict_proba(features)
+        return predictions, probabilities, time.perf_counter() - started_at
+
+    def _record(self, batch: List[ShadowSample], predictions: np.ndarray, probabilities: np.ndarray,
+                elapsed: float) -> None:
+        now = time.monotonic()
+        stats = self.stats
+        stats.batches += 1
+        stats.scored += len(batch)
+        stats.candidate_seconds_total += elapsed
+
+        for sample, prediction, candidate_probabilities in zip(batch, predictions, probabilities):
+            diff = abs(float(candidate_probabilities[1]) - sample.probability)
+            stats.disagreements += int(bool(prediction) != sample.is_violation)
+            stats.abs_diff_total += diff
+            stats.abs_diff_max = max(stats.abs_diff_max, diff)
+            stats.production_seconds_total += sample.production_seconds
+            stats.lag_seconds_max = max(stats.lag_seconds_max, now - sample.enqueued_at)
+
+    async def process_batch(self, batch: List[ShadowSample]) -> None:
+        features = np.vstack([sample.features for sample in batch])
+        loop = asyncio.get_running_loop()
+        try:
+            if self._pool is None:
+                predictions, probabilities, elapsed = self._score(features)
+            else:
+                predictions, probabilities, elapsed = await loop.run_in_executor(self._pool, self._score, features)
+        except Exception as e:
+            self.stats.failed += len(batch)
+            logger.warning(f"Shadow scoring of {len(batch)} samples failed: {e}")
+            return
+        self._record(batch, predictions, probabilities, elapsed)
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            await self.process_batch(self._drain(first))
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats = self.stats
+        scored = stats.scored or 1
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "candidate_alias": self.alias,
+            "candidate_version": self._candidate_version,
+            "production_version": self._singleton.version,
+            "queue_size": self._queue.qsize() if self._queue is not None else 0,
+            "queue_capacity": self.queue_size,
+            **asdict(stats),
+            "disagreement_rate": stats.disagreements / scored,
+            "mean_abs_diff": stats.abs_diff_total / scored,
+            "production_latency_avg_seconds": stats.production_seconds_total / scored,
+            "candidate_latency_avg_seconds": stats.candidate_seconds_total / scored,
+        }
+
+
+shadow_scorer = ShadowScorer()
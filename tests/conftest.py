@@ -1,13 +1,20 @@
 import sys
 sys.path.append('.')
+import os
+import tempfile
+
+# .env включает регистрацию в MLflow: без этого каждый прогон тестов добавлял бы версию модели
+# в хранилище репозитория. Задаётся до импорта model.py, load_dotenv не перезаписывает окружение
+os.environ["REGISTER_MLFLOW"] = "false"
+os.environ["MLFLOW_TRACKING_URI"] = f"sqlite:///{tempfile.mkdtemp(prefix='mlflow-tests-')}/mlflow.db"
+
 from typing import Any, Mapping, Generator
 import pytest
 from fastapi.testclient import TestClient
 from http import HTTPStatus
-import os
 import uuid
 from fastapi import FastAPI, HTTPException
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock
 from routers import predict
 from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
 from clients.postgres import get_pg_connection
@@ -17,10 +24,18 @@ from datetime import datetime
 from repositories.sellers import SellerRepository
 from contextlib import asynccontextmanager
 from services.sellers import SellerService
-from routers import health, async_predict, ads, sellers, moderation_results, predict
+from routers import health, async_predict, ads, sellers, moderation_results, predict, metrics, debug
+from middlewares.admission import AdmissionMiddleware
+from middlewares.metrics import MetricsMiddleware
+from middlewares.tracing import TracingMiddleware
 from typing import AsyncIterator
 
 from workers.moderation_worker import KafkaConsumerWorker
+from model import model_singleton
+
+# Модель больше не грузится при импорте model.py - в тестах загружаем её заранее,
+# как это делает lifespan приложения
+model_singleton.load()
 
 
 @asynccontextmanager
@@ -35,7 +50,13 @@ app = FastAPI(
     lifespan = lifespan
 )
 
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(health.router)
+app.include_router(metrics.router)
+app.include_router(debug.router)
 app.include_router(async_predict.router)
 app.include_router(predict.router)
 app.include_router(ads.router, prefix='/ads')
@@ -245,28 +266,23 @@ def created_item_zero_images_data() -> Mapping[str, Any]:
 
 @pytest.fixture
 def created_task_pending(app_client, created_item):
-    mock_producer = AsyncMock()
-    mock_producer.send_moderation_request = AsyncMock()
-    mock_producer.send_moderation_request.return_value = True
+    response = app_client.get(f'/ads/{created_item["item_id"]}')
+    assert response.status_code == HTTPStatus.OK
+    item_id = created_item["item_id"]
     
-    with patch('routers.async_predict.kafka_producer', mock_producer):
-        response = app_client.get(f'/ads/{created_item["item_id"]}')
-        assert response.status_code == HTTPStatus.OK
-        item_id = created_item["item_id"]
-        
-        response = app_client.post(
-            f"/async_predict/{item_id}",
-            json={"item_id": item_id}
-        )
+    response = app_client.post(
+        f"/async_predict/{item_id}",
+        json={"item_id": item_id}
+    )
 
-        task_data = response.json()
-        task_id = task_data["task_id"]
-        
-        yield task_data
+    task_data = response.json()
+    task_id = task_data["task_id"]
+    
+    yield task_data
 
-        app_client.delete(
-            f'/moderation_results/{task_id}'
-        )
+    app_client.delete(
+        f'/moderation_results/{task_id}'
+    )
 
 @pytest.fixture
 def worker():
@@ -0,0 +1,133 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from middlewares.admission import (
+    ASYNC_SUBMIT,
+    CRUD,
+    PREDICT,
+    READS,
+    WAITS,
+    AdmissionController,
+    AdmissionGate,
+    AdmissionMiddleware,
+    parse_limits,
+    route_class,
+)
+
+
+class TestAdmissionUnit:
+
+    @pytest.mark.parametrize("method, path, expected", [
+        ("POST", "/predict", PREDICT),
+        ("POST", "/simple_predict/1", PREDICT),
+        ("POST", "/async_predict/1", ASYNC_SUBMIT),
+        ("GET", "/moderation_results/5", READS),
+        ("GET", "/moderation_results/5/wait", WAITS),
+        ("GET", "/moderation_results/stream", WAITS),
+        ("POST", "/moderation_results/lookup", READS),
+        ("GET", "/ads/5", READS),
+        ("PATCH", "/ads/update/5", CRUD),
+        ("POST", "/login", CRUD),
+        ("GET", "/health", None),
+        ("GET", "/health/model/shadow", None),
+        ("GET", "/metrics", None),
+        ("GET", "/ready", None),
+        ("GET", "/debug/profile", None),
+    ])
+    def test_route_class(self, method, path, expected):
+        assert route_class(method, path) == expected
+
+    def test_parse_limits_overrides_defaults(self):
+        assert parse_limits("predict=8, reads=0,junk", {"predict": 64, "reads": 256, "crud": 64}) == \
+            {"predict": 8, "reads": 0, "crud": 64}
+
+    async def test_gate_admits_up_to_limit_then_rejects_when_queue_full(self):
+        gate = AdmissionGate("test", limit=1, queue_size=0)
+
+        assert await gate.acquire(0.1)
+        assert not await gate.acquire(0.1)
+        assert gate.snapshot()["rejected_queue_full"] == 1
+
+        gate.release()
+        assert gate.in_flight == 0
+
+    async def test_gate_waiter_times_out(self):
+        gate = AdmissionGate("test", limit=1, queue_size=1)
+        await gate.acquire(0.1)
+
+        assert not await gate.acquire(0.01)
+
+        snapshot = gate.snapshot()
+        assert snapshot["rejected_timeout"] == 1
+        assert snapshot["queue_depth"] == 0
+        assert snapshot["in_flight"] == 1
+
+    async def test_release_hands_slot_to_waiter(self):
+        gate = AdmissionGate("test", limit=1, queue_size=1)
+        await gate.acquire(0.1)
+
+        waiting = asyncio.create_task(gate.acquire(1.0))
+        await asyncio.sleep(0)
+        assert gate.snapshot()["queue_depth"] == 1
+
+        gate.release()
+        assert await waiting
+        assert gate.in_flight == 1
+
+        gate.release()
+        assert gate.in_flight == 0
+
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        gate = AdmissionGate("test", limit=1, queue_size=1)
+        await gate.acquire(0.1)
+
+        waiting = asyncio.create_task(gate.acquire(1.0))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        gate.release()
+        assert gate.in_flight == 0
+        assert gate.snapshot()["queue_depth"] == 0
+
+    def test_middleware_sheds_with_retry_after(self):
+        controller = AdmissionController({PREDICT: 1}, {PREDICT: 0}, max_wait_ms=10)
+        release = asyncio.Event()
+        app = FastAPI()
+        app.add_middleware(AdmissionMiddleware, controller=controller)
+
+        @app.post("/predict")
+        async def slow_predict():
+            await release.wait()
+            return {"ok": True}
+
+        @app.get("/health")
+        def health():
+            return {"status": "healthy"}
+
+        async def scenario():
+            import httpx
+
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                first = asyncio.create_task(client.post("/predict"))
+                await asyncio.sleep(0.05)
+                shed = await client.post("/predict")
+                health = await client.get("/health")
+                release.set()
+                return await first, shed, health
+
+        first, shed, health = asyncio.run(scenario())
+
+        assert first.status_code == 200
+        assert shed.status_code == 503
+        assert shed.headers["retry-after"] == "1"
+        assert health.status_code == 200
+        assert controller.snapshot()[PREDICT]["rejected_queue_full"] == 1
+
+    def test_health_exposes_admission(self, app_client: TestClient):
+        response = app_client.get("/health")
+
+        assert set(response.json()["admission"]) == {PREDICT, ASYNC_SUBMIT, READS, CRUD, WAITS}
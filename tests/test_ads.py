@@ -5,8 +5,10 @@ from http import HTTPStatus
 from unittest.mock import AsyncMock, patch
 from datetime import datetime
 from repositories.ads import AdRepository
-from errors import AdNotFoundError
+from errors import AdNotFoundError, SellerNotFoundError
 from services.advertisements import AdvertisementService
+from services.ad_imports import AdImportService, aiter_lines
+import json
 
 @pytest.mark.integration
 class TestAdAPI:
@@ -117,9 +119,7 @@ class TestAdAPIUnit:
             'seller_id': logged_seller_data['seller_id']
         }
 
-        mock_seller_storage.select_by_seller_id.return_value = logged_seller_data
-
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage)
 
         with patch('services.advertisements.AdvertisementService.ad_repo', mock_ad_repo):
             response = app_client_with_mocks.post(
@@ -133,18 +133,33 @@ class TestAdAPIUnit:
             assert created_item['name'] == item_data['name']
             
             mock_ad_storage.create.assert_called_once()
-            mock_seller_storage.select_by_seller_id.assert_called_once()
+            mock_seller_storage.select_by_seller_id.assert_not_called()
+
+    def test_create_ad_seller_not_found_unit(self, app_client_with_mocks, item_data,
+                                             logged_seller_data, mock_ad_storage):
+        mock_ad_storage.create.side_effect = SellerNotFoundError()
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage)
+
+        with patch('services.advertisements.AdvertisementService.ad_repo', mock_ad_repo):
+            response = app_client_with_mocks.post(
+                '/ads/',
+                json=item_data,
+                cookies={'x-user-id': str(logged_seller_data['seller_id'])}
+            )
+
+            assert response.status_code == HTTPStatus.NOT_FOUND
+            assert f"Seller {logged_seller_data['seller_id']} is not found" in response.json()['detail']
 
     
     def test_update_description_unit(self, app_client_with_mocks,
                                     created_item_data, logged_seller_data, mock_ad_storage, mock_seller_storage):
         
         mock_moderation_repo = AsyncMock()
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage, moderation_repo=mock_moderation_repo)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, moderation_repo=mock_moderation_repo)
         
         with patch('services.advertisements.AdvertisementService.ad_repo', mock_ad_repo):
             new_description = "Better description"
-            updated_item = {**created_item_data, 'description': new_description}
+            updated_item = {**created_item_data, 'description': new_description, 'moderation_ids': [7, 8]}
             mock_ad_storage.update.return_value = updated_item
             
             response = app_client_with_mocks.patch(
@@ -154,18 +169,19 @@ class TestAdAPIUnit:
             )
             
             assert response.status_code == HTTPStatus.OK
+            assert 'moderation_ids' not in response.json()
             mock_ad_storage.update.assert_called_once()
-            mock_moderation_repo.invalidate_by_item_id.assert_called_once()
+            mock_moderation_repo.evict_cached.assert_called_once_with(created_item_data["item_id"], [7, 8])
+            mock_moderation_repo.invalidate_by_item_id.assert_not_called()
     
     def test_delete_ad_unit(self, app_client_with_mocks, mock_ad_storage, mock_seller_storage,
                            created_item_data, logged_seller_data):
         
         mock_moderation_repo = AsyncMock()
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage, 
-                                    moderation_repo=mock_moderation_repo)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, moderation_repo=mock_moderation_repo)
 
         with patch('services.advertisements.AdvertisementService.ad_repo', mock_ad_repo):
-            mock_ad_storage.delete.return_value = created_item_data
+            mock_ad_storage.delete.return_value = {**created_item_data, 'moderation_ids': [7]}
             
             response = app_client_with_mocks.delete(
                 f'/ads/{created_item_data["item_id"]}',
@@ -174,11 +190,12 @@ class TestAdAPIUnit:
             
             assert response.status_code == HTTPStatus.OK
             mock_ad_storage.delete.assert_called_once()
-            mock_moderation_repo.delete_all_by_item_id.assert_called_once()
+            mock_moderation_repo.evict_cached.assert_called_once_with(created_item_data["item_id"], [7])
+            mock_moderation_repo.delete_all_by_item_id.assert_not_called()
     
     def test_get_many_ads_unit(self, app_client_with_mocks, mock_ad_storage, mock_seller_storage, created_item_data):
 
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage)
     
         with patch('services.advertisements.AdvertisementService.ad_repo', mock_ad_repo):
             mock_ad_storage.select_many.return_value = [created_item_data]
@@ -190,7 +207,7 @@ class TestAdAPIUnit:
     
     def test_get_by_item_id_unit(self, app_client_with_mocks, mock_ad_storage, mock_seller_storage, created_item_data):
 
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage)
         with patch('services.advertisements.AdvertisementService.ad_repo', mock_ad_repo):
             mock_ad_storage.select_by_item_id.return_value = created_item_data
             
@@ -201,7 +218,7 @@ class TestAdAPIUnit:
     
     def test_get_by_seller_id_unit(self, app_client_with_mocks, mock_ad_storage, mock_seller_storage,
                                   created_item_data, logged_seller_data):
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage)
         with patch('services.advertisements.AdvertisementService.ad_repo', mock_ad_repo):
             mock_ad_storage.select_by_seller_id.return_value = [created_item_data]
             
@@ -215,12 +232,12 @@ class TestAdAPIUnit:
                                    mock_ad_storage, mock_seller_storage):
         closed_item = {
             **created_item_data,
-            'is_closed': True
+            'is_closed': True,
+            'moderation_ids': []
         }
 
         mock_moderation_repo = AsyncMock()
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage, 
-                                    moderation_repo=mock_moderation_repo)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, moderation_repo=mock_moderation_repo)
         
         with patch('services.advertisements.AdvertisementService.ad_repo', mock_ad_repo):
             mock_ad_storage.update.return_value = closed_item
@@ -234,15 +251,14 @@ class TestAdAPIUnit:
             assert response_data['item_id'] == created_item_data['item_id']
             assert response_data['is_closed'] == True
             
-            mock_ad_storage.update.assert_called_once()
-            mock_moderation_repo.delete_all_by_item_id.assert_called_once()
+            mock_ad_storage.update.assert_called_once_with(created_item_data['item_id'], drop_pending=True, is_closed=True)
+            mock_moderation_repo.evict_cached.assert_called_once_with(created_item_data['item_id'], [])
     
     def test_close_ad_not_found_unit(self, app_client_with_mocks, 
                                      logged_seller_data: dict, mock_ad_storage, mock_seller_storage):
         
         mock_moderation_repo = AsyncMock()
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage, 
-                                    moderation_repo=mock_moderation_repo)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, moderation_repo=mock_moderation_repo)
         non_existent_id = 99999
         mock_ad_storage.update.side_effect = AdNotFoundError()
         
@@ -255,4 +271,118 @@ class TestAdAPIUnit:
             assert response.status_code == HTTPStatus.NOT_FOUND
             assert f'Item {non_existent_id} is not found' in response.json()['detail']
             
-            mock_ad_storage.update.assert_called_once()
\ No newline at end of file
+            mock_ad_storage.update.assert_called_once()
+
+
+class TestAdBulkImportUnit:
+
+    def test_bulk_create_ndjson_unit(self, app_client_with_mocks, item_data,
+                                     logged_seller_data, mock_ad_storage, mock_seller_storage):
+        seller_id = logged_seller_data['seller_id']
+        rows = [
+            item_data,
+            {**item_data, 'seller_id': 777},
+            {**item_data, 'category': 1000},
+            {**item_data, 'images_qty': 2},
+        ]
+        body = '\n'.join(json.dumps(row) for row in rows) + '\nnot a json\n'
+
+        # Продавец 777 существует, но загрузить за него объявление нельзя
+        mock_ad_storage.select_existing_seller_ids.return_value = {seller_id, 777}
+        mock_ad_storage.copy_many.return_value = [10, 11]
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage)
+
+        with patch('routers.ads.ad_import_service', AdImportService(ad_repo=mock_ad_repo)):
+            response = app_client_with_mocks.post(
+                '/ads/bulk',
+                content=body,
+                headers={'content-type': 'application/x-ndjson'},
+                cookies={'x-user-id': str(seller_id)}
+            )
+
+        assert response.status_code == HTTPStatus.OK
+        result = response.json()
+        assert result['accepted'] == 2
+        assert result['item_ids'] == [10, 11]
+        assert [reject['row'] for reject in result['rejected']] == [2, 3, 5]
+        assert 'seller_id 777 does not match' in result['rejected'][0]['error']
+
+        mock_ad_storage.select_existing_seller_ids.assert_called_once()
+        copied_rows = mock_ad_storage.copy_many.call_args[0][0]
+        assert [row['seller_id'] for row in copied_rows] == [seller_id, seller_id]
+
+    def test_bulk_create_csv_with_moderation_unit(self, app_client_with_mocks, logged_seller_data,
+                                                  mock_ad_storage, mock_seller_storage):
+        seller_id = logged_seller_data['seller_id']
+        body = 'name,description,category,images_qty\nТовар,Описание,1,2\n"Товар, 2",,3,0\n'
+
+        mock_ad_storage.select_existing_seller_ids.return_value = {seller_id}
+        mock_ad_storage.copy_many.return_value = [21, 22]
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage)
+
+        mock_mod_service = AsyncMock()
+        mock_mod_service.submit_many.return_value = [
+            AsyncMock(id=1, item_id=21), AsyncMock(id=2, item_id=22)
+        ]
+
+        service = AdImportService(ad_repo=mock_ad_repo, mod_service=mock_mod_service)
+        with patch('routers.ads.ad_import_service', service):
+            response = app_client_with_mocks.post(
+                '/ads/bulk?enqueue_moderation=true',
+                content=body,
+                headers={'content-type': 'text/csv'},
+                cookies={'x-user-id': str(seller_id)}
+            )
+
+        assert response.status_code == HTTPStatus.OK
+        result = response.json()
+        assert result['item_ids'] == [21, 22]
+        assert result['task_ids'] == [1, 2]
+        assert result['rejected'] == []
+
+        copied_rows = mock_ad_storage.copy_many.call_args[0][0]
+        assert copied_rows[1]['name'] == 'Товар, 2'
+        assert copied_rows[1]['description'] == ''
+        mock_mod_service.submit_many.assert_called_once_with([21, 22])
+
+    def test_bulk_create_rejects_invalid_utf8_row_unit(self, app_client_with_mocks, item_data,
+                                                      logged_seller_data, mock_ad_storage):
+        seller_id = logged_seller_data['seller_id']
+        good = json.dumps(item_data).encode('utf-8')
+        body = good + b'\n{"name": "\xff"}\r\n' + good
+
+        # Продавец 777 существует, но загрузить за него объявление нельзя
+        mock_ad_storage.select_existing_seller_ids.return_value = {seller_id, 777}
+        mock_ad_storage.copy_many.return_value = [10, 11]
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage)
+
+        with patch('routers.ads.ad_import_service', AdImportService(ad_repo=mock_ad_repo)):
+            response = app_client_with_mocks.post(
+                '/ads/bulk',
+                content=body,
+                headers={'content-type': 'application/x-ndjson'},
+                cookies={'x-user-id': str(seller_id)}
+            )
+
+        assert response.status_code == HTTPStatus.OK
+        result = response.json()
+        assert result['accepted'] == 2
+        assert [reject['row'] for reject in result['rejected']] == [2]
+        assert 'utf-8' in result['rejected'][0]['error']
+
+    async def test_aiter_lines_joins_lines_split_across_chunks(self):
+        async def chunks():
+            for chunk in (b'ab', b'c\r\nd', b'', b'e\nf', b'g'):
+                yield chunk
+
+        assert [line async for line in aiter_lines(chunks())] == [b'abc', b'de', b'fg']
+
+    def test_bulk_create_unsupported_format_unit(self, app_client_with_mocks, logged_seller_data):
+        response = app_client_with_mocks.post(
+            '/ads/bulk',
+            content='<xml/>',
+            headers={'content-type': 'application/xml'},
+            cookies={'x-user-id': str(logged_seller_data['seller_id'])}
+        )
+
+        assert response.status_code == HTTPStatus.UNSUPPORTED_MEDIA_TYPE
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import pytest
+from benchmarks.micro import BENCHMARKS, measure, select
+from benchmarks.http_load import flatten, percentile, summarize
+from benchmarks.standins import FakeRedis, InMemoryBroker, InMemoryDatabase
+from errors import AdNotFoundError, SellerNotFoundError
+
+
+class TestBenchmarkStandinsUnit:
+
+    async def test_prediction_row_matches_join(self):
+        db = InMemoryDatabase()
+        seller = await db.create_seller("bench", "bench@example.com", "pw", True)
+        ad = await db.create_ad(seller["seller_id"], "name", None, 3, 2)
+
+        row = await db.select_ad_for_prediction(ad["item_id"])
+
+        assert row["is_verified_seller"] is True
+        assert row["description"] == ""
+
+        await db.update_ad(ad["item_id"], is_closed=True)
+        with pytest.raises(AdNotFoundError):
+            await db.select_ad_for_prediction(ad["item_id"])
+        assert db.round_trips == 5
+
+    async def test_latest_moderation_prefers_pending(self):
+        db = InMemoryDatabase()
+        completed = await db.create_moderation(1, "completed", False, 0.1, None)
+        await db.update_moderation(completed["id"], processed_at=completed["created_at"])
+        pending = await db.create_moderation(1, "pending", None, None, None)
+
+        assert (await db.select_latest_moderation(1))["id"] == pending["id"]
+        assert await db.select_latest_moderation(2) is None
+
+    async def test_submit_for_prediction_returns_existing_or_new_task(self):
+        db = InMemoryDatabase()
+        seller = await db.create_seller("bench", "bench@example.com", "pw", True)
+        ad = await db.create_ad(seller["seller_id"], "name", "description", 3, 2)
+        closed = await db.create_ad(seller["seller_id"], "closed", "description", 3, 2)
+        await db.update_ad(closed["item_id"], is_closed=True)
+
+        pending = await db.submit_moderation_for_prediction(ad["item_id"])
+        await db.update_moderation(pending["id"], status="completed", processed_at=pending["created_at"])
+        existing = await db.submit_moderation_for_prediction(ad["item_id"])
+        with pytest.raises(AdNotFoundError):
+            await db.submit_moderation_for_prediction(closed["item_id"])
+
+        assert pending["status"] == "pending" and pending["is_verified_seller"] is True
+        assert existing["id"] == pending["id"]
+        assert len(db.moderations) == 1
+
+    async def test_delete_ad_removes_moderations(self):
+        db = InMemoryDatabase()
+        seller = await db.create_seller("bench", "bench@example.com", "pw", True)
+        ad = await db.create_ad(seller["seller_id"], "name", "description", 3, 2)
+        first = await db.create_moderation(ad["item_id"], "completed", False, 0.1, None)
+        updated = await db.update_ad(ad["item_id"], description="changed")
+        second = await db.create_moderation(ad["item_id"], "completed", False, 0.1, None)
+
+        deleted = await db.delete_ad(ad["item_id"])
+
+        assert updated["moderation_ids"] == [first["id"]]
+        assert deleted["moderation_ids"] == [second["id"]]
+        assert db.moderations == {}
+        with pytest.raises(SellerNotFoundError):
+            await db.create_ad(seller["seller_id"] + 1, "name", "description", 3, 2)
+
+    async def test_update_ad_keeps_pending_moderation(self):
+        db = InMemoryDatabase()
+        seller = await db.create_seller("bench", "bench@example.com", "pw", True)
+        ad = await db.create_ad(seller["seller_id"], "name", "description", 3, 2)
+        pending = await db.submit_moderation_with_outbox(ad["item_id"], None)
+
+        updated = await db.update_ad(ad["item_id"], description="changed")
+        closed = await db.update_ad(ad["item_id"], drop_pending=True, is_closed=True)
+
+        assert updated["moderation_ids"] == []
+        assert closed["moderation_ids"] == [pending["id"]]
+        assert db.moderations == {} and db.outbox == {}
+
+    async def test_fake_redis_pipeline(self):
+        redis = FakeRedis()
+        pipeline = redis.pipeline()
+        pipeline.set(name="task:1", value=json.dumps({"id": 1}))
+        pipeline.expire("task:1", 60)
+
+        assert await pipeline.execute() == [True, True]
+        assert await redis.get("task:1") == b'{"id": 1}'
+        assert await redis.delete("task:1") == 1
+        assert await redis.get("task:1") is None
+        assert redis.round_trips == 4
+
+    async def test_producer_serializes_like_aiokafka(self):
+        broker = InMemoryBroker()
+        producer = broker.producer_factory()(bootstrap_servers="unused",
+                                             value_serializer=lambda v: json.dumps(v).encode(),
+                                             key_serializer=lambda k: str(k).encode())
+        await producer.start()
+
+        await producer.send_and_wait("moderation", value={"item_id": 1}, key=1)
+        record = await (await producer.send("moderation", value={"item_id": 2}, key=2))
+
+        assert record.offset == 1
+        assert [r.value for r in broker.topics["moderation"]] == [b'{"item_id": 1}', b'{"item_id": 2}']
+        assert broker.topics["moderation"][0].key == b"1"
+
+
+    async def test_consumer_commits_group_position(self):
+        broker = InMemoryBroker()
+        for i in range(3):
+            broker.append("moderation", None, json.dumps({"item_id": i}).encode())
+
+        consumer = broker.consumer_factory()("moderation", group_id="workers",
+                                             value_deserializer=lambda x: json.loads(x.decode()))
+        await consumer.start()
+        first = await consumer.getone()
+        await consumer.commit()
+        [partition] = consumer.assignment()
+        consumer.pause(partition)
+        assert await consumer.getmany(timeout_ms=1) == {}
+        consumer.resume(partition)
+        rest = await consumer.getmany(timeout_ms=1, max_records=10)
+        await consumer.stop()
+
+        assert first.value == {"item_id": 0}
+        assert [record.offset for record in rest[partition]] == [1, 2]
+        assert broker.committed["workers", "moderation"] == 1
+
+        restarted = broker.consumer_factory()("moderation", group_id="workers")
+        await restarted.start()
+        assert (await restarted.getone()).offset == 1
+
+
+class TestHttpLoadReportUnit:
+
+    def test_percentile_nearest_rank(self):
+        values = [i / 1000 for i in range(1, 101)]
+
+        assert percentile(values, 50) == 0.05
+        assert percentile(values, 99) == 0.099
+        assert percentile([], 99) == 0.0
+
+    def test_summary_counts_errors_in_rps(self):
+        summary = summarize([0.001, 0.002, 0.003], errors=1, elapsed=2.0)
+
+        assert summary["requests"] == 4
+        assert summary["rps"] == 2.0
+        assert summary["p50_ms"] == pytest.approx(2.0)
+
+    def test_flatten_for_baseline(self):
+        flat = flatten({"predict": summarize([0.01], 0, 1.0)})
+
+        assert set(flat) == {"predict.rps", "predict.p50_ms", "predict.p95_ms", "predict.p99_ms"}
+
+
+class TestMicroBenchmarksUnit:
+
+    def test_measure_sync_and_async(self):
+        async def coroutine():
+            return None
+
+        loop = asyncio.new_event_loop()
+        try:
+            for fn in (lambda: None, coroutine):
+                result = measure(fn, repeat=2, min_time=0.001, loop=loop)
+                assert result["number"] >= 1
+                assert 0 < result["best_us"] <= result["median_us"]
+        finally:
+            loop.close()
+
+    def test_select_by_substring(self):
+        assert select([]) == list(BENCHMARKS)
+        assert select(["redis_codec"]) == ["redis_codec.encode", "redis_codec.decode"]
+
+    def test_codec_and_model_benchmarks_run(self):
+        for name in select(["redis_codec", "models.", "build_features"]):
+            BENCHMARKS[name]()()
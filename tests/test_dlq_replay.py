@@ -0,0 +1,107 @@
+import json
+import re
+from datetime import datetime, timezone
+from benchmarks.standins import InMemoryBroker
+from clients import moderation_codec
+from kafka_settings import DLQ_TOPIC, TOPIC
+from workers import dlq_replay
+from workers.dlq_replay import DlqReplayer, ReplayFilter, build_replay_message, parse_time
+
+
+def dlq_message(item_id, error="Ad not found", timestamp="2026-02-11T10:00:00+00:00"):
+    return {
+        "original": {"item_id": item_id, "task_id": item_id * 10, "retry_count": 3, "last_retry": "2026-02-11T09:59:00",
+                     "timestamp": "2026-02-11T09:58:00+00:00", "metadata": {"source": "advertisement_service"}},
+        "error": error,
+        "timestamp": timestamp,
+        "retry_count": 3,
+    }
+
+
+def make_broker(monkeypatch, messages):
+    broker = InMemoryBroker()
+    for message in messages:
+        broker.append(DLQ_TOPIC, b"", json.dumps(message).encode("utf-8"))
+    monkeypatch.setattr(dlq_replay, "AIOKafkaConsumer", broker.consumer_factory())
+    monkeypatch.setattr(dlq_replay, "AIOKafkaProducer", broker.producer_factory())
+    return broker
+
+
+def replayed(broker):
+    return [moderation_codec.decode(record.value, record.headers) for record in broker.topics[TOPIC]]
+
+
+class TestDlqReplayUnit:
+
+    def test_filter(self):
+        replay_filter = ReplayFilter(
+            error=re.compile("not found"),
+            since=parse_time("2026-02-11T00:00:00"),
+            until=parse_time("2026-02-12T00:00:00"),
+            item_ids={1, 2},
+        )
+
+        assert replay_filter.rejects(dlq_message(1)) is None
+        assert replay_filter.rejects(dlq_message(1, error="Exceeded maximum retry attempts")) == "error"
+        assert replay_filter.rejects(dlq_message(1, timestamp="2026-02-12T00:00:00+00:00")) == "time"
+        assert replay_filter.rejects(dlq_message(1, timestamp="2026-02-11T02:00:00+03:00")) == "time"
+        assert replay_filter.rejects(dlq_message(3)) == "item_id"
+        assert replay_filter.rejects({"error": "x"}) == "malformed"
+
+    def test_build_replay_message_resets_retries(self):
+        message = build_replay_message(dlq_message(1))
+
+        assert message["item_id"] == 1 and message["task_id"] == 10
+        assert message["retry_count"] == 0
+        assert "last_retry" not in message
+        assert message["timestamp_ms"] > datetime(2026, 2, 11, tzinfo=timezone.utc).timestamp() * 1000
+
+    async def test_dry_run_neither_sends_nor_checkpoints(self, monkeypatch):
+        broker = make_broker(monkeypatch, [dlq_message(1), dlq_message(2, error="boom")])
+
+        summary = await DlqReplayer(ReplayFilter(error=re.compile("not found")), rate=0, dry_run=True,
+                                    idle_timeout=0.01).run()
+
+        assert summary["scanned"] == 2 and summary["replayed"] == 1
+        assert summary["skipped"] == {"error": 1}
+        assert replayed(broker) == []
+        assert broker.committed == {}
+
+    async def test_replay_checkpoints_progress(self, monkeypatch):
+        broker = make_broker(monkeypatch, [dlq_message(item_id) for item_id in range(1, 6)])
+
+        first = await DlqReplayer(ReplayFilter(), rate=0, batch_size=2, idle_timeout=0.01, max_messages=3).run()
+        second = await DlqReplayer(ReplayFilter(), rate=0, batch_size=2, idle_timeout=0.01).run()
+        third = await DlqReplayer(ReplayFilter(), rate=0, idle_timeout=0.01).run()
+
+        assert (first["replayed"], second["replayed"], third["replayed"]) == (3, 2, 0)
+        assert [message["item_id"] for message in replayed(broker)] == [1, 2, 3, 4, 5]
+        assert all(message["retry_count"] == 0 for message in replayed(broker))
+        assert [record.key for record in broker.topics[TOPIC]][0] == b"1"
+
+    async def test_garbage_record_is_skipped_and_checkpointed(self, monkeypatch):
+        broker = make_broker(monkeypatch, [dlq_message(1)])
+        for garbage in (b"\xff not json", b"[1, 2]"):
+            broker.append(DLQ_TOPIC, b"", garbage)
+        broker.append(DLQ_TOPIC, b"", json.dumps(dlq_message(2)).encode("utf-8"))
+
+        first = await DlqReplayer(ReplayFilter(), rate=0, idle_timeout=0.01).run()
+        second = await DlqReplayer(ReplayFilter(), rate=0, idle_timeout=0.01).run()
+
+        assert first["scanned"] == 4 and first["replayed"] == 2
+        assert first["skipped"] == {"malformed": 2}
+        assert second["scanned"] == 0
+        assert [message["item_id"] for message in replayed(broker)] == [1, 2]
+
+    async def test_rate_limit(self, monkeypatch):
+        broker = make_broker(monkeypatch, [dlq_message(item_id) for item_id in range(1, 5)])
+        sleeps = []
+
+        async def fake_sleep(delay):
+            sleeps.append(delay)
+
+        monkeypatch.setattr(dlq_replay.asyncio, "sleep", fake_sleep)
+        await DlqReplayer(ReplayFilter(), rate=10, idle_timeout=0.01).run()
+
+        assert len(replayed(broker)) == 4
+        assert len(sleeps) == 3 and sum(sleeps) > 0.2
@@ -0,0 +1,87 @@
+import asyncio
+import numpy as np
+import pytest
+from unittest.mock import Mock, PropertyMock, patch
+from model import model_singleton, CANARY_FEATURES
+from model import ModelSingleton
+from inference import InferenceExecutor, _init_child
+from errors import InferenceQueueFullError
+
+
+@pytest.mark.asyncio
+class TestInferenceExecutorUnit:
+
+    async def test_thread_mode_matches_inline(self):
+        model, version = model_singleton.snapshot()
+        inline = InferenceExecutor(mode="inline")
+        threaded = InferenceExecutor(mode="thread", workers=2, max_queue=8)
+
+        try:
+            expected = await inline.run(model, version, CANARY_FEATURES)
+            actual = await threaded.run(model, version, CANARY_FEATURES)
+        finally:
+            threaded.shutdown()
+
+        np.testing.assert_array_equal(actual[0], expected[0])
+        np.testing.assert_allclose(actual[1], expected[1])
+
+        stats = threaded.snapshot()
+        assert stats["completed"] == 1
+        assert stats["pending"] == 0
+        assert stats["queue_wait_seconds_total"] >= 0
+
+    async def test_queue_limit_rejects_overflow(self):
+        release = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        slow_model = Mock()
+        slow_model.predict.side_effect = lambda X: asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+        slow_model.predict_proba.return_value = np.array([[0.5, 0.5]])
+
+        executor = InferenceExecutor(mode="thread", workers=1, max_queue=1)
+        try:
+            first = asyncio.create_task(executor.run(slow_model, None, CANARY_FEATURES[:1]))
+            await asyncio.sleep(0)
+
+            with pytest.raises(InferenceQueueFullError):
+                await executor.run(slow_model, None, CANARY_FEATURES[:1])
+
+            release.set()
+            await first
+        finally:
+            executor.shutdown()
+
+        assert executor.stats.rejected == 1
+        assert executor.stats.completed == 1
+
+    async def test_child_loads_parent_version_without_registering(self, monkeypatch):
+        monkeypatch.setenv("REGISTER_MLFLOW", "true")
+        model, version = model_singleton.snapshot()
+
+        with patch.object(model_singleton, "_register_model_in_mlflow") as register, \
+             patch.object(model_singleton, "load_version", return_value=model) as load_version, \
+             patch.object(model_singleton, "swap") as swap:
+            _init_child("7")
+        load_version.assert_called_once_with("7")
+        swap.assert_called_once_with(model, "7")
+
+        with patch.object(ModelSingleton, "is_loaded", new_callable=PropertyMock, return_value=False), \
+             patch.object(model_singleton, "_register_model_in_mlflow") as register_on_load, \
+             patch.object(model_singleton, "_load_model", return_value=(model, version)), \
+             patch.object(model_singleton, "swap"):
+            _init_child(None)
+
+        register.assert_not_called()
+        register_on_load.assert_not_called()
+
+    async def test_process_pool_passes_active_version(self):
+        executor = InferenceExecutor(mode="process", workers=1)
+
+        with patch("inference.ProcessPoolExecutor") as pool:
+            executor._get_pool()
+
+        assert pool.call_args.kwargs["initargs"] == (model_singleton.version,)
+
+    async def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            InferenceExecutor(mode="gpu")
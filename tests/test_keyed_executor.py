@@ -0,0 +1,105 @@
+import asyncio
+from workers.keyed_executor import KeyedExecutor
+
+
+class TestKeyedExecutorUnit:
+
+    async def test_same_key_runs_in_order_and_keys_run_in_parallel(self):
+        executor = KeyedExecutor(max_concurrency=4, max_backlog_per_key=10)
+        running, peak, log = set(), [0], []
+
+        def job(key, n):
+            async def run():
+                running.add(key)
+                peak[0] = max(peak[0], len(running))
+                await asyncio.sleep(0.01)
+                log.append((key, n))
+                running.discard(key)
+            return run
+
+        for n in range(3):
+            for key in ("a", "b"):
+                await executor.submit(key, job(key, n))
+        assert await executor.join(1)
+
+        assert [n for key, n in log if key == "a"] == [0, 1, 2]
+        assert [n for key, n in log if key == "b"] == [0, 1, 2]
+        assert peak[0] == 2
+        assert executor.snapshot()["contended"] == 4
+        assert executor.snapshot()["active_keys"] == 0
+
+    async def test_concurrency_limit(self):
+        executor = KeyedExecutor(max_concurrency=2, max_backlog_per_key=10)
+        in_flight, peak = [0], [0]
+
+        async def job():
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.01)
+            in_flight[0] -= 1
+
+        for key in range(6):
+            await executor.submit(key, job)
+        assert await executor.join(1)
+
+        assert peak[0] == 2
+
+    async def test_submit_waits_when_key_backlog_is_full(self):
+        executor = KeyedExecutor(max_concurrency=0, max_backlog_per_key=1)
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+
+        await executor.submit("a", blocked)
+        await asyncio.sleep(0)
+        await executor.submit("a", blocked)
+
+        third = asyncio.create_task(executor.submit("a", blocked))
+        await asyncio.sleep(0.01)
+        assert not third.done()
+        await executor.submit("b", blocked)
+
+        release.set()
+        await asyncio.wait_for(third, 1)
+        assert await executor.join(1)
+        assert executor.snapshot()["submit_waits"] == 1
+
+    async def test_released_frees_slot_but_keeps_key(self):
+        executor = KeyedExecutor(max_concurrency=1, max_backlog_per_key=10)
+        log = []
+
+        async def backoff():
+            async with executor.released():
+                await asyncio.sleep(0.02)
+            log.append("a1")
+
+        async def follower():
+            log.append("a2")
+
+        async def other():
+            log.append("b")
+
+        await executor.submit("a", backoff)
+        await executor.submit("a", follower)
+        await executor.submit("b", other)
+        assert await executor.join(1)
+
+        assert log == ["b", "a1", "a2"]
+
+    async def test_failed_job_does_not_block_key(self):
+        executor = KeyedExecutor(max_concurrency=2, max_backlog_per_key=10)
+        done = []
+
+        async def failing():
+            raise ValueError("boom")
+
+        async def succeeding():
+            done.append(True)
+
+        await executor.submit("a", failing)
+        await executor.submit("a", succeeding)
+        assert await executor.join(1)
+
+        assert done == [True]
+        assert executor.snapshot()["pending"] == 0
@@ -0,0 +1,61 @@
+import os
+import socket
+from unittest.mock import Mock, patch
+from launcher import Launcher, bind_socket, event_loop_impl, http_impl, memory_usage
+from model import model_singleton
+
+
+class TestLauncherUnit:
+
+    def test_memory_usage_of_current_process(self):
+        usage = memory_usage(os.getpid())
+
+        assert set(usage) == {"rss_kb", "pss_kb", "shared_kb", "private_kb"}
+        assert usage["rss_kb"] > 0
+        assert usage["pss_kb"] <= usage["rss_kb"]
+
+    def test_memory_usage_of_missing_process(self):
+        assert memory_usage(2 ** 22 + 1) == {}
+
+    def test_server_implementations(self):
+        assert event_loop_impl() in ("uvloop", "asyncio")
+        assert http_impl() in ("httptools", "h11")
+
+    def test_sockets_share_port(self):
+        first = bind_socket("127.0.0.1", 0)
+        second = None
+        try:
+            port = first.getsockname()[1]
+            second = bind_socket("127.0.0.1", port)
+            assert second.getsockname()[1] == port
+            assert second.getsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT) == 1
+        finally:
+            first.close()
+            if second is not None:
+                second.close()
+
+    def test_master_restarts_workers_on_new_model_version(self):
+        launcher = Launcher("127.0.0.1", 0, workers=1)
+        new_model = Mock()
+
+        with patch.object(model_singleton, "resolve_source_version", return_value="v-next"), \
+             patch.object(model_singleton, "load_version", return_value=new_model), \
+             patch.object(model_singleton, "swap") as swap, \
+             patch.object(launcher, "restart_workers") as restart_workers, \
+             patch("launcher.gc"):
+            assert launcher.check_model() is True
+
+        swap.assert_called_once_with(new_model, "v-next")
+        restart_workers.assert_called_once()
+
+    def test_master_skips_version_that_failed_to_load(self):
+        launcher = Launcher("127.0.0.1", 0, workers=1)
+
+        with patch.object(model_singleton, "resolve_source_version", return_value="v-broken"), \
+             patch.object(model_singleton, "load_version", side_effect=ValueError("bad canary")) as load_version, \
+             patch.object(launcher, "restart_workers") as restart_workers:
+            assert launcher.check_model() is False
+            assert launcher.check_model() is False
+
+        load_version.assert_called_once_with("v-broken")
+        restart_workers.assert_not_called()
@@ -0,0 +1,89 @@
+import io
+import json
+import logging
+import pytest
+from logging_setup import (
+    JsonFormatter,
+    PayloadLimitFilter,
+    SamplingFilter,
+    parse_sampling,
+    setup_logging,
+    shutdown_logging,
+)
+
+
+def make_record(name="routers.predict", level=logging.INFO, msg="message %s", args=("arg",), **extra):
+    record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+@pytest.fixture
+def log_stream():
+    root = logging.getLogger()
+    level = root.level
+    stream = io.StringIO()
+    yield stream
+    shutdown_logging()
+    root.setLevel(level)
+
+
+class TestLoggingSetupUnit:
+
+    def test_parse_sampling(self):
+        assert parse_sampling("predict.request=0.01, workers=2,broken") == {"predict.request": 0.01, "workers": 1.0}
+
+    def test_sampling_by_event_route_and_logger_prefix(self):
+        sampling = SamplingFilter({"predict.result": 0.0, "/simple_predict/{item_id}": 0.0, "workers": 0.0})
+
+        assert not sampling.filter(make_record(event="predict.result"))
+        assert not sampling.filter(make_record(route="/simple_predict/{item_id}"))
+        assert not sampling.filter(make_record(name="workers.moderation_worker"))
+        assert sampling.filter(make_record(name="routers.ads"))
+
+    def test_sampling_never_drops_warnings(self):
+        sampling = SamplingFilter({"workers": 0.0})
+
+        assert sampling.filter(make_record(name="workers.moderation_worker", level=logging.WARNING))
+
+    def test_payload_limit(self):
+        record = make_record(args=("x" * 100,), description="y" * 100)
+
+        PayloadLimitFilter(10).filter(record)
+
+        assert record.getMessage() == "message xxxxxxxxxx...(+90)"
+        assert record.description == "yyyyyyyyyy...(+90)"
+
+    def test_json_formatter_includes_extra(self):
+        payload = json.loads(JsonFormatter().format(make_record(event="predict.result", item_id=42)))
+
+        assert payload["message"] == "message arg"
+        assert payload["event"] == "predict.result"
+        assert payload["item_id"] == 42
+        assert payload["logger"] == "routers.predict"
+
+    def test_queue_mode_writes_from_listener(self, log_stream):
+        setup_logging(level="INFO", mode="queue", fmt="text", sampling="", max_payload=0, stream=log_stream)
+
+        logging.getLogger("routers.predict").info("Ad moderation for item %s", 42)
+        shutdown_logging()
+
+        assert "routers.predict - INFO - Ad moderation for item 42" in log_stream.getvalue()
+
+    def test_sync_mode_applies_sampling(self, log_stream):
+        setup_logging(level="INFO", mode="sync", fmt="json", sampling="noisy=0", max_payload=0, stream=log_stream)
+
+        logging.getLogger("noisy").info("dropped")
+        logging.getLogger("noisy").warning("kept")
+
+        lines = [json.loads(line) for line in log_stream.getvalue().splitlines()]
+        assert [line["message"] for line in lines] == ["kept"]
+
+    def test_payload_limit_caps_preformatted_message(self, log_stream):
+        setup_logging(level="INFO", mode="sync", fmt="json", sampling="", max_payload=10, stream=log_stream)
+
+        logging.getLogger("routers.predict").info(f"Batch failed: {'x' * 100}")
+
+        line, = [json.loads(line) for line in log_stream.getvalue().splitlines()]
+        assert line["message"] == f"Batch failed: {'x' * 26}...(+74)"
@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from dataclasses import dataclass
+from unittest.mock import AsyncMock, patch
+from prometheus_client import REGISTRY
+from metrics import DB_QUERY_DURATION, instrument_methods
+from models.ad import AdModel
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@instrument_methods(DB_QUERY_DURATION)
+@dataclass(frozen=True)
+class FakeStorage:
+
+    async def select(self, value: int) -> int:
+        return value * 2
+
+    def sync_helper(self) -> int:
+        return 1
+
+
+class TestMetricsUnit:
+
+    def test_instrument_methods_records_async_calls(self):
+        before = sample("db_query_duration_seconds_count", storage="FakeStorage", method="select")
+
+        assert asyncio.run(FakeStorage().select(21)) == 42
+
+        assert sample("db_query_duration_seconds_count", storage="FakeStorage", method="select") == before + 1
+        assert FakeStorage().sync_helper() == 1
+        assert sample("db_query_duration_seconds_count", storage="FakeStorage", method="sync_helper") == 0
+
+    def test_http_metrics_use_route_template(self, app_client_with_mocks):
+        labels = {"method": "GET", "route": "/ads/{item_id}", "status": "200"}
+        before = sample("http_requests_total", **labels)
+        ad = AdModel(item_id=1, seller_id=1, name="name", description="description", category=1, images_qty=1)
+
+        with patch('routers.ads.ad_service.get_by_item_id', new_callable=AsyncMock, return_value=ad):
+            response = app_client_with_mocks.get("/ads/1")
+
+        assert response.status_code == 200
+        assert sample("http_requests_total", **labels) == before + 1
+        assert sample("http_request_duration_seconds_count", method="GET", route="/ads/{item_id}") >= 1
+
+    def test_unmatched_routes_share_one_series(self, app_client):
+        before = sample("http_requests_total", method="GET", route="unmatched", status="404")
+
+        app_client.get("/no/such/path/1")
+        app_client.get("/no/such/path/2")
+
+        assert sample("http_requests_total", method="GET", route="unmatched", status="404") == before + 2
+
+    def test_metrics_endpoint(self, app_client):
+        response = app_client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert "http_requests_total" in response.text
+        assert "model_scoring_duration_seconds" in response.text
+
+    def test_worker_counts_message_outcomes(self, worker, sample_message_data):
+        worker.ml_service.simple_predict.return_value = (False, 0.12)
+        before = sample("worker_messages_total", outcome="processed")
+
+        assert asyncio.run(worker.process_observed(sample_message_data)) is True
+
+        assert sample("worker_messages_total", outcome="processed") == before + 1
+        assert sample("worker_tasks_in_flight") == 0
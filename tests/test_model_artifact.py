@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+from unittest.mock import patch
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+from model import model_singleton, CANARY_FEATURES
+from model_artifact import ModelArtifactCache, export_artifact, load_artifact
+
+
+@pytest.fixture
+def training_data():
+    rng = np.random.default_rng(42)
+    X = rng.random((200, 4))
+    y = ((X[:, 0] < 0.3) & (X[:, 1] < 0.2)).astype(int)
+    return X, y
+
+
+class TestModelArtifactUnit:
+
+    def test_round_trip_matches_sklearn(self, tmp_path):
+        path = str(tmp_path / "model.bin")
+
+        assert export_artifact(model_singleton._model, path, version="7") is True
+        artifact = load_artifact(path)
+
+        np.testing.assert_allclose(
+            artifact.predict_proba(CANARY_FEATURES),
+            model_singleton._model.predict_proba(CANARY_FEATURES),
+        )
+        np.testing.assert_array_equal(
+            artifact.predict(CANARY_FEATURES),
+            model_singleton._model.predict(CANARY_FEATURES),
+        )
+        assert artifact.header["version"] == "7"
+        model_singleton.validate(artifact)
+
+    def test_scaler_is_folded_into_weights(self, tmp_path, training_data):
+        X, y = training_data
+        model = Pipeline([("scaler", StandardScaler()), ("clf", LogisticRegression())]).fit(X * 10 + 3, y)
+        path = str(tmp_path / "model.bin")
+
+        assert export_artifact(model, path) is True
+        np.testing.assert_allclose(load_artifact(path).predict_proba(X * 10 + 3), model.predict_proba(X * 10 + 3))
+
+    def test_unsupported_model_is_not_exported(self, tmp_path, training_data):
+        X, y = training_data
+        path = tmp_path / "model.bin"
+
+        assert export_artifact(DecisionTreeClassifier().fit(X, y), str(path)) is False
+        assert not path.exists()
+
+    def test_cache_by_version_and_alias_pointer(self, tmp_path):
+        cache = ModelArtifactCache(str(tmp_path))
+
+        assert cache.load("moderation-model", "3") is None
+        assert cache.get_alias_version("moderation-model", "production") is None
+
+        assert cache.store("moderation-model", "3", model_singleton._model) is True
+        cache.set_alias_version("moderation-model", "production", "3")
+
+        assert cache.get_alias_version("moderation-model", "production") == "3"
+        assert cache.load("moderation-model", "3") is not None
+
+    def test_startup_resolves_alias_in_registry(self, tmp_path, monkeypatch):
+        cache = ModelArtifactCache(str(tmp_path))
+        for version in ("3", "5"):
+            cache.store("moderation-model", version, model_singleton._model)
+        cache.set_alias_version("moderation-model", "production", "3")
+        monkeypatch.setenv("USE_MLFLOW", "true")
+
+        with patch("model.model_artifact_cache", cache), \
+             patch.object(model_singleton, "_resolve_mlflow_version", return_value="5"):
+            _, version = model_singleton._load_model()
+
+        assert version == "5"
+        assert cache.get_alias_version("moderation-model", "production") == "5"
+
+    def test_startup_uses_cached_pointer_when_registry_is_down(self, tmp_path, monkeypatch):
+        cache = ModelArtifactCache(str(tmp_path))
+        cache.store("moderation-model", "3", model_singleton._model)
+        cache.set_alias_version("moderation-model", "production", "3")
+        monkeypatch.setenv("USE_MLFLOW", "true")
+
+        with patch("model.model_artifact_cache", cache), \
+             patch.object(model_singleton, "_resolve_mlflow_version", side_effect=ConnectionError("down")):
+            _, version = model_singleton._load_model()
+
+        assert version == "3"
+
+    def test_broken_cached_artifact_is_ignored(self, tmp_path):
+        cache = ModelArtifactCache(str(tmp_path))
+        with open(cache.artifact_path("moderation-model", "4"), "wb") as f:
+            f.write(b"not an artifact")
+
+        assert cache.load("moderation-model", "4") is None
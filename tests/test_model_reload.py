@@ -0,0 +1,111 @@
+import pytest
+from unittest.mock import Mock, patch
+from model import model_singleton, CANARY_FEATURES
+from model_watcher import ModelWatcher
+from services.predictions import PredictionService
+from errors import ModelNotLoadedError
+import profiling
+
+
+@pytest.fixture
+def restore_model_singleton():
+    state = (model_singleton._model, model_singleton._version,
+             model_singleton._previous_model, model_singleton._previous_version)
+    yield model_singleton
+    (model_singleton._model, model_singleton._version,
+     model_singleton._previous_model, model_singleton._previous_version) = state
+
+
+@pytest.mark.asyncio
+class TestModelReloadUnit:
+
+    async def test_swap_and_rollback(self, restore_model_singleton):
+        old_model, old_version = model_singleton.snapshot()
+        new_model = Mock()
+
+        model_singleton.swap(new_model, "new")
+
+        assert model_singleton.snapshot() == (new_model, "new")
+        assert model_singleton.previous_version == old_version
+
+        assert model_singleton.rollback() == old_version
+        assert model_singleton.snapshot() == (old_model, old_version)
+        assert model_singleton.previous_version == "new"
+
+    async def test_validate_rejects_broken_model(self, restore_model_singleton):
+        broken_model = Mock()
+        broken_model.predict_proba.return_value = [[float("nan"), 1.0]] * len(CANARY_FEATURES)
+
+        with pytest.raises(ValueError):
+            model_singleton.validate(broken_model)
+
+        model_singleton.validate(model_singleton._model)
+
+    async def test_watcher_swaps_on_new_version(self, restore_model_singleton):
+        new_model = Mock()
+        watcher = ModelWatcher(model_singleton, interval=0)
+
+        with patch.object(model_singleton, 'resolve_source_version', return_value="v-next"), \
+             patch.object(model_singleton, 'load_version', return_value=new_model) as load_version:
+            assert await watcher.check() is True
+            assert await watcher.check() is False
+
+        load_version.assert_called_once_with("v-next")
+        assert model_singleton.snapshot() == (new_model, "v-next")
+
+    async def test_watcher_keeps_active_model_when_validation_fails(self, restore_model_singleton):
+        active = model_singleton.snapshot()
+        watcher = ModelWatcher(model_singleton, interval=0)
+
+        with patch.object(model_singleton, 'resolve_source_version', return_value="v-broken"), \
+             patch.object(model_singleton, 'load_version', side_effect=ValueError("bad canary")) as load_version:
+            with pytest.raises(ValueError):
+                await watcher.check()
+            assert await watcher.check() is False
+
+        load_version.assert_called_once()
+        assert model_singleton.snapshot() == active
+
+    async def test_watcher_does_not_undo_rollback(self, restore_model_singleton):
+        old_model, old_version = model_singleton.snapshot()
+        watcher = ModelWatcher(model_singleton, interval=0)
+
+        with patch.object(model_singleton, 'resolve_source_version', return_value="v-bad"), \
+             patch.object(model_singleton, 'load_version', return_value=Mock()) as load_version:
+            assert await watcher.check() is True
+            assert watcher.rollback() == old_version
+            assert await watcher.check() is False
+
+        load_version.assert_called_once_with("v-bad")
+        assert model_singleton.snapshot() == (old_model, old_version)
+
+        fixed_model = Mock()
+        with patch.object(model_singleton, 'resolve_source_version', return_value="v-fixed"), \
+             patch.object(model_singleton, 'load_version', return_value=fixed_model):
+            assert await watcher.check() is True
+        assert model_singleton.snapshot() == (fixed_model, "v-fixed")
+
+    async def test_score_reports_active_version(self, restore_model_singleton):
+        model_singleton.swap(model_singleton._model, "v-test")
+
+        _, probability, version = await PredictionService().score(1, True, 1, "name", "description", 5, 3)
+
+        assert version == "v-test"
+        assert 0 <= probability <= 1
+
+        with patch.object(model_singleton, '_model', None):
+            with pytest.raises(ModelNotLoadedError):
+                await PredictionService().score(1, True, 1, "name", "description", 5, 3)
+
+
+class TestModelRollbackEndpointUnit:
+
+    def test_rollback_requires_debug_token(self, app_client, restore_model_singleton):
+        active = model_singleton.snapshot()
+        with patch.object(profiling, "DEBUG_TOKEN", None):
+            assert app_client.post("/health/model/rollback").status_code == 404
+        with patch.object(profiling, "DEBUG_TOKEN", "secret"):
+            response = app_client.post("/health/model/rollback", headers={"X-Debug-Token": "wrong"})
+            assert response.status_code == 403
+
+        assert model_singleton.snapshot() == active
@@ -1,7 +1,8 @@
+import asyncpg
 import pytest
 from unittest.mock import AsyncMock, patch
 from http import HTTPStatus
-from errors import ModelNotLoadedError, ModerationNotFoundError
+from errors import ModerationNotFoundError
 from repositories.moderations import ModerationRepository
 from datetime import datetime
 from models.moderation import ModerationModel
@@ -49,10 +50,6 @@ class TestModerationAPIUnit:
     
     def test_async_predict_success_unit(self, app_client_with_mocks, created_moderation,
                                        created_item_data):
-        mock_producer = AsyncMock()
-        mock_producer.send_moderation_request.return_value = True
-
-
         mock_moderation_storage = AsyncMock()
         mock_moderation_redis_storage = AsyncMock()
         mock_moderation_repo = ModerationRepository(moderation_storage=mock_moderation_storage, 
@@ -62,11 +59,10 @@ class TestModerationAPIUnit:
         mock_moderation_service = ModerationService(moderation_repo=mock_moderation_repo)
         
         mock_moderation_redis_storage.get_latest_by_item_id.return_value = None
-        mock_moderation_storage.create.return_value = created_moderation
+        mock_moderation_storage.submit_with_outbox.return_value = created_moderation
 
         
-        with patch('routers.async_predict.kafka_producer', mock_producer), \
-             patch('routers.async_predict.mod_service', mock_moderation_service):
+        with patch('routers.async_predict.mod_service', mock_moderation_service):
             
             response = app_client_with_mocks.post(
                 f"/async_predict/{created_item_data['item_id']}",
@@ -78,15 +74,13 @@ class TestModerationAPIUnit:
             assert "task_id" in data
             assert data["status"] == "pending"
             
-            mock_producer.send_moderation_request.assert_called_once()
-            mock_moderation_storage.create.assert_called_once()
+            mock_moderation_storage.submit_with_outbox.assert_called_once_with(
+                created_item_data['item_id'], None)
+            mock_moderation_storage.create.assert_not_called()
             mock_moderation_redis_storage.get_latest_by_item_id.assert_called_once()
 
     
-    def test_async_predict_kafka_error_unit(self, app_client_with_mocks, created_item_data, created_moderation):
-        mock_producer = AsyncMock()
-        mock_producer.send_moderation_request = AsyncMock(side_effect=ModelNotLoadedError)
-        
+    def test_async_predict_ad_not_found_unit(self, app_client_with_mocks, created_item_data):
         mock_moderation_storage = AsyncMock()
         mock_moderation_redis_storage = AsyncMock()
         mock_moderation_repo = ModerationRepository(moderation_storage=mock_moderation_storage, 
@@ -96,20 +90,18 @@ class TestModerationAPIUnit:
         mock_moderation_service = ModerationService(moderation_repo=mock_moderation_repo)
         
         mock_moderation_redis_storage.get_latest_by_item_id.return_value = None
-        mock_moderation_storage.create.return_value = created_moderation
+        mock_moderation_storage.submit_with_outbox.side_effect = \
+            asyncpg.exceptions.ForeignKeyViolationError("moderation_results_item_id_fkey")
 
         
-        with patch('routers.async_predict.kafka_producer', mock_producer), \
-             patch('routers.async_predict.mod_service', mock_moderation_service):
+        with patch('routers.async_predict.mod_service', mock_moderation_service):
             
             response = app_client_with_mocks.post(
                 f"/async_predict/{created_item_data['item_id']}",
                 json={"item_id": created_item_data['item_id']}
             )
             
-            assert response.status_code == 503
-            data = response.json()
-            assert "Model" in data["detail"]
+            assert response.status_code == 404
     
     def test_moderation_result_found_unit(self, app_client_with_mocks, completed_moderation):
         
@@ -160,4 +152,44 @@ class TestModerationAPIUnit:
             assert response.status_code == 404
 
             mock_moderation_redis_storage.get_by_task_id.assert_called_once()
-            mock_moderation_storage.select_by_task_id.assert_called_once()
\ No newline at end of file
+            mock_moderation_storage.select_by_task_id.assert_called_once()
+
+    def test_moderation_lookup_unit(self, app_client_with_mocks, completed_moderation, pending_moderation):
+        mock_moderation_storage = AsyncMock()
+        mock_moderation_redis_storage = AsyncMock()
+        mock_moderation_repo = ModerationRepository(moderation_storage=mock_moderation_storage,
+                                                    moderation_redis_storage=mock_moderation_redis_storage)
+        mock_moderation_service = ModerationService(moderation_repo=mock_moderation_repo)
+
+        cached = {**completed_moderation, "id": 7, "item_id": 70}
+        from_db = {**completed_moderation, "id": 8, "item_id": 80}
+        item_pending = {**pending_moderation, "id": 9, "item_id": 90}
+        mock_moderation_redis_storage.get_many.return_value = ({7: cached}, {})
+        mock_moderation_storage.select_by_task_ids.return_value = [from_db]
+        mock_moderation_storage.select_latest_by_item_ids.return_value = [from_db, item_pending]
+
+        with patch('routers.moderation_results.mod_service', mock_moderation_service):
+            response = app_client_with_mocks.post(
+                "/moderation_results/lookup",
+                json={"task_ids": [8, 404, 7, 8], "item_ids": [90, 80]}
+            )
+
+            assert response.status_code == 200
+            data = response.json()
+            assert [task and task["task_id"] for task in data["tasks"]] == [8, None, 7, 8]
+            assert data["items"][0] is None
+            assert data["items"][1]["task_id"] == 8
+
+            mock_moderation_redis_storage.get_many.assert_called_once_with([8, 404, 7], [90, 80])
+            mock_moderation_storage.select_by_task_ids.assert_called_once_with([8, 404])
+            mock_moderation_storage.select_latest_by_item_ids.assert_called_once_with([90, 80])
+            mock_moderation_redis_storage.set_many.assert_called_once_with([from_db])
+
+    def test_moderation_lookup_too_many_ids_unit(self, app_client_with_mocks):
+        with patch('routers.moderation_results.RESULT_LOOKUP_MAX_IDS', 2):
+            response = app_client_with_mocks.post(
+                "/moderation_results/lookup",
+                json={"task_ids": [1, 2], "item_ids": [3]}
+            )
+
+        assert response.status_code == 400
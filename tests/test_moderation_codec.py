@@ -0,0 +1,87 @@
+import asyncio
+import json
+import pytest
+from benchmarks.standins import InMemoryBroker
+from clients import moderation_codec
+from errors import MessageDecodeError
+from kafka_settings import CONSUMER_GROUP, DLQ_TOPIC, TOPIC
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+class TestModerationCodecUnit:
+
+    def test_v2_round_trip_keeps_constants_in_headers(self):
+        message = moderation_codec.build_request(42, 1001, {"traceparent": TRACEPARENT}, retry_count=2)
+
+        value, headers = moderation_codec.encode(message, 2)
+        decoded = moderation_codec.decode(value, headers)
+
+        assert len(value) == 25
+        assert dict(headers)["schema-version"] == b"2"
+        assert decoded == message
+
+    def test_producers_default_to_legacy_json(self):
+        message = moderation_codec.build_request(42, 1001)
+
+        value, headers = moderation_codec.encode(message)
+
+        assert "schema-version" not in dict(headers)
+        assert json.loads(value)["task_id"] == 1001
+
+    def test_legacy_json_is_accepted(self, sample_message_data):
+        value = json.dumps(sample_message_data).encode("utf-8")
+
+        decoded = moderation_codec.decode(value, [("traceparent", TRACEPARENT.encode())])
+
+        assert decoded == sample_message_data
+        assert moderation_codec.sent_at_ms(decoded) == 1770848107276
+
+    def test_v1_encoding_matches_legacy_format(self):
+        message = moderation_codec.build_request(42, 1001)
+
+        value, headers = moderation_codec.encode(message, 1)
+        legacy = json.loads(value)
+
+        assert headers == []
+        assert "timestamp_ms" not in legacy
+        assert moderation_codec.sent_at_ms(legacy) == message["timestamp_ms"]
+        assert legacy["metadata"] == {"source": "advertisement_service", "version": "1.0"}
+
+    @pytest.mark.parametrize("value, headers", [
+        (b"\x00" * 3, [("schema-version", b"2")]),
+        (b"{}", [("schema-version", b"9")]),
+        (b"{}", [("schema-version", b"two")]),
+        (b"not json", None),
+        (b"[1, 2]", None),
+        (None, None),
+    ])
+    def test_malformed_messages(self, value, headers):
+        with pytest.raises(MessageDecodeError):
+            moderation_codec.decode(value, headers)
+
+    async def test_worker_consumes_both_versions(self, worker):
+        broker = InMemoryBroker()
+        for version, task_id in ((1, 1), (2, 2)):
+            value, headers = moderation_codec.encode(moderation_codec.build_request(7, task_id), version)
+            broker.append(TOPIC, b"7", value, headers)
+        broker.append(TOPIC, b"7", b"\x01", [("schema-version", b"2")])
+        broker.append(TOPIC, b"7", b"[1, 2]", [])
+        worker.consumer = broker.consumer_factory()(TOPIC, group_id=CONSUMER_GROUP)
+        worker.dlq_producer = broker.producer_factory()(value_serializer=lambda v: json.dumps(v).encode("utf-8"))
+        await worker.consumer.start()
+        processed = []
+
+        async def process(message, retry_count=0):
+            processed.append(message["task_id"])
+
+        worker.process_with_retry = process
+        running = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.01)
+        worker.drain(running)
+        await running
+
+        assert processed == [1, 2]
+        dead_lettered = [json.loads(record.value)["original"]["raw"] for record in broker.topics[DLQ_TOPIC]]
+        assert dead_lettered == ["AQ==", "WzEsIDJd"]
+        assert broker.committed[CONSUMER_GROUP, TOPIC] == 4
@@ -0,0 +1,100 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from aiokafka.errors import KafkaTimeoutError
+from benchmarks.standins import InMemoryBroker, InMemoryDatabase
+from clients import moderation_codec
+from clients.kafka import kafka_producer
+from kafka_settings import TOPIC
+from repositories.moderations import ModerationRepository
+from services.moderations import ModerationService
+from workers.outbox_relay import OutboxRelay
+
+TRACEPARENT = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+
+
+def outbox_storage(db):
+    return SimpleNamespace(claim=db.claim_outbox, delete=db.delete_outbox, reschedule=db.reschedule_outbox)
+
+
+class TestOutboxRelayUnit:
+
+    async def test_delivered_rows_are_deleted_and_failed_rescheduled(self):
+        db = InMemoryDatabase()
+        tasks = [await db.submit_moderation_with_outbox(item_id, TRACEPARENT if item_id == 1 else None)
+                 for item_id in (1, 2, 3)]
+        producer = AsyncMock()
+        producer.send_messages.return_value = [None, KafkaTimeoutError(), None]
+        relay = OutboxRelay(producer, outbox_storage(db), batch_size=10)
+
+        assert await relay.relay_once() == 3
+
+        messages, = producer.send_messages.call_args.args
+        assert [message["task_id"] for message in messages] == [task["id"] for task in tasks]
+        assert messages[0]["metadata"]["traceparent"] == TRACEPARENT
+        assert "traceparent" not in messages[1]["metadata"]
+        failed, = db.outbox.values()
+        assert failed["task_id"] == tasks[1]["id"]
+        assert failed["attempts"] == 1 and failed["last_error"]
+
+        # Возвращённая запись ждёт паузу и не забирается сразу
+        assert await relay.relay_once() == 0
+
+    async def test_claim_respects_batch_size_and_lease(self):
+        db = InMemoryDatabase()
+        for item_id in range(5):
+            await db.submit_moderation_with_outbox(item_id, None)
+
+        first = await db.claim_outbox(3, lease_seconds=30)
+        second = await db.claim_outbox(3, lease_seconds=30)
+
+        assert [row["task_id"] for row in first] == [1, 2, 3]
+        assert [row["task_id"] for row in second] == [4, 5]
+        assert await db.claim_outbox(3, lease_seconds=30) == []
+
+    async def test_deleting_task_removes_outbox_row(self):
+        db = InMemoryDatabase()
+        task = await db.submit_moderation_with_outbox(1, None)
+
+        await db.delete_moderation(task["id"])
+
+        assert db.outbox == {}
+
+    async def test_bulk_submit_writes_outbox_rows(self):
+        db = InMemoryDatabase()
+        storage = SimpleNamespace(create_pending_many_with_outbox=db.create_pending_moderations_with_outbox)
+        service = ModerationService(ModerationRepository(moderation_storage=storage,
+                                                         moderation_redis_storage=AsyncMock()))
+
+        tasks = await service.submit_many([21, 22])
+
+        assert [task.status for task in tasks] == ["pending", "pending"]
+        assert sorted((row["item_id"], row["task_id"]) for row in db.outbox.values()) == \
+            [(21, tasks[0].id), (22, tasks[1].id)]
+
+    async def test_send_messages_reports_each_delivery(self, monkeypatch):
+        broker = InMemoryBroker()
+        monkeypatch.setattr(kafka_producer, "_producer",
+                            broker.producer_factory()(key_serializer=lambda k: str(k).encode("utf-8")))
+        messages = [moderation_codec.build_request(item_id, item_id * 10, {"traceparent": TRACEPARENT})
+                    for item_id in (1, 2)]
+
+        errors = await kafka_producer.send_messages(messages)
+
+        assert errors == [None, None]
+        records = broker.topics[TOPIC]
+        assert [record.key for record in records] == [b"1", b"2"]
+        decoded = moderation_codec.decode(records[1].value, records[1].headers)
+        assert (decoded["item_id"], decoded["task_id"]) == (2, 20)
+        assert decoded["metadata"]["traceparent"] == TRACEPARENT
+
+    async def test_run_stops(self):
+        storage = SimpleNamespace(claim=AsyncMock(return_value=[]))
+        relay = OutboxRelay(AsyncMock(), storage, poll_interval=10)
+
+        running = asyncio.create_task(relay.run())
+        await asyncio.sleep(0.01)
+        relay.stop()
+        await asyncio.wait_for(running, 1)
+
+        storage.claim.assert_called_once()
@@ -0,0 +1,115 @@
+import asyncio
+import socket
+import urllib.request
+import pytest
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+import profiling
+from errors import ProfilingInProgressError
+from profiling import AsyncioProfiler, start_profile_server
+
+
+@asynccontextmanager
+async def slow_connection():
+    await asyncio.sleep(5)
+    yield
+
+
+async def slow_query():
+    async with slow_connection():
+        pass
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.mark.asyncio
+class TestProfilingUnit:
+
+    async def test_collapsed_stacks_follow_await_chain(self):
+        task = asyncio.create_task(slow_query(), name="slow-query")
+        await asyncio.sleep(0)
+
+        try:
+            collapsed = await AsyncioProfiler().profile(0.05, 0.005)
+        finally:
+            task.cancel()
+
+        lines = collapsed.splitlines()
+        task_lines = [line for line in lines if line.startswith("task:slow-query;")]
+        assert task_lines
+        assert "slow_query" in task_lines[0] and "slow_connection" in task_lines[0]
+        assert any(line.startswith("thread:") for line in lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) >= 1
+
+    async def test_only_one_profile_at_a_time(self):
+        profiler = AsyncioProfiler()
+        first = asyncio.create_task(profiler.profile(0.1, 0.01))
+        await asyncio.sleep(0.01)
+
+        with pytest.raises(ProfilingInProgressError):
+            await profiler.profile(0.1, 0.01)
+
+        await first
+        assert profiler.is_running is False
+
+    async def test_window_is_capped(self):
+        profiler = AsyncioProfiler(max_seconds=0.05)
+        started = asyncio.get_running_loop().time()
+
+        await profiler.profile(30, 0.01)
+
+        assert asyncio.get_running_loop().time() - started < 1
+
+    async def test_worker_profile_server(self):
+        port = free_port()
+        with patch.object(profiling, "DEBUG_TOKEN", "secret"):
+            server = start_profile_server(port, asyncio.get_running_loop())
+
+        def fetch(token):
+            request = urllib.request.Request(f"http://127.0.0.1:{port}/debug/profile?seconds=0.05",
+                                             headers={"X-Debug-Token": token})
+            try:
+                with urllib.request.urlopen(request) as response:
+                    return response.status, response.read().decode()
+            except urllib.error.HTTPError as e:
+                return e.code, ""
+
+        try:
+            with patch.object(profiling, "DEBUG_TOKEN", "secret"):
+                assert (await asyncio.to_thread(fetch, "wrong"))[0] == 403
+                status, body = await asyncio.to_thread(fetch, "secret")
+        finally:
+            server.shutdown()
+
+        assert status == 200
+        assert "thread:" in body
+
+
+class TestProfileEndpointUnit:
+
+    def test_disabled_without_token(self, app_client):
+        with patch.object(profiling, "DEBUG_TOKEN", None):
+            response = app_client.get("/debug/profile", params={"seconds": 0.05})
+
+        assert response.status_code == 404
+
+    def test_rejects_wrong_token(self, app_client):
+        with patch.object(profiling, "DEBUG_TOKEN", "secret"):
+            response = app_client.get("/debug/profile", params={"seconds": 0.05},
+                                      headers={"X-Debug-Token": "wrong"})
+
+        assert response.status_code == 403
+
+    def test_returns_collapsed_profile(self, app_client):
+        with patch.object(profiling, "DEBUG_TOKEN", "secret"):
+            response = app_client.get("/debug/profile", params={"seconds": 0.05, "interval": 0.005},
+                                      headers={"X-Debug-Token": "secret"})
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in response.text.splitlines())
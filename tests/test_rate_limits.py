@@ -0,0 +1,119 @@
+import pytest
+from http import HTTPStatus
+from unittest.mock import AsyncMock, patch
+from fastapi.testclient import TestClient
+from redis.exceptions import ConnectionError as RedisConnectionError
+from errors import AdNotFoundError, RateLimitExceededError
+from models.predict_request import PredictRequest
+from services.rate_limits import DEFAULT_RATE_LIMITS, RateLimitService, TokenBucket, parse_rate_limits
+
+
+def make_service(storage=None, limits=None, is_verified=False):
+    ad_repo = AsyncMock()
+    ad_repo.get_for_simple_predict.return_value = PredictRequest(
+        seller_id=7, is_verified_seller=is_verified, item_id=1, name="Товар",
+        description="Описание", category=1, images_qty=1,
+    )
+    if storage is None:
+        storage = AsyncMock()
+        storage.take.return_value = (True, 0.0)
+    return RateLimitService(limits or DEFAULT_RATE_LIMITS, storage=storage, ad_repo=ad_repo, enabled=True)
+
+
+class TestRateLimitsUnit:
+
+    def test_parse_rate_limits_overrides_defaults(self):
+        limits = parse_rate_limits("async_predict.verified=10/50, simple_predict.unverified=0,junk",
+                                   DEFAULT_RATE_LIMITS)
+
+        assert limits[("async_predict", "verified")] == (10.0, 50)
+        assert limits[("simple_predict", "unverified")] == (0.0, 1)
+        assert limits[("async_predict", "unverified")] == DEFAULT_RATE_LIMITS[("async_predict", "unverified")]
+
+    def test_token_bucket_spends_burst_then_rejects(self):
+        bucket = TokenBucket(rate=1.0, burst=2)
+
+        assert bucket.take()[0]
+        assert bucket.take()[0]
+        allowed, retry_after = bucket.take()
+        assert not allowed
+        assert 0 < retry_after <= 1.0
+
+    async def test_keys_by_item_seller_and_tier(self):
+        service = make_service(is_verified=False)
+
+        await service.check("async_predict", item_id=1)
+
+        service.storage.take.assert_awaited_once_with("async_predict:7", *DEFAULT_RATE_LIMITS[("async_predict", "unverified")])
+
+    async def test_identity_is_cached_per_item(self):
+        service = make_service()
+
+        await service.check("simple_predict", item_id=1)
+        await service.check("simple_predict", item_id=1)
+
+        service.ad_repo.get_for_simple_predict.assert_awaited_once_with(1)
+        service.storage.take.assert_awaited_with("simple_predict:7", *DEFAULT_RATE_LIMITS[("simple_predict", "unverified")])
+
+    async def test_unknown_item_is_left_to_handler(self):
+        service = make_service()
+        service.ad_repo.get_for_simple_predict.side_effect = AdNotFoundError()
+
+        await service.check("async_predict", item_id=404)
+
+        service.storage.take.assert_not_awaited()
+
+    async def test_raises_when_bucket_is_empty(self):
+        storage = AsyncMock()
+        storage.take.return_value = (False, 0.4)
+        service = make_service(storage=storage)
+
+        with pytest.raises(RateLimitExceededError) as exc:
+            await service.check("async_predict", item_id=1)
+        assert exc.value.retry_after == 0.4
+
+    async def test_unlimited_tier_skips_redis(self):
+        service = make_service(limits={("async_predict", "unverified"): (0.0, 1)})
+
+        await service.check("async_predict", item_id=1)
+
+        service.storage.take.assert_not_awaited()
+
+    async def test_falls_back_to_local_bucket_when_redis_is_down(self):
+        storage = AsyncMock()
+        storage.take.side_effect = RedisConnectionError("connection refused")
+        service = make_service(storage=storage, limits={("async_predict", "unverified"): (0.001, 1)})
+
+        await service.check("async_predict", item_id=1)
+        with pytest.raises(RateLimitExceededError):
+            await service.check("async_predict", item_id=1)
+
+    async def test_fails_open_when_identity_lookup_fails(self):
+        service = make_service()
+        service.ad_repo.get_for_simple_predict.side_effect = OSError("database is down")
+
+        await service.check("async_predict", item_id=1)
+
+        service.storage.take.assert_not_awaited()
+
+    def test_bogus_cookie_does_not_bypass_limit(self, app_client: TestClient):
+        storage = AsyncMock()
+        storage.take.return_value = (False, 1.0)
+        service = make_service(storage=storage)
+
+        with patch("routers.dependencies.rate_limiter", service), \
+             patch("routers.async_predict.mod_service") as mod_service:
+            response = app_client.post("/async_predict/1", json={"item_id": 1},
+                                       cookies={"x-user-id": "999999"})
+
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        storage.take.assert_awaited_once_with("async_predict:7", *DEFAULT_RATE_LIMITS[("async_predict", "unverified")])
+        mod_service.submit.assert_not_called()
+
+    def test_async_predict_returns_429_with_retry_after(self, app_client: TestClient):
+        with patch("services.rate_limits.RateLimitService.check",
+                   AsyncMock(side_effect=RateLimitExceededError(1.2))):
+            response = app_client.post("/async_predict/1", json={"item_id": 1})
+
+        assert response.status_code == HTTPStatus.TOO_MANY_REQUESTS
+        assert response.headers["retry-after"] == "2"
@@ -1,7 +1,8 @@
 import pytest
 from unittest.mock import Mock, AsyncMock, patch, call
 from datetime import datetime
-from repositories.moderations import ModerationRepository, ModerationModel
+from contextlib import asynccontextmanager
+from repositories.moderations import ModerationRepository, ModerationModel, ModerationRedisStorage
 from errors import ModerationNotFoundError
 import asyncio
 
@@ -85,6 +86,76 @@ class TestRedisUnit:
     
 
 
+    async def test_submit_for_prediction_returns_features_for_new_task(self, pending_moderation):
+        """Тест: промах кэша - одна операция БД отдаёт новую задачу и признаки."""
+
+        mock_moderation_storage = AsyncMock()
+        mock_moderation_redis_storage = AsyncMock()
+
+        moderation_repo = ModerationRepository(
+            moderation_storage=mock_moderation_storage,
+            moderation_redis_storage=mock_moderation_redis_storage
+        )
+
+        features = {"seller_id": 3, "is_verified_seller": True, "name": "Товар", "description": "Описание",
+                    "category": 5, "images_qty": 2}
+        mock_moderation_redis_storage.get_latest_by_item_id.return_value = None
+        mock_moderation_storage.submit_for_prediction.return_value = dict(pending_moderation, **features)
+
+        moderation, predict_request = await moderation_repo.submit_for_prediction(pending_moderation["item_id"])
+
+        assert moderation.status == "pending"
+        assert predict_request.item_id == pending_moderation["item_id"]
+        assert predict_request.category == 5
+        mock_moderation_storage.submit_for_prediction.assert_called_once_with(pending_moderation["item_id"])
+        mock_moderation_redis_storage.set_latest_by_item_id.assert_not_called()
+
+
+    async def test_submit_for_prediction_caches_completed(self, completed_moderation):
+        """Тест: в БД уже есть результат - признаки не нужны, результат кладётся в кэш."""
+
+        mock_moderation_storage = AsyncMock()
+        mock_moderation_redis_storage = AsyncMock()
+
+        moderation_repo = ModerationRepository(
+            moderation_storage=mock_moderation_storage,
+            moderation_redis_storage=mock_moderation_redis_storage
+        )
+
+        mock_moderation_redis_storage.get_latest_by_item_id.return_value = None
+        mock_moderation_storage.submit_for_prediction.return_value = dict(
+            completed_moderation, seller_id=None, is_verified_seller=None, name=None, description=None,
+            category=None, images_qty=None)
+
+        moderation, predict_request = await moderation_repo.submit_for_prediction(completed_moderation["item_id"])
+
+        assert moderation.status == "completed"
+        assert predict_request is None
+        mock_moderation_redis_storage.set_latest_by_item_id.assert_called_once_with(
+            completed_moderation["item_id"], completed_moderation)
+        mock_moderation_redis_storage.set_by_task_id.assert_called_once_with(
+            completed_moderation["id"], completed_moderation)
+
+
+    async def test_submit_with_outbox_cache_hit(self, completed_moderation):
+        """Тест: результат в кэше - в БД не ходим."""
+
+        mock_moderation_storage = AsyncMock()
+        mock_moderation_redis_storage = AsyncMock()
+
+        moderation_repo = ModerationRepository(
+            moderation_storage=mock_moderation_storage,
+            moderation_redis_storage=mock_moderation_redis_storage
+        )
+
+        mock_moderation_redis_storage.get_latest_by_item_id.return_value = completed_moderation
+
+        moderation = await moderation_repo.submit_with_outbox(completed_moderation["item_id"])
+
+        assert moderation.id == completed_moderation["id"]
+        mock_moderation_storage.submit_with_outbox.assert_not_called()
+
+
     async def test_get_by_task_id_cache_hit(self, completed_moderation):
         
         mock_moderation_storage = AsyncMock()
@@ -269,6 +340,36 @@ class TestRedisUnit:
         mock_moderation_redis_storage.delete_latest_by_item_id.assert_called_once_with(completed_moderation["item_id"])
     
     
+    async def test_evict_cached_deletes_keys_in_one_call(self, completed_moderation):
+        mock_moderation_storage = AsyncMock()
+        mock_moderation_redis_storage = AsyncMock()
+
+        moderation_repo = ModerationRepository(
+            moderation_storage=mock_moderation_storage,
+            moderation_redis_storage=mock_moderation_redis_storage
+        )
+
+        await moderation_repo.evict_cached(completed_moderation["item_id"], [completed_moderation["id"]])
+
+        mock_moderation_redis_storage.delete_many.assert_called_once_with(
+            [completed_moderation["id"]], [completed_moderation["item_id"]]
+        )
+        mock_moderation_redis_storage.get_latest_by_item_id.assert_not_called()
+        mock_moderation_storage.delete_by_item_id.assert_not_called()
+
+    async def test_redis_delete_many_builds_keys(self):
+        connection = AsyncMock()
+
+        @asynccontextmanager
+        async def fake_connection():
+            yield connection
+
+        with patch("repositories.moderations.get_redis_connection", fake_connection):
+            await ModerationRedisStorage().delete_many([5, 6], [1])
+            await ModerationRedisStorage().delete_many([], [])
+
+        connection.delete.assert_called_once_with("task:5", "task:6", "item:1")
+
     async def test_invalidate_by_seller_id_with_items(self, completed_moderation):
         mock_moderation_storage = AsyncMock()
         mock_moderation_redis_storage = AsyncMock()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+import httpx
+import pytest
+from unittest.mock import AsyncMock, patch
+from fastapi import FastAPI
+from models.moderation import ModerationModel
+from repositories.moderations import ModerationRepository
+from routers import moderation_results
+from services.result_notifier import ResultNotifier
+
+
+def moderation(task_id=1, status="pending", **fields):
+    return ModerationModel(id=task_id, item_id=10, status=status, **fields)
+
+
+def completed_row(task_id=1):
+    return {"id": task_id, "item_id": 10, "status": "completed", "is_violation": True,
+            "probability": 0.9, "model_version": "3"}
+
+
+@pytest.fixture
+def notifier():
+    notifier = ResultNotifier()
+    # Без Redis: подписка считается активной, сообщения подаются через dispatch
+    notifier.start = AsyncMock()
+    notifier._subscribed = asyncio.Event()
+    notifier._subscribed.set()
+    with patch("routers.moderation_results.result_notifier", notifier):
+        yield notifier
+
+
+@pytest.fixture
+def results_client():
+    app = FastAPI()
+    app.include_router(moderation_results.router, prefix="/moderation_results")
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+class TestResultNotifierUnit:
+
+    async def test_dispatch_fans_out_to_waiters_of_task(self):
+        notifier = ResultNotifier()
+        first, second = notifier.subscribe([1]), notifier.subscribe([1, 2])
+        other = notifier.subscribe([3])
+
+        notifier.dispatch(json.dumps(completed_row(1)))
+
+        assert first.get_nowait()["id"] == 1
+        assert second.get_nowait()["id"] == 1
+        assert other.empty()
+
+        notifier.unsubscribe(first, [1])
+        notifier.unsubscribe(second, [1, 2])
+        notifier.unsubscribe(other, [3])
+        assert notifier.snapshot()["waiting_tasks"] == 0
+
+    async def test_repository_publishes_finished_tasks_only(self):
+        pg, redis = AsyncMock(), AsyncMock()
+        repo = ModerationRepository(moderation_storage=pg, moderation_redis_storage=redis)
+
+        pg.update.return_value = {"id": 1, "item_id": 10, "status": "pending"}
+        await repo.update(1, status="pending")
+        redis.publish_result.assert_not_awaited()
+
+        pg.update.return_value = {"id": 1, "item_id": 10, "status": "failed", "error_message": "boom"}
+        await repo.update(1, status="failed")
+        redis.publish_result.assert_awaited_once_with(pg.update.return_value)
+
+    async def test_wait_returns_finished_task_immediately(self, notifier, results_client):
+        with patch("routers.moderation_results.mod_service") as mod_service:
+            mod_service.get_by_task_id = AsyncMock(return_value=moderation(status="completed", is_violation=False))
+            response = await results_client.get("/moderation_results/1/wait", params={"timeout": 5})
+
+        assert response.status_code == 200
+        assert response.json()["status"] == "completed"
+
+    async def test_wait_wakes_up_on_notification(self, notifier, results_client):
+        async def complete_later():
+            await asyncio.sleep(0.05)
+            notifier.dispatch(json.dumps(completed_row(1)))
+
+        with patch("routers.moderation_results.mod_service") as mod_service:
+            mod_service.get_by_task_id = AsyncMock(return_value=moderation())
+            completing = asyncio.create_task(complete_later())
+            response = await results_client.get("/moderation_results/1/wait", params={"timeout": 5})
+            await completing
+
+        assert response.json()["status"] == "completed"
+        assert response.json()["probability"] == 0.9
+        mod_service.get_by_task_id.assert_awaited_once_with(1)
+
+    async def test_wait_times_out_with_current_status(self, notifier, results_client):
+        with patch("routers.moderation_results.mod_service") as mod_service:
+            mod_service.get_by_task_id = AsyncMock(return_value=moderation())
+            response = await results_client.get("/moderation_results/1/wait", params={"timeout": 0.05})
+
+        assert response.json()["status"] == "pending"
+
+    async def test_wait_rereads_after_resubscribe(self, notifier, results_client):
+        statuses = {1: "pending"}
+
+        async def reconnect_during_gap():
+            await asyncio.sleep(0.05)
+            statuses[1] = "completed"
+            notifier.generation += 1
+
+        with patch("routers.moderation_results.mod_service") as mod_service, \
+             patch("routers.moderation_results.RESULT_STREAM_HEARTBEAT", 0.1):
+            mod_service.get_by_task_id = AsyncMock(side_effect=lambda task_id: moderation(
+                task_id, status=statuses[task_id]))
+            reconnecting = asyncio.create_task(reconnect_during_gap())
+            response = await results_client.get("/moderation_results/1/wait", params={"timeout": 5})
+            await reconnecting
+
+        assert response.json()["status"] == "completed"
+        assert mod_service.get_by_task_id.await_count == 2
+
+    async def test_stream_sends_results_as_tasks_finish(self, notifier, results_client):
+        async def complete_later():
+            await asyncio.sleep(0.05)
+            notifier.dispatch(json.dumps(completed_row(2)))
+
+        with patch("routers.moderation_results.mod_service") as mod_service:
+            mod_service.get_by_task_id = AsyncMock(side_effect=lambda task_id: moderation(
+                task_id, status="completed" if task_id == 1 else "pending"))
+            completing = asyncio.create_task(complete_later())
+            response = await results_client.get("/moderation_results/stream",
+                                                params={"task_ids": [1, 2], "timeout": 5})
+            await completing
+
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+        assert [lines[0] for lines in events] == ["event: result", "event: result"]
+        assert [json.loads(lines[1][len("data: "):])["task_id"] for lines in events] == [1, 2]
+
+    async def test_stream_rereads_after_resubscribe(self, notifier, results_client):
+        statuses = {1: "pending"}
+
+        async def reconnect_during_gap():
+            await asyncio.sleep(0.05)
+            # Результат опубликован, пока подписки не было, затем подписка восстановилась
+            statuses[1] = "completed"
+            notifier.generation += 1
+
+        with patch("routers.moderation_results.mod_service") as mod_service, \
+             patch("routers.moderation_results.RESULT_STREAM_HEARTBEAT", 0.1):
+            mod_service.get_by_task_id = AsyncMock(side_effect=lambda task_id: moderation(
+                task_id, status=statuses[task_id]))
+            reconnecting = asyncio.create_task(reconnect_during_gap())
+            response = await results_client.get("/moderation_results/stream",
+                                                params={"task_ids": [1], "timeout": 5})
+            await reconnecting
+
+        events = [block for block in response.text.strip().split("\n\n") if not block.startswith(":")]
+        assert [block.split("\n")[0] for block in events] == ["event: result"]
+        assert mod_service.get_by_task_id.await_count == 2
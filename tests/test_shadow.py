@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from unittest.mock import Mock, patch
+from model import model_singleton, CANARY_FEATURES
+from services.predictions import PredictionService
+from services.shadow import ShadowScorer
+
+
+@pytest.fixture
+async def scorer():
+    scorer = ShadowScorer(sample_rate=1.0, queue_size=4, batch_size=8)
+    with patch.object(model_singleton, 'load_candidate', return_value=(model_singleton._model, "candidate-1")):
+        await scorer.start()
+    yield scorer
+    await scorer.stop()
+
+
+@pytest.mark.asyncio
+class TestShadowScorerUnit:
+
+    async def test_disabled_without_sample_rate(self):
+        scorer = ShadowScorer(sample_rate=0)
+        with patch.object(model_singleton, 'load_candidate') as load_candidate:
+            await scorer.start()
+
+        load_candidate.assert_not_called()
+        assert scorer.enabled is False
+        scorer.submit(CANARY_FEATURES[:1], False, 0.1, 0.001)
+        assert scorer.stats.sampled == 0
+
+    async def test_candidate_load_failure_keeps_shadow_off(self):
+        scorer = ShadowScorer(sample_rate=1.0)
+        with patch.object(model_singleton, 'load_candidate', side_effect=FileNotFoundError("candidate_model.pkl")):
+            await scorer.start()
+
+        assert scorer.enabled is False
+
+    async def test_same_model_has_no_disagreements(self, scorer):
+        model, _ = model_singleton.snapshot()
+        probabilities = model.predict_proba(CANARY_FEATURES)
+        predictions = model.predict(CANARY_FEATURES)
+
+        batch = []
+        for row, prediction, row_probabilities in zip(CANARY_FEATURES, predictions, probabilities):
+            scorer.submit(row.reshape(1, -1), bool(prediction), float(row_probabilities[1]), 0.001)
+            batch.append(scorer._queue.get_nowait())
+        await scorer.process_batch(batch)
+
+        stats = scorer.snapshot()
+        assert stats["candidate_version"] == "candidate-1"
+        assert stats["scored"] == len(CANARY_FEATURES)
+        assert stats["batches"] == 1
+        assert stats["disagreements"] == 0
+        assert stats["mean_abs_diff"] == pytest.approx(0.0, abs=1e-9)
+
+    async def test_disagreement_is_counted(self, scorer):
+        scorer.set_candidate(Mock(
+            predict=Mock(return_value=np.array([1])),
+            predict_proba=Mock(return_value=np.array([[0.2, 0.8]])),
+        ), "candidate-2")
+
+        scorer.submit(CANARY_FEATURES[:1], False, 0.3, 0.001)
+        await scorer.process_batch([scorer._queue.get_nowait()])
+
+        stats = scorer.snapshot()
+        assert stats["disagreements"] == 1
+        assert stats["abs_diff_max"] == pytest.approx(0.5)
+
+    async def test_full_queue_drops_samples(self, scorer):
+        scorer._task.cancel()
+        for _ in range(scorer.queue_size + 3):
+            scorer.submit(CANARY_FEATURES[:1], False, 0.1, 0.001)
+
+        assert scorer.stats.sampled == scorer.queue_size + 3
+        assert scorer.stats.dropped == 3
+
+    async def test_submit_after_stop_is_ignored(self, scorer):
+        await scorer.stop()
+        scorer.submit(CANARY_FEATURES[:1], False, 0.1, 0.001)
+
+        assert scorer.enabled is False
+        assert scorer.stats.sampled == 0
+
+    async def test_candidate_reloaded_when_alias_moves(self, scorer):
+        new_candidate = Mock()
+
+        with patch.object(model_singleton, 'resolve_candidate_version', return_value="candidate-1"):
+            assert await scorer.check_candidate() is False
+        with patch.object(model_singleton, 'resolve_candidate_version', return_value="candidate-2"), \
+             patch.object(model_singleton, 'load_candidate', return_value=(new_candidate, "candidate-2")):
+            assert await scorer.check_candidate() is True
+
+        assert scorer._candidate is new_candidate
+        assert scorer.snapshot()["candidate_version"] == "candidate-2"
+
+    async def test_prediction_submits_to_shadow(self):
+        with patch('services.predictions.shadow_scorer') as shadow:
+            is_violation, probability = await PredictionService().predict(1, True, 1, "name", "description", 5, 3)
+
+        shadow.submit.assert_called_once()
+        _, submitted_violation, submitted_probability, _ = shadow.submit.call_args.args
+        assert (submitted_violation, submitted_probability) == (is_violation, probability)
+
+    async def test_shadow_stats_endpoint(self, app_client):
+        response = app_client.get("/health/model/shadow")
+
+        assert response.status_code == 200
+        assert {"enabled", "disagreement_rate", "dropped"} <= set(response.json())
@@ -8,6 +8,7 @@ from routers.predict import pred_service
 from model import model_singleton
 from repositories.ads import AdRepository
 from models.moderation import ModerationModel
+from models.predict_request import PredictRequest
 import warnings
 import logging
 
@@ -72,8 +73,6 @@ class TestSimplePredictAPIUnit:
         item = request.getfixturevalue(item_fixture)
 
         mock_mod_service = AsyncMock()
-        mock_mod_service.get_latest_by_item_id.return_value = None
-        mock_mod_service.register.return_value = ModerationModel(**pending_moderation)
         mock_mod_service.update_status.return_value = ModerationModel(**completed_moderation)
         mock_moderation_repo = AsyncMock()
 
@@ -85,14 +84,14 @@ class TestSimplePredictAPIUnit:
                             "category": item["category"],
                             "images_qty": item["images_qty"]
                         }
+        mock_mod_service.submit_for_prediction.return_value = (ModerationModel(**pending_moderation),
+                                                               PredictRequest(**predict_request))
 
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage, 
-                                    moderation_repo=mock_moderation_repo)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, moderation_repo=mock_moderation_repo)
         
         with patch('routers.predict.mod_service', mock_mod_service), \
             patch('services.predictions.PredictionService.mod_service', mock_mod_service), \
              patch('services.predictions.PredictionService.ad_repo', mock_ad_repo):
-            mock_ad_storage.select_for_prediction.return_value = predict_request
             
             response = app_client_with_mocks.post(f'/simple_predict/{item["item_id"]}', 
                                             json={"item_id": item["item_id"]})
@@ -100,10 +99,9 @@ class TestSimplePredictAPIUnit:
             assert response.status_code == 200
             assert response.json()['is_violation'] == False
             assert response.json()['probability'] < 0.5
-            mock_mod_service.get_latest_by_item_id.assert_called_once()
-            mock_mod_service.register.assert_called_once()
+            mock_mod_service.submit_for_prediction.assert_called_once_with(item["item_id"])
             mock_mod_service.update_status.assert_called_once()
-            mock_ad_storage.select_for_prediction.assert_called_once()
+            mock_ad_storage.select_for_prediction.assert_not_called()
     
     @pytest.mark.parametrize(
         "seller_fixture, item_fixture", 
@@ -117,8 +115,6 @@ class TestSimplePredictAPIUnit:
         item = request.getfixturevalue(item_fixture)
 
         mock_mod_service = AsyncMock()
-        mock_mod_service.get_latest_by_item_id.return_value = None
-        mock_mod_service.register.return_value = ModerationModel(**pending_moderation)
         mock_mod_service.update_status.return_value = ModerationModel(**completed_moderation)
         mock_moderation_repo = AsyncMock()
 
@@ -130,14 +126,14 @@ class TestSimplePredictAPIUnit:
                             "category": item["category"],
                             "images_qty": item["images_qty"]
                         }
+        mock_mod_service.submit_for_prediction.return_value = (ModerationModel(**pending_moderation),
+                                                               PredictRequest(**predict_request))
 
-        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, seller_storage=mock_seller_storage, 
-                                    moderation_repo=mock_moderation_repo)
+        mock_ad_repo = AdRepository(ad_storage=mock_ad_storage, moderation_repo=mock_moderation_repo)
         
         with patch('routers.predict.mod_service', mock_mod_service), \
             patch('services.predictions.PredictionService.mod_service', mock_mod_service), \
              patch('services.predictions.PredictionService.ad_repo', mock_ad_repo):
-            mock_ad_storage.select_for_prediction.return_value = predict_request
             
             response = app_client_with_mocks.post(f'/simple_predict/{item["item_id"]}', 
                                             json={"item_id": item["item_id"]})
@@ -145,7 +141,6 @@ class TestSimplePredictAPIUnit:
             assert response.status_code == 200
             assert response.json()['is_violation'] == True
             assert response.json()['probability'] >= 0.5
-            mock_mod_service.get_latest_by_item_id.assert_called_once()
-            mock_mod_service.register.assert_called_once()
+            mock_mod_service.submit_for_prediction.assert_called_once_with(item["item_id"])
             mock_mod_service.update_status.assert_called_once()
-            mock_ad_storage.select_for_prediction.assert_called_once()
\ No newline at end of file
+            mock_ad_storage.select_for_prediction.assert_not_called()
\ No newline at end of file
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import time
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from benchmarks.standins import InMemoryBroker
+from kafka_settings import CONSUMER_GROUP, TOPIC
+from model import model_singleton
+from workers import supervisor
+from workers.supervisor import WorkerSupervisor, parse_cpus
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+class TestSupervisorUnit:
+
+    def test_parse_cpus(self):
+        assert parse_cpus("none", 2, [0, 1]) == [None, None]
+        assert parse_cpus("auto", 3, [1, 0]) == [{0}, {1}, {0}]
+        assert parse_cpus("2,4", 2, [0, 1]) == [{2}, {4}]
+        with pytest.raises(ValueError):
+            parse_cpus(",", 1, [0])
+
+    def test_crashed_child_is_restarted_with_backoff(self, monkeypatch):
+        def crash(cpus, heartbeat_fd):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(supervisor, "run_child", crash)
+        sup = WorkerSupervisor(1, [None], metrics_port=0, preload_model=False)
+
+        sup.spawn(0)
+        assert wait_for(lambda: (sup.reap(), not sup.children)[1])
+
+        assert sup.restarts[0] == 1
+        assert sup._next_spawn[0] > time.monotonic()
+
+    def test_child_without_heartbeat_is_killed(self, monkeypatch):
+        def beat_once_then_hang(cpus, heartbeat_fd):
+            os.write(heartbeat_fd, b".")
+            time.sleep(60)
+
+        monkeypatch.setattr(supervisor, "run_child", beat_once_then_hang)
+        monkeypatch.setattr(supervisor, "WORKER_HEARTBEAT_TIMEOUT", 0.2)
+        sup = WorkerSupervisor(1, [None], metrics_port=0, preload_model=False)
+
+        pid = sup.spawn(0)
+        assert wait_for(lambda: (sup.read_heartbeats(0.05), sup.children[pid].last_heartbeat)[1] is not None)
+        time.sleep(0.3)
+        sup.check_health()
+
+        assert pid not in sup.children
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+
+    def test_child_disables_model_watcher(self, monkeypatch):
+        from model_watcher import model_watcher
+        from workers import moderation_worker
+
+        monkeypatch.setattr(model_watcher, "_interval", 30.0)
+        monkeypatch.setattr(moderation_worker, "main", AsyncMock())
+
+        supervisor.run_child(None, heartbeat_fd=0)
+
+        assert model_watcher._interval == 0
+        moderation_worker.main.assert_awaited_once()
+
+    def test_rolling_restart_replaces_children_one_by_one(self, monkeypatch):
+        def beat_until_stopped(cpus, heartbeat_fd):
+            while True:
+                os.write(heartbeat_fd, b".")
+                time.sleep(0.05)
+
+        monkeypatch.setattr(supervisor, "run_child", beat_until_stopped)
+        sup = WorkerSupervisor(2, [None, None], metrics_port=0, preload_model=False)
+        old_pids = {sup.spawn(0), sup.spawn(1)}
+
+        sup.restart_children()
+
+        assert [child.slot for child in sup.children.values()] == [0, 1]
+        assert not old_pids & set(sup.children)
+        sup._stopping = True
+        sup.stop_children()
+
+    def test_new_model_version_rolls_children(self):
+        sup = WorkerSupervisor(1, [None], metrics_port=0, preload_model=True)
+        new_model = Mock()
+
+        with patch.object(model_singleton, "resolve_source_version", return_value="v-next"), \
+             patch.object(model_singleton, "load_version", return_value=new_model), \
+             patch.object(model_singleton, "swap") as swap, \
+             patch.object(sup, "restart_children") as restart_children, \
+             patch("launcher.gc"):
+            assert sup.check_model() is True
+
+        swap.assert_called_once_with(new_model, "v-next")
+        restart_children.assert_called_once()
+
+    def test_version_that_failed_to_load_is_skipped(self):
+        sup = WorkerSupervisor(1, [None], metrics_port=0, preload_model=True)
+
+        with patch.object(model_singleton, "resolve_source_version", return_value="v-broken"), \
+             patch.object(model_singleton, "load_version", side_effect=ValueError("bad canary")) as load_version, \
+             patch.object(sup, "restart_children") as restart_children:
+            assert sup.check_model() is False
+            assert sup.check_model() is False
+
+        load_version.assert_called_once_with("v-broken")
+        restart_children.assert_not_called()
+
+    async def test_worker_drains_accepted_messages_on_stop(self, worker):
+        broker = InMemoryBroker()
+        for task_id in range(3):
+            broker.append(TOPIC, b"1", json.dumps({"item_id": 1, "task_id": task_id}).encode("utf-8"))
+        worker.consumer = broker.consumer_factory()(TOPIC, group_id=CONSUMER_GROUP)
+        await worker.consumer.start()
+        processed = []
+
+        async def slow_process(message, retry_count=0):
+            await asyncio.sleep(0.02)
+            processed.append(message["task_id"])
+
+        worker.process_with_retry = slow_process
+        running = asyncio.create_task(worker.run())
+        await asyncio.sleep(0.01)
+        worker.drain(running)
+        await running
+
+        assert processed == [0, 1, 2]
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime, timezone
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import SpanKind
+import tracing
+from clients.kafka import kafka_producer
+from tracing import FileSpanExporter, start_span
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+TRACEPARENT = f"00-{TRACE_ID}-00f067aa0ba902b7-01"
+
+
+@pytest.fixture
+def spans(monkeypatch):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, "tracer", provider.get_tracer("test"))
+    monkeypatch.setattr(tracing, "_enabled", True)
+    yield exporter
+    provider.shutdown()
+
+
+class TestTracingUnit:
+
+    def test_disabled_tracing_adds_nothing(self):
+        message = kafka_producer.build_moderation_request(1, 2)
+
+        assert "traceparent" not in message["metadata"]
+        with start_span("noop") as span:
+            assert span.is_recording() is False
+
+    def test_kafka_message_carries_traceparent(self, spans):
+        with start_span("async_predict") as span:
+            message = kafka_producer.build_moderation_request(1, 2)
+
+        trace_id = format(span.get_span_context().trace_id, "032x")
+        version, carried_trace_id, _, flags = message["metadata"]["traceparent"].split("-")
+        assert carried_trace_id == trace_id
+        assert message["metadata"]["source"] == "advertisement_service"
+
+    def test_worker_continues_trace_from_metadata(self, spans, worker, sample_message_data):
+        worker.ml_service.simple_predict.return_value = (False, 0.12)
+        message = dict(sample_message_data, timestamp=datetime.now(timezone.utc).isoformat(),
+                       metadata={"traceparent": TRACEPARENT})
+
+        assert asyncio.run(worker.process_observed(message)) is True
+
+        consumer_span, = spans.get_finished_spans()
+        assert consumer_span.kind == SpanKind.CONSUMER
+        assert format(consumer_span.context.trace_id, "032x") == TRACE_ID
+        assert format(consumer_span.parent.span_id, "016x") == "00f067aa0ba902b7"
+        assert consumer_span.attributes["messaging.queue_delay_ms"] >= 0
+
+    def test_server_span_uses_route_template(self, spans, app_client):
+        response = app_client.get("/health", headers={"traceparent": TRACEPARENT})
+
+        assert response.status_code == 200
+        server_span, = [span for span in spans.get_finished_spans() if span.kind == SpanKind.SERVER]
+        assert server_span.name == "GET /health"
+        assert format(server_span.context.trace_id, "032x") == TRACE_ID
+        assert server_span.attributes["http.response.status_code"] == 200
+
+    def test_file_exporter_writes_json_lines(self, spans, tmp_path):
+        with start_span("parent"):
+            with start_span("child", attributes={"item_id": 1}):
+                pass
+
+        path = tmp_path / "traces.jsonl"
+        FileSpanExporter(str(path)).export(spans.get_finished_spans())
+
+        child, parent = [json.loads(line) for line in path.read_text().splitlines()]
+        assert child["parent_id"] == parent["span_id"]
+        assert child["trace_id"] == parent["trace_id"]
+        assert child["attributes"] == {"item_id": 1}
@@ -0,0 +1,172 @@
+"""Распределённая трассировка OpenTelemetry: API -> Kafka -> воркер.
+
+Контекст передаётся в формате W3C traceparent: в заголовках HTTP-запроса, в заголовках
+Kafka-сообщения и в его metadata (metadata переживает повторы и DLQ). Выборка головная:
+решение принимается один раз в начале трассы (TRACE_SAMPLE_RATIO) и наследуется
+воркером через флаг в traceparent, поэтому невыбранные запросы почти ничего не стоят.
+
+TRACE_EXPORTER:
+    none  - трассировка выключена (по умолчанию), спаны не создаются вовсе;
+    file  - спаны пишутся JSON-строками в TRACE_FILE, работает офлайн;
+    otlp  - отправка в локальный коллектор OTEL_EXPORTER_OTLP_ENDPOINT
+            (нужен пакет opentelemetry-exporter-otlp);
+    console - вывод в stdout для отладки.
+"""
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Mapping, Optional, Sequence
+
+from opentelemetry import context, propagate, trace
+from opentelemetry.trace import INVALID_SPAN, SpanKind
+
+logger = logging.getLogger(__name__)
+
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").strip().lower()
+TRACE_SAMPLE_RATIO = float(os.getenv("TRACE_SAMPLE_RATIO", "0.01"))
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+
+TRACEPARENT = "traceparent"
+
+tracer = trace.get_tracer("adv_moderation")
+
+_enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class FileSpanExporter:
+    """Пишет завершённые спаны в файл по одному JSON-объекту на строку.
+    Вызывается из потока BatchSpanProcessor, а не из event loop."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Any]):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        lines = []
+        for span in spans:
+            span_context = span.get_span_context()
+            lines.append(json.dumps({
+                "name": span.name,
+                "trace_id": format(span_context.trace_id, "032x"),
+                "span_id": format(span_context.span_id, "016x"),
+                "parent_id": format(span.parent.span_id, "016x") if span.parent else None,
+                "kind": span.kind.name,
+                "service": span.resource.attributes.get("service.name"),
+                "start_ns": span.start_time,
+                "duration_ms": (span.end_time - span.start_time) / 1e6,
+                "status": span.status.status_code.name,
+                "attributes": dict(span.attributes or {}),
+                "events": [{"name": event.name, "attributes": dict(event.attributes or {})}
+                           for event in span.events],
+            }, default=str))
+        try:
+            with self._lock, open(self._path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError as e:
+            logger.warning(f"Failed to write spans to {self._path}: {e}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+def _build_exporter(name: str):
+    if name == "file":
+        return FileSpanExporter(TRACE_FILE)
+    if name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    if name == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning(f"opentelemetry-exporter-otlp is not installed, writing spans to {TRACE_FILE}")
+            return FileSpanExporter(TRACE_FILE)
+        return OTLPSpanExporter()
+    raise ValueError(f"Unknown TRACE_EXPORTER: {name}")
+
+
+def setup_tracing(service_name: str, exporter: str = TRACE_EXPORTER,
+                  sample_ratio: float = TRACE_SAMPLE_RATIO) -> bool:
+    """Настраивает провайдер трассировки процесса. Повторный вызов ничего не делает."""
+    global _enabled
+    if _enabled or exporter == "none":
+        return _enabled
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name}),
+        sampler=ParentBased(TraceIdRatioBased(sample_ratio)),
+    )
+    provider.add_span_processor(BatchSpanProcessor(_build_exporter(exporter)))
+    trace.set_tracer_provider(provider)
+    _enabled = True
+    logger.info(f"Tracing enabled: service={service_name}, exporter={exporter}, sample ratio={sample_ratio}")
+    return True
+
+
+def shutdown_tracing() -> None:
+    provider = trace.get_tracer_provider()
+    if _enabled and hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+def inject_traceparent(carrier: Dict[str, str]) -> Dict[str, str]:
+    """Дописывает traceparent текущего спана в carrier (если трасса выбрана)."""
+    if _enabled:
+        propagate.inject(carrier)
+    return carrier
+
+
+def extract_context(carrier: Optional[Mapping[str, str]]) -> Optional[context.Context]:
+    if not _enabled or not carrier:
+        return None
+    return propagate.extract(carrier)
+
+
+def _traced(func: Callable, span_name: str, attributes: Mapping[str, Any]) -> Callable:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not _enabled:
+            return await func(*args, **kwargs)
+        with tracer.start_as_current_span(span_name, kind=SpanKind.CLIENT, attributes=attributes):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def trace_methods(**attributes: Any):
+    """Декоратор класса: спан вокруг каждой публичной корутины с именем <Класс>.<метод>.
+    Пока трассировка выключена, обёртка - одна проверка флага."""
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.iscoroutinefunction(method):
+                continue
+            setattr(cls, name, _traced(method, f"{cls.__name__}.{name}", attributes))
+        return cls
+    return decorate
+
+
+def start_span(name: str, kind: SpanKind = SpanKind.INTERNAL, parent: Optional[context.Context] = None,
+               attributes: Optional[Mapping[str, Any]] = None):
+    """Контекстный менеджер спана; при выключенной трассировке - пустой, с невыбранным спаном."""
+    if not _enabled:
+        return nullcontext(INVALID_SPAN)
+    return tracer.start_as_current_span(name, context=parent, kind=kind, attributes=attributes)
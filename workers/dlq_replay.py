@@ -0,0 +1,220 @@
+"""Повторная отправка сообщений из DLQ в основной топик.
+
+Читает DLQ_TOPIC пачками от имени отдельной consumer group, отбирает сообщения по тексту
+ошибки, времени попадания в DLQ и item_id и отправляет исходные сообщения в TOPIC со
+сброшенным retry_count - не быстрее --rate сообщений в секунду, чтобы повтор после аварии
+не завалил воркеры. Прогресс - закоммиченные оффсеты группы: прерванный повтор продолжится
+с места остановки. Группа помнит и пропущенные фильтром сообщения, поэтому для повтора
+другой выборки используйте другую --group.
+
+    python -m workers.dlq_replay --error "not found" --since 2026-02-11T00:00:00 --rate 50 --dry-run
+    python -m workers.dlq_replay --item-ids 12,15 --group dlq-replay-items-12-15
+
+Останавливается, когда DLQ вычитан (нет новых сообщений --idle-timeout секунд) или
+после --max-messages отправленных.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Mapping, Optional, Pattern, Sequence, Set
+
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+
+from clients import moderation_codec
+from kafka_settings import DLQ_TOPIC, KAFKA_BOOTSTRAP, TOPIC
+from logging_setup import setup_logging
+
+logger = logging.getLogger(__name__)
+
+REPLAY_GROUP = "moderations-dlq-replay"
+
+
+def parse_time(value: str) -> datetime:
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+@dataclass
+class ReplayFilter:
+    error: Optional[Pattern] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    item_ids: Set[int] = field(default_factory=set)
+
+    def rejects(self, dlq_message: Mapping[str, Any]) -> Optional[str]:
+        """Причина, по которой сообщение не повторяется, или None."""
+        original = dlq_message.get("original")
+        if not isinstance(original, Mapping) or "item_id" not in original or "task_id" not in original:
+            return "malformed"
+        if self.error is not None and not self.error.search(str(dlq_message.get("error", ""))):
+            return "error"
+        if self.since is not None or self.until is not None:
+            try:
+                dead_lettered_at = parse_time(dlq_message["timestamp"])
+            except (KeyError, TypeError, ValueError):
+                return "time"
+            if self.since is not None and dead_lettered_at < self.since:
+                return "time"
+            if self.until is not None and dead_lettered_at >= self.until:
+                return "time"
+        if self.item_ids and original["item_id"] not in self.item_ids:
+            return "item_id"
+        return None
+
+
+def decode_dlq_message(value: Optional[bytes]) -> Optional[Mapping[str, Any]]:
+    """Сообщение DLQ или None, если это не JSON-объект. Разбирается в цикле, а не в
+    value_deserializer: иначе одна битая запись роняла бы getmany на каждом запуске."""
+    try:
+        message = json.loads(value.decode('utf-8'))
+    except (AttributeError, UnicodeDecodeError, ValueError):
+        return None
+    return message if isinstance(message, Mapping) else None
+
+
+def build_replay_message(dlq_message: Mapping[str, Any]) -> Dict[str, Any]:
+    """Исходное сообщение с нуля попыток. Время отправки обновляется, иначе queue delay
+    воркера показывал бы всё время, проведённое в DLQ."""
+    original = dlq_message["original"]
+    return moderation_codec.build_request(original["item_id"], original["task_id"], original.get("metadata"))
+
+
+class Pacer:
+    """Не больше rate вызовов wait() в секунду (0 - без ограничения)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next_at = time.monotonic()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self._next_at > now:
+            await asyncio.sleep(self._next_at - now)
+        self._next_at = max(self._next_at, now) + self.interval
+
+
+class DlqReplayer:
+
+    def __init__(self, replay_filter: ReplayFilter, rate: float, batch_size: int = 100, group: str = REPLAY_GROUP,
+                 dry_run: bool = False, idle_timeout: float = 5.0, max_messages: int = 0):
+        self.filter = replay_filter
+        self.pacer = Pacer(rate)
+        self.batch_size = batch_size
+        self.group = group
+        self.dry_run = dry_run
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self.scanned = 0
+        self.replayed = 0
+        self.skipped: Counter = Counter()
+        self.matched_errors: Counter = Counter()
+
+    async def run(self) -> Dict[str, Any]:
+        consumer = AIOKafkaConsumer(
+            DLQ_TOPIC,
+            bootstrap_servers=KAFKA_BOOTSTRAP,
+            group_id=self.group,
+            enable_auto_commit=False,
+            auto_offset_reset="earliest",
+        )
+        producer = None if self.dry_run else AIOKafkaProducer(
+            bootstrap_servers=KAFKA_BOOTSTRAP,
+            key_serializer=lambda k: str(k).encode('utf-8'),
+        )
+        await consumer.start()
+        if producer is not None:
+            await producer.start()
+        try:
+            await self._replay(consumer, producer)
+        finally:
+            if producer is not None:
+                await producer.stop()
+            await consumer.stop()
+        return self.summary()
+
+    async def _replay(self, consumer: AIOKafkaConsumer, producer: Optional[AIOKafkaProducer]) -> None:
+        while not self._limit_reached():
+            limit = self.batch_size
+            if self.max_messages:
+                # Не забираем больше, чем осталось отправить: непрочитанное останется за группой
+                limit = min(limit, self.max_messages - self.replayed)
+            batches = await consumer.getmany(timeout_ms=int(self.idle_timeout * 1000), max_records=limit)
+            if not batches:
+                logger.info("DLQ is drained")
+                return
+
+            sends = []
+            for records in batches.values():
+                for record in records:
+                    self.scanned += 1
+                    dlq_message = decode_dlq_message(record.value)
+                    reason = self.filter.rejects(dlq_message) if dlq_message is not None else "malformed"
+                    if reason is not None:
+                        self.skipped[reason] += 1
+                        continue
+                    self.matched_errors[str(dlq_message.get("error"))] += 1
+                    message = build_replay_message(dlq_message)
+                    await self.pacer.wait()
+                    if producer is not None:
+                        value, headers = moderation_codec.encode(message)
+                        sends.append(await producer.send(TOPIC, value, key=message["item_id"], headers=headers))
+                    self.replayed += 1
+
+            if producer is not None:
+                # Чекпоинт - только после подтверждения всех отправок пачки
+                await asyncio.gather(*sends)
+                await consumer.commit()
+            logger.info("Replay progress: scanned=%s replayed=%s skipped=%s",
+                        self.scanned, self.replayed, dict(self.skipped))
+
+    def _limit_reached(self) -> bool:
+        return bool(self.max_messages) and self.replayed >= self.max_messages
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "dry_run": self.dry_run,
+            "group": self.group,
+            "scanned": self.scanned,
+            "replayed": self.replayed,
+            "skipped": dict(self.skipped),
+            "errors": dict(self.matched_errors),
+        }
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--error", type=re.compile, help="Регулярное выражение по тексту ошибки в DLQ")
+    parser.add_argument("--since", type=parse_time, help="Попавшие в DLQ не раньше (ISO 8601, по умолчанию UTC)")
+    parser.add_argument("--until", type=parse_time, help="Попавшие в DLQ раньше")
+    parser.add_argument("--item-ids", type=lambda value: {int(part) for part in value.split(",") if part.strip()},
+                        default=set())
+    parser.add_argument("--rate", type=float, default=50.0, help="Сообщений в секунду, 0 - без ограничения")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--group", default=REPLAY_GROUP, help="Consumer group - она же чекпоинт прогресса")
+    parser.add_argument("--max-messages", type=int, default=0, help="Остановиться после N отправленных, 0 - все")
+    parser.add_argument("--idle-timeout", type=float, default=5.0)
+    parser.add_argument("--dry-run", action="store_true", help="Только посчитать: без отправки и без чекпоинта")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    replayer = DlqReplayer(ReplayFilter(args.error, args.since, args.until, args.item_ids), args.rate,
+                           args.batch_size, args.group, args.dry_run, args.idle_timeout, args.max_messages)
+    return await replayer.run()
+
+
+if __name__ == "__main__":
+    setup_logging(mode="sync")
+    summary = asyncio.run(main())
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    sys.exit(0)
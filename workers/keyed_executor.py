@@ -0,0 +1,150 @@
+"""Исполнитель с упорядочиванием по ключу для воркера модерации.
+
+Сообщения в Kafka ключуются item_id. Задачи с одним ключом выполняются строго по очереди
+в порядке submit, с разными ключами - параллельно, не больше max_concurrency одновременно.
+Очередь каждого ключа ограничена max_backlog_per_key, а общее число принятых задач -
+max_pending: при переполнении submit ждёт, и consumer перестаёт вычитывать новые сообщения.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, List, Optional
+
+from metrics import WORKER_ACTIVE_KEYS, WORKER_KEY_CONTENDED, WORKER_KEYED_BACKLOG, WORKER_SUBMIT_WAIT
+
+logger = logging.getLogger(__name__)
+
+# Слот параллельности текущей задачи: [держит ли она его сейчас] - для released()
+_slot: ContextVar[Optional[List[bool]]] = ContextVar("keyed_executor_slot", default=None)
+
+
+class KeyedExecutor:
+
+    def __init__(self, max_concurrency: int, max_backlog_per_key: int, max_pending: int = 0):
+        self.max_concurrency = max_concurrency
+        self.max_backlog_per_key = max_backlog_per_key
+        self.max_pending = max_pending
+        self.submitted = 0
+        self.contended = 0
+        self.submit_waits = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._queues: Dict[Hashable, Deque[Callable[[], Awaitable[Any]]]] = {}
+        self._drainers: Dict[Hashable, asyncio.Task] = {}
+        self._pending = 0
+        self._space = asyncio.Condition()
+
+    def _has_space(self, key: Hashable) -> bool:
+        queue = self._queues.get(key)
+        if queue is not None and len(queue) >= self.max_backlog_per_key > 0:
+            return False
+        return self.max_pending <= 0 or self._pending < self.max_pending
+
+    async def submit(self, key: Hashable, job: Callable[[], Awaitable[Any]]) -> None:
+        """Ставит job в очередь ключа и возвращается, не дожидаясь выполнения.
+        Ждёт, только если очередь ключа или общий лимит заполнены."""
+        if not self._has_space(key):
+            self.submit_waits += 1
+            started_at = time.perf_counter()
+            async with self._space:
+                await self._space.wait_for(lambda: self._has_space(key))
+            WORKER_SUBMIT_WAIT.observe(time.perf_counter() - started_at)
+
+        self.submitted += 1
+        self._pending += 1
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            WORKER_ACTIVE_KEYS.inc()
+        if key in self._drainers:
+            # По ключу уже что-то выполняется - задача встаёт за ним
+            self.contended += 1
+            WORKER_KEY_CONTENDED.inc()
+        queue.append(job)
+        WORKER_KEYED_BACKLOG.inc()
+        if key not in self._drainers:
+            self._drainers[key] = asyncio.create_task(self._drain(key))
+
+    async def _drain(self, key: Hashable) -> None:
+        queue = self._queues[key]
+        try:
+            while queue:
+                job = queue.popleft()
+                WORKER_KEYED_BACKLOG.dec()
+                try:
+                    await self._run(job)
+                except Exception as e:
+                    logger.error("Job for key %s failed: %s", key, e)
+                finally:
+                    self._pending -= 1
+                    await self._notify()
+        finally:
+            # При отмене в очереди могут остаться непринятые в работу задачи
+            self._pending -= len(queue)
+            WORKER_KEYED_BACKLOG.dec(len(queue))
+            del self._queues[key]
+            del self._drainers[key]
+            WORKER_ACTIVE_KEYS.dec()
+            await self._notify()
+
+    async def _run(self, job: Callable[[], Awaitable[Any]]) -> None:
+        if self._semaphore is None:
+            await job()
+            return
+        await self._semaphore.acquire()
+        slot = [True]
+        token = _slot.set(slot)
+        try:
+            await job()
+        finally:
+            _slot.reset(token)
+            if slot[0]:
+                self._semaphore.release()
+
+    async def _notify(self) -> None:
+        async with self._space:
+            self._space.notify_all()
+
+    @asynccontextmanager
+    async def released(self) -> AsyncIterator[None]:
+        """Отпускает слот параллельности текущей задачи на время блока, ключ остаётся занят.
+        Для ожиданий без работы (backoff перед повтором), чтобы они не занимали слоты.
+        Вне задачи исполнителя ничего не делает."""
+        slot = _slot.get()
+        if self._semaphore is None or not slot or not slot[0]:
+            yield
+            return
+        self._semaphore.release()
+        slot[0] = False
+        try:
+            yield
+        finally:
+            await self._semaphore.acquire()
+            slot[0] = True
+
+    async def join(self, timeout: Optional[float] = None) -> bool:
+        """Ждёт выполнения всех принятых задач. False - если не успели за timeout."""
+        async with self._space:
+            try:
+                await asyncio.wait_for(self._space.wait_for(lambda: not self._drainers), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def cancel(self) -> None:
+        drainers = list(self._drainers.values())
+        for drainer in drainers:
+            drainer.cancel()
+        await asyncio.gather(*drainers, return_exceptions=True)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "pending": self._pending,
+            "active_keys": len(self._queues),
+            "submitted": self.submitted,
+            "contended": self.contended,
+            "submit_waits": self.submit_waits,
+        }
@@ -1,23 +1,53 @@
 import asyncio
+import base64
+import functools
 import json
 import logging
+import os
+import signal
+import time
 from contextlib import asynccontextmanager
 from typing import Dict, Any, Optional
 
 from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
 
+from clients import moderation_codec
 from kafka_settings import KAFKA_BOOTSTRAP, TOPIC, DLQ_TOPIC, CONSUMER_GROUP
 from services.moderations import ModerationService
 from services.predictions import PredictionService
-from errors import AdNotFoundError, ModelNotLoadedError
+from errors import AdNotFoundError, ModelNotLoadedError, InferenceQueueFullError, MessageDecodeError
 from datetime import datetime, timezone
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from model import model_singleton
+from model_watcher import model_watcher
+from inference import inference_executor
+from services.shadow import shadow_scorer
+from metrics import (
+    KAFKA_SEND_DURATION,
+    WORKER_IN_FLIGHT,
+    WORKER_MESSAGE_DURATION,
+    WORKER_MESSAGE_SCHEMA,
+    WORKER_MESSAGES,
+    start_metrics_server,
 )
+from opentelemetry.trace import SpanKind
+from tracing import extract_context, setup_tracing, shutdown_tracing, start_span
+from profiling import start_profile_server
+from logging_setup import setup_logging
+from workers.keyed_executor import KeyedExecutor
+
 logger = logging.getLogger(__name__)
 
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "8001"))
+WORKER_PROFILE_PORT = int(os.getenv("WORKER_PROFILE_PORT", "8002"))
+# Сообщений в обработке одновременно (0 - без ограничения), очередь одного item_id
+# и всего принятых, но не обработанных сообщений - дальше consumer ждёт
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "64"))
+WORKER_KEY_BACKLOG = int(os.getenv("WORKER_KEY_BACKLOG", "100"))
+WORKER_MAX_PENDING = int(os.getenv("WORKER_MAX_PENDING", "1000"))
+# Сколько по SIGTERM ждать обработки уже принятых сообщений
+WORKER_DRAIN_TIMEOUT = float(os.getenv("WORKER_DRAIN_TIMEOUT", "25"))
+WORKER_HEARTBEAT_INTERVAL = 1.0
+
 
 class KafkaConsumerWorker:
 
@@ -28,15 +58,20 @@ class KafkaConsumerWorker:
     RETRYABLE_ERRORS = (
         ConnectionError,
         TimeoutError,
-        ModelNotLoadedError
+        ModelNotLoadedError,
+        InferenceQueueFullError
     )
     
     
-    def __init__(self):
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY):
         self.mod_service = ModerationService()
         self.ml_service = PredictionService()
         self.consumer: Optional[AIOKafkaConsumer] = None
         self.dlq_producer: Optional[AIOKafkaProducer] = None
+        # Сообщения одного item_id обрабатываются по очереди, разных - параллельно
+        self.executor = KeyedExecutor(concurrency, WORKER_KEY_BACKLOG, WORKER_MAX_PENDING)
+        self.drain_timeout = WORKER_DRAIN_TIMEOUT
+        self._draining = False
     
     async def initialize(self):
         self.consumer = AIOKafkaConsumer(
@@ -45,7 +80,6 @@ class KafkaConsumerWorker:
             group_id=CONSUMER_GROUP,
             enable_auto_commit=False,
             auto_offset_reset="earliest",
-            value_deserializer=lambda x: json.loads(x.decode('utf-8')),
         )
         
         self.dlq_producer = AIOKafkaProducer(
@@ -56,7 +90,7 @@ class KafkaConsumerWorker:
         await self.consumer.start()
         await self.dlq_producer.start()
         
-        logger.info(f"Started consuming {TOPIC} as group={CONSUMER_GROUP}")
+        logger.info("Started consuming %s as group=%s", TOPIC, CONSUMER_GROUP)
     
     async def cleanup(self):
         if self.consumer:
@@ -77,10 +111,11 @@ class KafkaConsumerWorker:
         }
         
         try:
-            await self.dlq_producer.send_and_wait(DLQ_TOPIC, dlq_message)
-            logger.warning(f"Message sent to DLQ: {error}")
+            with KAFKA_SEND_DURATION.labels(DLQ_TOPIC).time():
+                await self.dlq_producer.send_and_wait(DLQ_TOPIC, dlq_message)
+            logger.warning("Message sent to DLQ: %s", error, extra={"event": "worker.dlq"})
         except Exception as e:
-            logger.error(f"Failed to send to DLQ: {e}")
+            logger.error("Failed to send to DLQ: %s", e)
     
     def build_moderation_result(
         self,
@@ -123,16 +158,61 @@ class KafkaConsumerWorker:
     
     async def schedule_retry(self, message: Dict[str, Any], retry_count: int, error: str):
         delay = self.INITIAL_RETRY_DELAY * (self.RETRY_BACKOFF_MULTIPLIER ** retry_count)
-        logger.warning(f"Scheduling retry #{retry_count + 1} for message in {delay}s. Error: {error}")
-        await asyncio.sleep(delay)
-        asyncio.create_task(self.process_with_retry(message, retry_count + 1))
+        logger.warning("Scheduling retry #%d for message in %ss. Error: %s", retry_count + 1, delay, error,
+                       extra={"event": "worker.retry"})
+        # Повтор остаётся в очереди своего item_id, чтобы следующие сообщения по объявлению
+        # не обогнали его; на время паузы слот параллельности отдаётся другим ключам
+        async with self.executor.released():
+            await asyncio.sleep(delay)
+        await self.process_with_retry(message, retry_count + 1)
     
+    def queue_delay_ms(self, message: Dict[str, Any]) -> Optional[float]:
+        """Сколько сообщение ждало в Kafka (и в повторах) с момента отправки из API."""
+        sent_at_ms = moderation_codec.sent_at_ms(message)
+        if sent_at_ms is None:
+            return None
+        return float(moderation_codec.now_ms() - sent_at_ms)
+
+    def decode(self, record: Any) -> Optional[Dict[str, Any]]:
+        """Сообщение из записи Kafka любой поддерживаемой версии схемы; None - если не разобралось."""
+        version = "unknown"
+        try:
+            version = str(moderation_codec.schema_version(record.headers))
+            return moderation_codec.decode(record.value, record.headers)
+        except MessageDecodeError as e:
+            version = "malformed"
+            logger.error("Failed to decode moderation message at offset %s: %s", record.offset, e)
+            return None
+        finally:
+            WORKER_MESSAGE_SCHEMA.labels(version).inc()
+
+    async def process_observed(self, message: Dict[str, Any], retry_count: int = 0) -> bool:
+        WORKER_IN_FLIGHT.inc()
+        started_at = time.perf_counter()
+        outcome = "error"
+        attributes = {"messaging.destination.name": TOPIC, "item_id": message.get("item_id"),
+                      "task_id": message.get("task_id"), "retry_count": retry_count}
+        queue_delay_ms = self.queue_delay_ms(message)
+        if queue_delay_ms is not None:
+            attributes["messaging.queue_delay_ms"] = queue_delay_ms
+        try:
+            with start_span(f"{TOPIC} process", kind=SpanKind.CONSUMER,
+                            parent=extract_context(message.get("metadata")),
+                            attributes={k: v for k, v in attributes.items() if v is not None}):
+                processed = await self.process_message(message, retry_count)
+            outcome = "processed" if processed else "failed"
+            return processed
+        finally:
+            WORKER_IN_FLIGHT.dec()
+            WORKER_MESSAGE_DURATION.observe(time.perf_counter() - started_at)
+            WORKER_MESSAGES.labels(outcome).inc()
+
     async def process_with_retry(self, message: Dict[str, Any], current_retry_count: int = 0):
         try:
-            await self.process_message(message, current_retry_count)
+            await self.process_observed(message, current_retry_count)
             await self.consumer.commit()
         except Exception as e:
-            logger.error(f"Retry attempt {current_retry_count} failed: {e}")
+            logger.error("Retry attempt %d failed: %s", current_retry_count, e)
             if self.is_retryable_error(e) and current_retry_count < self.MAX_RETRIES:
                 await self.schedule_retry(message, current_retry_count, str(e))
             else:
@@ -153,7 +233,7 @@ class KafkaConsumerWorker:
         retry_count: int = 0
     ) -> bool:
         
-        logger.error(f"Error processing message after {retry_count} attempts: {error_message}")
+        logger.error("Error processing message after %s attempts: %s", retry_count, error_message)
         
         query = self.build_moderation_result(
             item_id=item_id,
@@ -164,7 +244,7 @@ class KafkaConsumerWorker:
         try:
             await self.mod_service.update_status(task_id, query)
         except Exception as e:
-            logger.error(f"Failed to update status in moderation service: {e}")
+            logger.error("Failed to update status in moderation service: %s", e)
         
         await self.send_to_dlq(error_message, original_message, retry_count)
         return False
@@ -175,15 +255,14 @@ class KafkaConsumerWorker:
             item_id = message["item_id"]
             task_id = message["task_id"]
             
-            if retry_count > 0:
-                logger.info(f"Retry #{retry_count} for item_id: {item_id}")
-            else:
-                logger.info(f"Processing event for item_id: {item_id}")
-            
+            logger.debug("Processing event for item_id: %s, retry #%d", item_id, retry_count,
+                         extra={"event": "worker.message.start"})
+
             is_violation, probability = await self.ml_service.simple_predict(item_id, task_id)
-            logger.info(f"Got prediction")
-            
-            logger.info(f"Successfully processed item_id: {item_id}")
+
+            # Одна строка на сообщение; частоту режет LOG_SAMPLING="worker.message=..."
+            logger.info("Processed item_id: %s, task_id: %s, violation=%s, probability=%.3f",
+                        item_id, task_id, is_violation, probability, extra={"event": "worker.message"})
             return True
             
         except AdNotFoundError as e:
@@ -199,10 +278,10 @@ class KafkaConsumerWorker:
             
         except Exception as e:
             if self.is_retryable_error(e):
-                logger.warning(f"Retryable error for {message['item_id']}: {e}")
+                logger.warning("Retryable error for %s: %s", message['item_id'], e)
                 raise
             else:
-                logger.error(f"Non-retryable error for {message['item_id']}: {e}")
+                logger.error("Non-retryable error for %s: %s", message['item_id'], e)
                 await self._handle_error(
                     item_id=message["item_id"],
                     task_id=message["task_id"],
@@ -212,6 +291,14 @@ class KafkaConsumerWorker:
                 )
                 return False
     
+    def drain(self, running: asyncio.Task) -> None:
+        """Плавная остановка: перестаём вычитывать топик, run() дожидается принятых сообщений."""
+        if self._draining:
+            return
+        logger.info("Draining worker: waiting up to %ss for accepted messages", self.drain_timeout)
+        self._draining = True
+        running.cancel()
+
     async def run(self):
         if not self.consumer:
             raise RuntimeError("Consumer not initialized")
@@ -219,30 +306,45 @@ class KafkaConsumerWorker:
         try:
             async for msg in self.consumer:
                 try:
-                    retry_count = await self.get_retry_count(msg.value)
+                    message = self.decode(msg)
+                    if message is None:
+                        # Неразобранное сообщение сохраняется в DLQ как есть
+                        await self.send_to_dlq("Malformed moderation message", {
+                            "raw": base64.b64encode(msg.value or b"").decode("ascii"),
+                            "headers": {key: value.decode("utf-8", "replace") for key, value in msg.headers or ()},
+                        }, retry_count=0)
+                        await self.consumer.commit()
+                        continue
+
+                    retry_count = await self.get_retry_count(message)
                     
                     if retry_count >= self.MAX_RETRIES:
-                        logger.warning(f"Message exceeded max retries ({self.MAX_RETRIES}), sending to DLQ")
+                        logger.warning("Message exceeded max retries (%d), sending to DLQ", self.MAX_RETRIES)
                         await self._handle_error(
-                            item_id=msg.value.get("item_id"),
-                            task_id=msg.value.get("task_id"),
+                            item_id=message.get("item_id"),
+                            task_id=message.get("task_id"),
                             error_message="Exceeded maximum retry attempts",
-                            original_message=msg.value,
+                            original_message=message,
                             retry_count=retry_count
                         )
                         await self.consumer.commit()
                         continue
                     
-                    asyncio.create_task(self.process_with_retry(msg.value, retry_count))
+                    await self.executor.submit(message.get("item_id"),
+                                               functools.partial(self.process_with_retry, message, retry_count))
                     await self.consumer.commit()
                         
                 except Exception as e:
-                    logger.error(f"Fatal error in message processing loop: {e}")
+                    logger.error("Fatal error in message processing loop: %s", e)
                     await asyncio.sleep(1)
                     
         except asyncio.CancelledError:
             logger.info("Worker cancelled")
         finally:
+            if self._draining and not await self.executor.join(self.drain_timeout):
+                logger.warning("Drain timed out, %s messages are left for redelivery",
+                               self.executor.snapshot()["pending"])
+            await self.executor.cancel()
             await self.cleanup()
 
 
@@ -256,12 +358,58 @@ async def worker_lifespan():
         await worker.cleanup()
 
 
-async def main():
+async def heartbeat(fd: int, worker: KafkaConsumerWorker, running: asyncio.Task) -> None:
+    """Пишет байт в pipe супервизора раз в секунду: пока event loop не завис, супервизор видит живого
+    воркера. Закрытый pipe - супервизора больше нет, воркер останавливается сам."""
+    os.set_blocking(fd, False)
+    while True:
+        try:
+            os.write(fd, b".")
+        except BlockingIOError:
+            pass
+        except BrokenPipeError:
+            logger.warning("Supervisor is gone, stopping worker")
+            worker.drain(running)
+            return
+        await asyncio.sleep(WORKER_HEARTBEAT_INTERVAL)
+
+
+async def main(metrics_port: int = WORKER_METRICS_PORT, profile_port: int = WORKER_PROFILE_PORT,
+               heartbeat_fd: Optional[int] = None):
+    setup_tracing("moderation-worker")
+    if start_metrics_server(metrics_port):
+        logger.info(f"Worker metrics are served on :{metrics_port}/metrics")
+    profile_server = start_profile_server(profile_port, asyncio.get_running_loop())
+    if profile_server:
+        logger.info(f"Worker profiling is served on :{profile_port}/debug/profile")
+    # Модель грузится в потоке параллельно с подключением к Kafka,
+    # сообщения начинаем забирать только когда она готова
+    model_loading = asyncio.create_task(asyncio.to_thread(model_singleton.load))
     async with worker_lifespan() as worker:
-        await worker.run()
+        await model_loading
+        logger.info(f"Model is ready, version: {model_singleton.version}")
+        await model_watcher.start()
+        await shadow_scorer.start()
+        running = asyncio.create_task(worker.run())
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, worker.drain, running)
+        beating = asyncio.create_task(heartbeat(heartbeat_fd, worker, running)) if heartbeat_fd is not None else None
+        try:
+            await running
+        finally:
+            if beating is not None:
+                beating.cancel()
+            await model_watcher.stop()
+            if shadow_scorer.enabled:
+                logger.info(f"Shadow scoring stats: {shadow_scorer.snapshot()}")
+            await shadow_scorer.stop()
+            inference_executor.shutdown()
+            shutdown_tracing()
+            if profile_server:
+                profile_server.shutdown()
 
 
 if __name__ == "__main__":
+    setup_logging()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
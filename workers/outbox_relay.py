@@ -0,0 +1,122 @@
+"""Relay outbox модерации: переносит записи moderation_outbox в Kafka.
+
+/async_predict только записывает pending-задачу и запись outbox в одной транзакции и сразу
+отвечает. Relay забирает записи пачками (FOR UPDATE SKIP LOCKED, поэтому relay можно
+запускать в несколько экземпляров), отправляет их в топик модерации одной пачкой и удаляет
+доставленные. Недоставленные возвращаются в очередь с нарастающей паузой.
+
+Доставка не реже одного раза: если relay упадёт между подтверждением Kafka и удалением
+записей, после OUTBOX_LEASE_SECONDS их отправит повторно.
+
+    python -m workers.outbox_relay
+"""
+import asyncio
+import logging
+import os
+import signal
+from typing import Optional
+
+from clients import moderation_codec
+from clients.kafka import KafkaProducer, kafka_producer
+from kafka_settings import KAFKA_BOOTSTRAP
+from logging_setup import setup_logging
+from metrics import OUTBOX_LAG, OUTBOX_MESSAGES, start_metrics_server
+from repositories.outbox import OutboxPostgresStorage
+from tracing import TRACEPARENT, setup_tracing, shutdown_tracing
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+# Пауза между опросами пустой очереди; полная пачка забирается следующей сразу
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "0.2"))
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "30"))
+OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY", "1"))
+OUTBOX_MAX_RETRY_DELAY = float(os.getenv("OUTBOX_MAX_RETRY_DELAY", "60"))
+OUTBOX_RELAY_METRICS_PORT = int(os.getenv("OUTBOX_RELAY_METRICS_PORT", "8003"))
+
+
+class OutboxRelay:
+
+    def __init__(self, producer: KafkaProducer = kafka_producer,
+                 storage: Optional[OutboxPostgresStorage] = None,
+                 batch_size: int = OUTBOX_BATCH_SIZE,
+                 poll_interval: float = OUTBOX_POLL_INTERVAL,
+                 lease_seconds: float = OUTBOX_LEASE_SECONDS):
+        self.producer = producer
+        self.storage = storage or OutboxPostgresStorage()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._stopping = asyncio.Event()
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(OUTBOX_RETRY_DELAY * 2 ** max(attempts - 1, 0), OUTBOX_MAX_RETRY_DELAY)
+
+    async def relay_once(self) -> int:
+        """Одна пачка: захват, отправка, удаление доставленных. Возвращает число захваченных записей."""
+        rows = await self.storage.claim(self.batch_size, self.lease_seconds)
+        if not rows:
+            return 0
+
+        messages = [
+            moderation_codec.build_request(row["item_id"], row["task_id"],
+                                           {TRACEPARENT: row["traceparent"]} if row["traceparent"] else None)
+            for row in rows
+        ]
+        errors = await self.producer.send_messages(messages)
+
+        delivered = [row for row, error in zip(rows, errors) if error is None]
+        failed = [(row, error) for row, error in zip(rows, errors) if error is not None]
+        if delivered:
+            await self.storage.delete([row["id"] for row in delivered])
+            OUTBOX_MESSAGES.labels("published").inc(len(delivered))
+            for row in delivered:
+                OUTBOX_LAG.observe(row["age_seconds"])
+        if failed:
+            # Вся пачка обычно падает по одной причине - возвращаем её одной командой
+            delay = self.retry_delay(min(row["attempts"] for row, _ in failed))
+            await self.storage.reschedule([row["id"] for row, _ in failed], delay, str(failed[0][1]))
+            OUTBOX_MESSAGES.labels("failed").inc(len(failed))
+            logger.error("%s of %s outbox messages were not delivered, retrying in %.0fs: %s",
+                         len(failed), len(rows), delay, failed[0][1])
+        return len(rows)
+
+    async def run(self) -> None:
+        logger.info("Outbox relay started: batch=%s, poll=%ss", self.batch_size, self.poll_interval)
+        while not self._stopping.is_set():
+            try:
+                claimed = await self.relay_once()
+            except Exception as e:
+                logger.error("Outbox relay iteration failed: %s", e)
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info("Outbox relay stopped")
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+
+async def main(metrics_port: int = OUTBOX_RELAY_METRICS_PORT) -> None:
+    setup_tracing("outbox-relay")
+    if start_metrics_server(metrics_port):
+        logger.info(f"Outbox relay metrics are served on :{metrics_port}/metrics")
+    await kafka_producer.configure(KAFKA_BOOTSTRAP)
+    await kafka_producer.start()
+    relay = OutboxRelay()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, relay.stop)
+    try:
+        await relay.run()
+    finally:
+        await kafka_producer.stop()
+        shutdown_tracing()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,383 @@
+"""Запуск воркера модерации в несколько процессов одной consumer group.
+
+Супервизор один раз импортирует воркер и загружает модель, замораживает кучу (gc.freeze)
+и форкает N процессов: страницы модели остаются общими copy-on-write, а Kafka распределяет
+партиции топика между процессами группы. Каждый процесс можно закрепить за своим ядром.
+
+Процесс считается живым, пока его event loop раз в секунду пишет в pipe супервизора:
+упавший процесс перезапускается, а зависший дольше WORKER_HEARTBEAT_TIMEOUT убивается и
+тоже перезапускается. Метрики всех процессов суммируются через PROMETHEUS_MULTIPROC_DIR
+и отдаются супервизором на --metrics-port.
+
+Новую версию модели, как и launcher.py, отслеживает только супервизор (раз в MODEL_RELOAD_INTERVAL):
+он загружает её до форка и поочерёдно заменяет процессы. Watcher в процессах выключен, иначе
+каждый обновлялся бы по своему расписанию и процессы какое-то время работали бы с разными версиями.
+
+    python -m workers.supervisor --workers 4 --cpus auto --metrics-port 8001
+
+Сигналы: SIGTERM/SIGINT - плавная остановка (процессы дорабатывают принятые сообщения),
+SIGUSR1 - отчёт по памяти процессов.
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import select
+import signal
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Set
+
+from logging_setup import setup_logging, shutdown_logging
+
+logger = logging.getLogger("workers.supervisor")
+
+WORKER_READY_TIMEOUT = float(os.getenv("WORKER_READY_TIMEOUT", "120"))
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", "30"))
+# Процессу даётся WORKER_DRAIN_TIMEOUT на дообработку и ещё немного на закрытие соединений
+WORKER_STOP_TIMEOUT = float(os.getenv("WORKER_STOP_TIMEOUT", "35"))
+MIN_RESTART_INTERVAL = 1.0
+MAX_RESTART_INTERVAL = 30.0
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+
+
+def parse_cpus(spec: str, workers: int, available: Sequence[int]) -> List[Optional[Set[int]]]:
+    """Набор ядер для каждого процесса: none - без закрепления, auto - по одному ядру из доступных
+    по кругу, "0,2,4" - по одному из перечисленных по кругу."""
+    if spec == "none":
+        return [None] * workers
+    cpus = sorted(available) if spec == "auto" else [int(cpu) for cpu in spec.split(",") if cpu.strip()]
+    if not cpus:
+        raise ValueError(f"No CPUs to pin workers to: {spec!r}")
+    return [{cpus[slot % len(cpus)]} for slot in range(workers)]
+
+
+def preload() -> None:
+    """Импортирует воркер и загружает модель до форка."""
+    import workers.moderation_worker  # noqa: F401
+    from model import model_singleton
+
+    model_singleton.load()
+    logger.info(f"Preloaded worker and model version {model_singleton.version}")
+    gc.collect()
+    gc.freeze()
+
+
+def run_child(cpus: Optional[Set[int]], heartbeat_fd: int) -> None:
+    from model_watcher import model_watcher
+    from workers.moderation_worker import main
+
+    # Обновления модели приходят через поочерёдный перезапуск из супервизора
+    model_watcher.disable()
+
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    # Метрики отдаёт супервизор, профилировщик в дочерних процессах выключен: порты не делятся
+    asyncio.run(main(metrics_port=0, profile_port=0, heartbeat_fd=heartbeat_fd))
+
+
+@dataclass
+class Child:
+    slot: int
+    heartbeat_fd: int
+    started_at: float
+    last_heartbeat: Optional[float] = None
+
+
+class WorkerSupervisor:
+
+    def __init__(self, workers: int, cpus: Sequence[Optional[Set[int]]], metrics_port: int, preload_model: bool = True):
+        self.workers = workers
+        self.cpus = list(cpus)
+        self.metrics_port = metrics_port
+        self.preload_model = preload_model
+        self.children: Dict[int, Child] = {}
+        self.restarts: Dict[int, int] = {slot: 0 for slot in range(workers)}
+        self._next_spawn: Dict[int, float] = {slot: 0.0 for slot in range(workers)}
+        self._stopping = False
+        self._report_requested = False
+        # Без предзагрузки модель в супервизоре не хранится - запоминаем версию источника
+        self._model_version: Optional[str] = None
+        self._rejected_version: Optional[str] = None
+
+    def spawn(self, slot: int) -> int:
+        heartbeat_read, heartbeat_write = os.pipe()
+        pid = os.fork()
+
+        if pid == 0:
+            os.close(heartbeat_read)
+            for child in self.children.values():
+                os.close(child.heartbeat_fd)
+            for signum in (signal.SIGUSR1, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                signal.signal(signum, signal.SIG_DFL)
+            # Ctrl+C в терминале получает вся группа - останавливает процессы супервизор
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            code = 0
+            try:
+                run_child(self.cpus[slot], heartbeat_write)
+            except BaseException as e:
+                logger.error("Worker %s crashed: %s", os.getpid(), e)
+                code = 1
+            finally:
+                shutdown_logging()
+                os._exit(code)
+
+        os.close(heartbeat_write)
+        os.set_blocking(heartbeat_read, False)
+        self.children[pid] = Child(slot, heartbeat_read, time.monotonic())
+        logger.info(f"Started worker {pid} in slot {slot}" + (f" on CPUs {sorted(self.cpus[slot])}" if self.cpus[slot] else ""))
+        return pid
+
+    def read_heartbeats(self, timeout: float) -> None:
+        fds = {child.heartbeat_fd: child for child in self.children.values()}
+        if not fds:
+            time.sleep(timeout)
+            return
+        try:
+            readable, _, _ = select.select(list(fds), [], [], timeout)
+        except InterruptedError:
+            return
+        now = time.monotonic()
+        for fd in readable:
+            try:
+                data = os.read(fd, 4096)
+            except BlockingIOError:
+                continue
+            if data:
+                if fds[fd].last_heartbeat is None:
+                    logger.info(f"Worker in slot {fds[fd].slot} is consuming")
+                fds[fd].last_heartbeat = now
+
+    def _forget(self, pid: int, reason: str, cause: str = "crashed") -> None:
+        from metrics import WORKER_PROCESS_RESTARTS, mark_process_dead
+
+        child = self.children.pop(pid, None)
+        mark_process_dead(pid)
+        if child is None:
+            return
+        os.close(child.heartbeat_fd)
+        if self._stopping:
+            return
+        # Процесс, падающий сразу после старта, перезапускается с нарастающей паузой
+        lived = time.monotonic() - child.started_at
+        self.restarts[child.slot] = 0 if lived > MAX_RESTART_INTERVAL else self.restarts[child.slot] + 1
+        delay = min(MIN_RESTART_INTERVAL * 2 ** self.restarts[child.slot], MAX_RESTART_INTERVAL)
+        self._next_spawn[child.slot] = time.monotonic() + delay
+        WORKER_PROCESS_RESTARTS.labels(cause).inc()
+        logger.error(f"Worker {pid} in slot {child.slot} {reason}, restarting in {delay:.0f}s")
+
+    def reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            self._forget(pid, f"exited with status {os.waitstatus_to_exitcode(status)}")
+
+    def check_health(self) -> None:
+        now = time.monotonic()
+        for pid, child in list(self.children.items()):
+            if child.last_heartbeat is None:
+                stalled, limit = now - child.started_at, WORKER_READY_TIMEOUT
+            else:
+                stalled, limit = now - child.last_heartbeat, WORKER_HEARTBEAT_TIMEOUT
+            if stalled <= limit:
+                continue
+            logger.error(f"Worker {pid} sent no heartbeat for {stalled:.0f}s, killing")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self._forget(pid, "hung", cause="hung")
+
+    def wait_consuming(self, pid: int) -> bool:
+        """Ждёт первого heartbeat процесса: он загрузил модель и начал читать топик."""
+        deadline = time.monotonic() + WORKER_READY_TIMEOUT
+        while time.monotonic() < deadline and not self._stopping:
+            self.reap()
+            child = self.children.get(pid)
+            if child is None:
+                return False
+            if child.last_heartbeat is not None:
+                return True
+            self.read_heartbeats(0.2)
+        return False
+
+    def stop_child(self, pid: int) -> None:
+        """Плавно останавливает процесс без перезапуска слота."""
+        from metrics import mark_process_dead
+
+        child = self.children.pop(pid, None)
+        try:
+            os.kill(pid, signal.SIGTERM)
+            deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+            while time.monotonic() < deadline:
+                finished, _ = os.waitpid(pid, os.WNOHANG)
+                if finished:
+                    break
+                time.sleep(0.1)
+            else:
+                logger.warning(f"Worker {pid} did not drain in {WORKER_STOP_TIMEOUT}s, killing")
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+        except (ProcessLookupError, ChildProcessError):
+            pass
+        if child is not None:
+            os.close(child.heartbeat_fd)
+        mark_process_dead(pid)
+
+    def check_model(self) -> bool:
+        """Один опрос источника модели, как Launcher.check_model: новая версия загружается в
+        супервизоре (без предзагрузки - самими процессами при старте), затем процессы заменяются
+        поочерёдно. Версия, которая не загрузилась, больше не пробуется."""
+        from launcher import refresh_model
+        from model import model_singleton
+
+        try:
+            version = model_singleton.resolve_source_version()
+        except Exception as e:
+            logger.error(f"Failed to check model version: {e}")
+            return False
+        active = model_singleton.version if self.preload_model else self._model_version
+        if version in (active, self._rejected_version):
+            return False
+
+        logger.info(f"New model version detected: {version} (active: {active})")
+        if self.preload_model and not refresh_model(version):
+            self._rejected_version = version
+            return False
+        self._model_version = version
+        self.restart_children()
+        return True
+
+    def restart_children(self) -> None:
+        """Заменяет процессы по одному: старый останавливается, когда замена начала читать топик."""
+        logger.info("Rolling restart of worker processes")
+        for old_pid in list(self.children):
+            if self._stopping:
+                return
+            old = self.children.get(old_pid)
+            if old is None:
+                continue
+            new_pid = self.spawn(old.slot)
+            if not self.wait_consuming(new_pid):
+                logger.error("Rolling restart aborted: replacement worker did not start consuming")
+                if new_pid in self.children:
+                    self.stop_child(new_pid)
+                return
+            self.stop_child(old_pid)
+        logger.info("Rolling restart finished")
+
+    def report_memory(self) -> None:
+        from launcher import memory_usage
+
+        for pid, child in sorted(self.children.items()):
+            usage = memory_usage(pid)
+            logger.info(f"worker {pid} (slot {child.slot}): rss={usage.get('rss_kb')} kB pss={usage.get('pss_kb')} kB")
+
+    def stop_children(self) -> None:
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            logger.warning(f"Worker {pid} did not drain in {WORKER_STOP_TIMEOUT}s, killing")
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            self._forget(pid, "was killed")
+
+    def _install_signals(self) -> None:
+        def stop(signum, frame):
+            self._stopping = True
+
+        def report(signum, frame):
+            self._report_requested = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGUSR1, report)
+
+    def run(self) -> None:
+        from metrics import start_metrics_server
+
+        if self.preload_model:
+            preload()
+        elif MODEL_RELOAD_INTERVAL > 0:
+            from model import model_singleton
+
+            try:
+                self._model_version = model_singleton.resolve_source_version()
+            except Exception as e:
+                logger.error(f"Failed to check model version: {e}")
+        if start_metrics_server(self.metrics_port):
+            logger.info(f"Aggregated worker metrics are served on :{self.metrics_port}/metrics")
+        self._install_signals()
+        logger.info(f"Starting {self.workers} worker processes")
+
+        next_model_check = time.monotonic() + MODEL_RELOAD_INTERVAL
+        while not self._stopping:
+            self.reap()
+            self.check_health()
+            running_slots = {child.slot for child in self.children.values()}
+            for slot in range(self.workers):
+                if slot not in running_slots and time.monotonic() >= self._next_spawn[slot] and not self._stopping:
+                    self.spawn(slot)
+            if MODEL_RELOAD_INTERVAL > 0 and time.monotonic() >= next_model_check:
+                self.check_model()
+                next_model_check = time.monotonic() + MODEL_RELOAD_INTERVAL
+            if self._report_requested:
+                self._report_requested = False
+                self.report_memory()
+            self.read_heartbeats(0.2)
+
+        logger.info("Draining worker processes...")
+        self.stop_children()
+        logger.info("Supervisor stopped")
+
+
+def prepare_metrics_dir() -> str:
+    """Каталог multiprocess-метрик: без него /metrics супервизора не видит дочерние процессы.
+    Задаётся до импорта metrics, старые файлы удаляются."""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        path = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="worker-metrics-")
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+    return path
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WORKER_PROCESSES", os.cpu_count() or 1)))
+    parser.add_argument("--cpus", default=os.getenv("WORKER_CPUS", "none"),
+                        help='none, auto или список ядер "0,2,4" - закрепление процессов за ядрами')
+    parser.add_argument("--metrics-port", type=int, default=int(os.getenv("WORKER_METRICS_PORT", "8001")))
+    parser.add_argument("--no-preload", action="store_true",
+                        help="Не загружать модель в супервизоре - каждый процесс загрузит свою копию")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    prepare_metrics_dir()
+    setup_logging()
+    supervisor = WorkerSupervisor(args.workers, parse_cpus(args.cpus, args.workers, sorted(os.sched_getaffinity(0))),
+                                  args.metrics_port, preload_model=not args.no_preload)
+    supervisor.run()
+    sys.exit(0)